@@ -0,0 +1,51 @@
+# Generated by Django 3.1.6 on 2026-10-18 02:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("django_sample", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="authorversion",
+            index=models.Index(
+                fields=["eternal", "business_date"], name="django_samp_eternal_69506c_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="authorversion",
+            index=models.Index(
+                fields=["business_date"], name="django_samp_busines_575ba1_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="authorversion",
+            index=models.Index(
+                fields=["edited_by", "business_date"],
+                name="django_samp_edited__4c461e_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookversion",
+            index=models.Index(
+                fields=["eternal", "business_date"], name="django_samp_eternal_b5487b_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookversion",
+            index=models.Index(
+                fields=["business_date"], name="django_samp_busines_304258_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="bookversion",
+            index=models.Index(
+                fields=["edited_by", "business_date"],
+                name="django_samp_edited__5c9077_idx",
+            ),
+        ),
+    ]
@@ -3,7 +3,7 @@ from collections import defaultdict
 from functools import reduce
 
 from django.core.paginator import Paginator
-from django.db.models import CharField, F, OuterRef, Q, Subquery, Value
+from django.db.models import CharField, Count, F, Max, OuterRef, Q, Subquery, Value
 from django.utils.functional import cached_property
 
 from zeus.django.model_utils import anyQ, neverQ
@@ -13,6 +13,9 @@ from .util import get_diffable_fields_for_model
 
 # this class is used by the parent resolver. should we move it elsewhere ?
 class ConsecutiveVersionsFetcher:
+    # see HistoryQueryset.with_window_functions
+    use_window_functions = False
+
     def __init__(
         self,
         page_size,
@@ -24,6 +27,8 @@ class ConsecutiveVersionsFetcher:
         fields_by_model=None,
         start_date=None,
         end_date=None,
+        include_archived=False,
+        archive_dir=None,
     ):
         if only_creates and (fields_by_model or exclude_create):
             raise Exception(
@@ -41,6 +46,10 @@ class ConsecutiveVersionsFetcher:
         self.start_date = start_date
         self.end_date = end_date
 
+        # merge in versions moved out by the archive_versions command
+        self.include_archived = include_archived
+        self.archive_dir = archive_dir
+
     @staticmethod
     def unionize_querysets(qs1, qs2):
         return qs1.union(qs2)
@@ -56,17 +65,28 @@ class ConsecutiveVersionsFetcher:
         history_model = live_model._history_class
 
         base_qs = self.get_base_version_qs_for_single_model(live_model)
+        if self.use_window_functions:
+            base_qs = base_qs.with_window_functions()
 
         user_filter = anyQ
         if self.user_ids:
             user_filter = Q(edited_by_id__in=self.user_ids)
         qs = base_qs.with_previous_version_id().filter(user_filter)
 
+        # the oldest version left in the database isn't a creation if older ones were archived
+        archived_anchor_ids = []
+        if self.include_archived:
+            archived_anchor_ids = list(self._get_archive(history_model).read_anchors())
+
         if self.exclude_create:
-            qs = qs.filter(previous_version_id__isnull=False)
+            qs = qs.filter(
+                Q(previous_version_id__isnull=False) | Q(id__in=archived_anchor_ids)
+            )
 
         if self.only_creates:
-            qs = qs.filter(previous_version_id__isnull=True)
+            qs = qs.filter(previous_version_id__isnull=True).exclude(
+                id__in=archived_anchor_ids
+            )
 
         if self.start_date:
             qs = qs.filter(business_date__gte=self.start_date)
@@ -85,12 +105,41 @@ class ConsecutiveVersionsFetcher:
                 if f.name in field_names
             ]
 
+            # versions that record which fields changed need no comparison at all
+            delta_filters = []
+            if history_model.track_changed_fields:
+                delta_filters = [Q(changed_fields__contains=[f.name]) for f in field_objs]
+                field_objs = []
+
+            # delta versions record which fields changed, no need to compare to the previous version
+            elif history_model.delta_snapshot_interval is not None:
+                delta_field_names = history_model.get_delta_field_names()
+                delta_filters = [
+                    Q(delta_fields__contains=[f.attname])
+                    for f in field_objs
+                    if f.attname in delta_field_names
+                ]
+                field_objs = [f for f in field_objs if f.attname not in delta_field_names]
+
+            # same with m2m events, a version has events for the fields it changed
+            if history_model.m2m_history == "events":
+                m2m_field_names = [f.name for f in history_model.m2m_fields]
+                event_versions = history_model.m2m_event_model._base_manager.values(
+                    "version_id"
+                )
+                delta_filters += [
+                    Q(id__in=event_versions.filter(field_name=f.name))
+                    for f in field_objs
+                    if f.name in m2m_field_names
+                ]
+                field_objs = [f for f in field_objs if f.name not in m2m_field_names]
+
             get_annotation_name = lambda field: f"_previous_{field.name}"
             for f in field_objs:
                 prev_field_value_subquery = Subquery(
                     history_model.objects.filter(
                         id=OuterRef("previous_version_id")
-                    ).values(f.attname)[:1]
+                    ).values(history_model.get_stored_attname(f.attname))[:1]
                 )
 
                 qs = qs.annotate(**{get_annotation_name(f): prev_field_value_subquery})
@@ -99,19 +148,22 @@ class ConsecutiveVersionsFetcher:
             # the difference doesn't seem to check for nulls vs. values, so we check that manually
             field_difference_filters = [
                 (
-                    ~Q(**{get_annotation_name(field): F(field.attname)})
+                    ~Q(**{get_annotation_name(field): F(stored_attname)})
                     | (
                         Q(**{f"{get_annotation_name(field)}__isnull": False})
-                        & Q(**{f"{field.attname}__isnull": True})
+                        & Q(**{f"{stored_attname}__isnull": True})
                     )
                     | (
                         Q(**{f"{get_annotation_name(field)}__isnull": True})
-                        & Q(**{f"{field.attname}__isnull": False})
+                        & Q(**{f"{stored_attname}__isnull": False})
                     )
                 )
                 for field in field_objs
+                for stored_attname in [history_model.get_stored_attname(field.attname)]
             ]
-            combined_filter = reduce(operator.__or__, field_difference_filters, neverQ)
+            combined_filter = reduce(
+                operator.__or__, [*delta_filters, *field_difference_filters], neverQ
+            )
 
             qs = qs.filter(combined_filter)
 
@@ -151,8 +203,21 @@ class ConsecutiveVersionsFetcher:
                 self._get_values_qs_for_single_model(m) for m in self.models
             ]
 
-        qs_values_union = reduce(self.unionize_querysets, history_querysets)
-        sorted_union = qs_values_union.order_by("-business_date")
+        if self.include_archived:
+            archived_entries = self._get_archived_entries()
+        else:
+            archived_entries = []
+
+        if archived_entries:
+            sorted_union = MergedVersionEntries(
+                history_querysets,
+                archived_entries,
+                self.unionize_querysets,
+                self._link_anchors_to_archive,
+            )
+        else:
+            qs_values_union = reduce(self.unionize_querysets, history_querysets)
+            sorted_union = qs_values_union.order_by("-business_date")
         paginated_qs = Paginator(sorted_union, self.page_size)
         page = paginated_qs.page(self.page_num)
 
@@ -191,9 +256,27 @@ class ConsecutiveVersionsFetcher:
             for record in model.objects.filter(id__in=ids):
                 eternal_records_by_pair_id[(model, record.id)] = record
 
+            # deleted records (e.g. with tombstones) are recreated from their latest version
+            deleted_ids = {
+                id for id in ids if (model, id) not in eternal_records_by_pair_id
+            }
+            if deleted_ids:
+                for ver in model._history_class.objects.latest_versions_for_eternal_ids(
+                    deleted_ids
+                ):
+                    eternal_records_by_pair_id[
+                        (model, ver.eternal_id)
+                    ] = ver.recreate_original()
+
         for model, ids in version_ids_to_fetch_by_model.items():
             for record in model.objects.filter(id__in=ids):
                 version_records_by_pair_id[(model, record.id)] = record
+            if self.include_archived:
+                for version_id in ids:
+                    if (model, version_id) not in version_records_by_pair_id:
+                        version_records_by_pair_id[
+                            (model, version_id)
+                        ] = self._get_archived_version(model, version_id)
 
         resolved_list = []
         for slim_ver in slim_versions:
@@ -201,9 +284,9 @@ class ConsecutiveVersionsFetcher:
             hist_model = eternal_model._history_class
             resolved = {}
 
-            resolved["eternal"] = eternal_records_by_pair_id[
-                (eternal_model, slim_ver["eternal_id"])
-            ]
+            resolved["eternal"] = eternal_records_by_pair_id.get(
+                (eternal_model, slim_ver["eternal_id"]), None
+            )
 
             resolved["version"] = version_records_by_pair_id[(hist_model, slim_ver["id"])]
 
@@ -218,6 +301,172 @@ class ConsecutiveVersionsFetcher:
 
         return resolved_list
 
+    def _get_archive(self, history_model):
+        from zeus.versioning.archive import VersionArchive
+
+        archives = self.__dict__.setdefault("_archives", {})
+        if history_model not in archives:
+            archives[history_model] = VersionArchive(history_model, self.archive_dir)
+        return archives[history_model]
+
+    def _get_archived_entries(self):
+        """
+        the archived counterpart of the union of _get_values_qs_for_single_model, as dicts
+        archived versions are filtered in python, so only the monthly files overlapping the dates are read
+        """
+        if self.start_date is None:
+            # otherwise every page would decompress the whole archive
+            raise Exception("cant include archived versions without a start_date")
+
+        self._archived_versions = {}
+        models = (
+            list(self.fields_by_model.keys()) if self.fields_by_model else self.models
+        )
+
+        entries = []
+        for live_model in models:
+            history_model = live_model._history_class
+            archive = self._get_archive(history_model)
+            for version in archive.iter_versions(
+                self.start_date,
+                self.end_date,
+                eternal_ids=self.get_archived_eternal_ids(),
+            ):
+                self._archived_versions[(history_model, version.pk)] = version
+                if self._is_archived_version_included(live_model, version):
+                    entries.append(
+                        {
+                            "business_date": version.business_date,
+                            "system_date": version.system_date,
+                            "id": version.pk,
+                            "eternal_id": version.eternal_id,
+                            "model_name": live_model.__name__,
+                            "previous_version_id": version.archived_previous_version_id,
+                        }
+                    )
+
+        entries.sort(key=lambda entry: entry["business_date"], reverse=True)
+        return entries
+
+    def get_archived_eternal_ids(self):
+        """
+        the archived counterpart of get_base_version_qs_for_single_model's filtering
+        """
+        return None
+
+    def _is_archived_version_included(self, live_model, version):
+        previous_id = version.archived_previous_version_id
+        if self.user_ids and getattr(version, "edited_by_id", None) not in self.user_ids:
+            return False
+        if self.exclude_create and previous_id is None:
+            return False
+        if self.only_creates and previous_id is not None:
+            return False
+
+        field_names = (self.fields_by_model or {}).get(live_model, None)
+        if field_names:
+            previous = self._get_archived_version(live_model._history_class, previous_id)
+            return any(
+                getattr(version, f.attname) != getattr(previous, f.attname)
+                for f in get_diffable_fields_for_model(live_model)
+                if f.name in field_names
+            )
+        return True
+
+    def _get_archived_version(self, history_model, version_id):
+        if version_id is None:
+            return None
+        version = self._archived_versions.get((history_model, version_id), None)
+        if version is not None:
+            return version
+
+        archive = self._get_archive(history_model)
+        # previous versions of the oldest entries can fall outside of the date range
+        month = {
+            prev_id: month for prev_id, month in archive.read_anchors().values()
+        }.get(version_id, None)
+        for candidate in archive.iter_versions(
+            months=[month] if month else None, end_date=self.start_date
+        ):
+            self._archived_versions[(history_model, candidate.pk)] = candidate
+        return self._archived_versions.get((history_model, version_id), None)
+
+    def _link_anchors_to_archive(self, entries):
+        models_by_name = {m.__name__: m for m in self.models}
+        for entry in entries:
+            if entry.get("previous_version_id", None) is None:
+                history_model = models_by_name[entry["model_name"]]._history_class
+                anchor = self._get_archive(history_model).read_anchors().get(entry["id"])
+                if anchor:
+                    entry["previous_version_id"] = anchor[0]
+        return entries
+
+
+class MergedVersionEntries:
+    """
+    What the Paginator sees when archived entries are included:
+    database entries newer than the newest archived one are sliced in SQL,
+    the older ones (few, they're mostly anchors) are merged with the archived entries in python
+    """
+
+    def __init__(self, querysets, archived_entries, unionize, link_anchors):
+        self.querysets = querysets
+        self.archived_entries = archived_entries
+        self.newest_archived_date = archived_entries[0]["business_date"]
+        self.unionize = unionize
+        self.link_anchors = link_anchors
+
+    @cached_property
+    def newer_union(self):
+        return reduce(
+            self.unionize,
+            [
+                qs.filter(business_date__gt=self.newest_archived_date)
+                for qs in self.querysets
+            ],
+        ).order_by("-business_date")
+
+    @cached_property
+    def newer_count(self):
+        return self.newer_union.count()
+
+    @cached_property
+    def older_entries(self):
+        older_union = reduce(
+            self.unionize,
+            [
+                qs.filter(business_date__lte=self.newest_archived_date)
+                for qs in self.querysets
+            ],
+        )
+        return sorted(
+            [*self.link_anchors(list(older_union)), *self.archived_entries],
+            key=lambda entry: entry["business_date"],
+            reverse=True,
+        )
+
+    def count(self):
+        return self.newer_count + len(self.older_entries)
+
+    def __len__(self):
+        return self.count()
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            return self[index : index + 1][0]
+
+        start, stop = index.start or 0, index.stop
+        if stop is None:
+            stop = self.count()
+        newer = []
+        if start < self.newer_count:
+            newer = self.link_anchors(
+                list(self.newer_union[start : min(stop, self.newer_count)])
+            )
+        older_start = max(start - self.newer_count, 0)
+        older_stop = max(stop - self.newer_count, 0)
+        return [*newer, *self.older_entries[older_start:older_stop]]
+
 
 class SingleRecordConsecutiveVersionsFetcher(ConsecutiveVersionsFetcher):
     def __init__(self, page_size, page_num, model, primary_key=None):
@@ -231,3 +480,55 @@ class SingleRecordConsecutiveVersionsFetcher(ConsecutiveVersionsFetcher):
     def get_base_version_qs_for_single_model(self, live_model):
         history_model = live_model._history_class
         return history_model.objects.filter(eternal_id=self.primary_key)
+
+    def has_entry_filters(self):
+        # filtered entries skip version numbers
+        return bool(
+            self.user_ids
+            or self.exclude_create
+            or self.only_creates
+            or self.fields_by_model
+            or self.start_date
+            or self.end_date
+        )
+
+    @cached_property
+    def _page_obj(self):
+        live_model = self.models[0]
+        # archived versions leave gaps in the numbers
+        if (
+            not live_model._history_class.number_versions
+            or self.include_archived
+            or self.has_entry_filters()
+        ):
+            return super()._page_obj
+
+        numbers = (
+            self.get_base_version_qs_for_single_model(live_model)
+            .order_by()
+            .aggregate(latest=Max("version_number"), count=Count("id"))
+        )
+        # numbers are unique per record, with as many versions as the highest one they're contiguous
+        # and a page is a version_number range rather than an OFFSET
+        latest_number = numbers["latest"] or 0
+        if latest_number != numbers["count"]:
+            return super()._page_obj
+
+        page = Paginator(range(latest_number), self.page_size).page(self.page_num)
+        if latest_number:
+            page.object_list = list(
+                self._get_values_qs_for_single_model(live_model)
+                .filter(
+                    version_number__range=(
+                        latest_number - page.end_index() + 1,
+                        latest_number - page.start_index() + 1,
+                    )
+                )
+                .order_by("-version_number")
+            )
+        else:
+            page.object_list = []
+        return page
+
+    def get_archived_eternal_ids(self):
+        return [self.primary_key]
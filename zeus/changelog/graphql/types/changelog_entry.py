@@ -8,7 +8,7 @@ from zeus.graphql.types.version import Version
 from zeus.graphql.utils import NonSerializable, non_serializable_field
 
 from .changelog_entry_field_entry import ChangelogEntryFieldEntry
-from .diff import CreateDiff, Diff, get_field_diff_for_version_pair
+from .diff import CreateDiff, DeleteDiff, Diff, get_field_diff_for_version_pair
 
 
 class ChangelogEntry(graphene.ObjectType):
@@ -88,10 +88,19 @@ class ChangelogEntry(graphene.ObjectType):
             eternal = parent["eternal"]
             return [CreateDiff()]
 
+        if getattr(this_version, "is_deleted", False):
+            # a tombstone, see VersionModel.live_delete_strategy
+            return [] if specified_fields else [DeleteDiff()]
+
         fields_to_diff = get_diffable_fields_for_model(this_version.live_model)
         if specified_fields:
             fields_to_diff = [f for f in fields_to_diff if f.name in specified_fields]
 
+        # versions that record which fields changed only need those compared
+        changed_fields = getattr(this_version, "changed_fields", None)
+        if changed_fields is not None:
+            fields_to_diff = [f for f in fields_to_diff if f.name in changed_fields]
+
         field_diff_objs = []
         for f in fields_to_diff:
             field_diff_obj = get_field_diff_for_version_pair(
@@ -1,5 +1,6 @@
 import inspect
 
+from django.core.exceptions import FieldDoesNotExist
 from django.db.models import ForeignKey, JSONField, ManyToManyField
 from django.utils.functional import cached_property
 from django.utils.html import escape
@@ -126,8 +127,8 @@ class AsyncDiffObject(DiffObject):
 class M2MDiffObject(AsyncDiffObject):
     @genfunc_to_prom
     def _compute_diffs(self):
-        prev_id_list = self.previous_version.serializable_value(self.field.name)
-        current_id_list = self.current_version.serializable_value(self.field.name)
+        prev_id_list = self.previous_version.get_m2m_ids(self.field.name)
+        current_id_list = self.current_version.get_m2m_ids(self.field.name)
 
         related_model = self.field.related_model
         related_dataloader_cls = PrimaryKeyDataLoaderFactory.get_model_by_id_loader(
@@ -186,8 +187,15 @@ def is_field_different_accross_versions(current_version, previous_version, field
     current_db_value = current_version.serializable_value(field_name)
     prev_db_value = previous_version.serializable_value(field_name)
 
-    field_obj = current_version._meta.get_field(field_name)
-    if isinstance(field_obj, JSONField):
+    try:
+        field_obj = current_version._meta.get_field(field_name)
+    except FieldDoesNotExist:
+        # deduplicated fields are properties on versions
+        field_obj = current_version.live_model._meta.get_field(field_name)
+    if (
+        isinstance(field_obj, JSONField)
+        or getattr(field_obj, "value_type", None) == "json"
+    ):
         return current_db_value != prev_db_value
 
     if current_db_value == prev_db_value or (
@@ -72,6 +72,9 @@ class VersionComparisonEntry(graphene.ObjectType):
         loader_inst = LoaderCls(info.context.dataloaders)
         left_ver = yield loader_inst.load(parent["left_id"])
         right_ver = yield loader_inst.load(parent["right_id"])
+        if getattr(right_ver, "is_deleted", False):
+            # a tombstone, see VersionModel.live_delete_strategy
+            return [DeleteDiff()]
 
         field_diff_objs = []
         for f in fields_to_diff:
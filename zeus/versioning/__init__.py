@@ -1 +1,21 @@
-from .core import HistoryManager, HistoryQueryset, VersionModel
+# core is imported lazily so that this package can be listed in INSTALLED_APPS
+# (for its management commands) without touching models before the app registry is ready
+
+default_app_config = "zeus.versioning.apps.VersioningConfig"
+
+__all__ = [
+    "HistoryManager",
+    "HistoryQueryset",
+    "VersionedLiveManager",
+    "VersionedLiveQuerySet",
+    "VersionModel",
+]
+
+
+def __getattr__(name):
+    if name in __all__:
+        from . import core
+
+        return getattr(core, name)
+
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,16 @@
+from django.apps import AppConfig
+from django.db.models import signals
+
+
+class VersioningConfig(AppConfig):
+    name = "zeus.versioning"
+    label = "zeus_versioning"
+    verbose_name = "Zeus versioning"
+
+    def ready(self):
+        from .middleware import connect_whodid_receiver, connect_whodid_receivers
+
+        connect_whodid_receivers()
+        signals.class_prepared.connect(
+            connect_whodid_receiver, dispatch_uid="zeus-whodid"
+        )
@@ -0,0 +1,216 @@
+"""
+Cold storage for old versions: gzipped JSON lines, one file per version model per month,
+with an index.json of what each file holds.
+Each record keeps its latest version from before the cutoff in the database (its "anchor"),
+so current state, as_of and previous-version lookups on recent versions still work
+"""
+import gzip
+import json
+from itertools import groupby
+from operator import attrgetter
+from pathlib import Path
+
+from django.conf import settings
+from django.core import serializers
+from django.core.serializers.json import DjangoJSONEncoder
+from django.utils.dateparse import parse_datetime
+
+from .core import VersioningConfigException
+
+
+def get_archive_dir(archive_dir=None):
+    archive_dir = archive_dir or getattr(settings, "ZEUS_VERSION_ARCHIVE_DIR", None)
+    if not archive_dir:
+        raise VersioningConfigException(
+            "set ZEUS_VERSION_ARCHIVE_DIR, or pass an archive directory"
+        )
+    return Path(archive_dir)
+
+
+class VersionArchive:
+    def __init__(self, version_cls, archive_dir=None):
+        self.version_cls = version_cls
+        self.date_field_name = version_cls.get_valid_from_field_name()
+        self.path = get_archive_dir(archive_dir) / version_cls._meta.label_lower
+
+    @property
+    def index_path(self):
+        return self.path / "index.json"
+
+    @property
+    def anchors_path(self):
+        return self.path / "anchors.json"
+
+    def get_month_path(self, month):
+        return self.path / f"{month}.jsonl.gz"
+
+    def _read_json(self, path):
+        if not path.exists():
+            return {}
+        return json.loads(path.read_text())
+
+    def _write_json(self, path, content):
+        # write then rename, so that readers never see a partial file
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(content, sort_keys=True, indent=1))
+        tmp_path.replace(path)
+
+    def read_index(self):
+        return self._read_json(self.index_path)
+
+    def read_anchors(self):
+        """
+        {anchor version id: [id of its archived previous version, month of that version]}
+        """
+        return {int(k): v for k, v in self._read_json(self.anchors_path).items()}
+
+    def get_month(self, version):
+        return getattr(version, self.date_field_name).strftime("%Y-%m")
+
+    def write(self, versions_with_previous_ids, anchors=None):
+        """
+        appends (version, previous version id) pairs to their monthly files,
+        versions must be fully loaded, i.e. from a HistoryQueryset
+        """
+        lines_by_month = {}
+        for version, previous_id in versions_with_previous_ids:
+            [row] = serializers.serialize("python", [version])
+            row["previous_version_id"] = previous_id
+            if self.version_cls.m2m_history == "events":
+                # not columns, so not serialized
+                row["m2m_ids"] = {
+                    f.attname: getattr(version, f.attname)
+                    for f in self.version_cls.m2m_fields
+                }
+            lines_by_month.setdefault(self.get_month(version), []).append(
+                (version, json.dumps(row, cls=DjangoJSONEncoder))
+            )
+
+        self.path.mkdir(parents=True, exist_ok=True)
+        index = self.read_index()
+        for month, lines in lines_by_month.items():
+            # appending adds a gzip member, gzip readers see a single stream
+            with gzip.open(self.get_month_path(month), "at", encoding="utf-8") as f:
+                f.writelines(line + "\n" for _version, line in lines)
+
+            dates = [getattr(version, self.date_field_name) for version, _line in lines]
+            entry = index.get(month, None)
+            if entry is not None:
+                dates += [parse_datetime(entry["first"]), parse_datetime(entry["last"])]
+            index[month] = {
+                "count": len(lines) + (entry["count"] if entry else 0),
+                "first": min(dates).isoformat(),
+                "last": max(dates).isoformat(),
+            }
+        self._write_json(self.index_path, index)
+
+        if anchors:
+            self._write_json(self.anchors_path, {**self.read_anchors(), **anchors})
+
+    def get_months(self, start_date=None, end_date=None):
+        months = []
+        for month, entry in sorted(self.read_index().items()):
+            if start_date and parse_datetime(entry["last"]) < start_date:
+                continue
+            if end_date and parse_datetime(entry["first"]) > end_date:
+                continue
+            months.append(month)
+        return months
+
+    def iter_versions(
+        self, start_date=None, end_date=None, eternal_ids=None, months=None
+    ):
+        """
+        yields unsaved version instances, with an archived_previous_version_id attribute
+        a version may show up twice if an archiving run was interrupted after writing, see the id check
+        """
+        if eternal_ids is not None:
+            eternal_ids = set(eternal_ids)
+        seen_ids = set()
+        for month in months or self.get_months(start_date, end_date):
+            with gzip.open(self.get_month_path(month), "rt", encoding="utf-8") as f:
+                for line in f:
+                    version = self._deserialize(line)
+                    date = getattr(version, self.date_field_name)
+                    if (
+                        version.pk in seen_ids
+                        or (start_date and date < start_date)
+                        or (end_date and date > end_date)
+                        or (
+                            eternal_ids is not None
+                            and version.eternal_id not in eternal_ids
+                        )
+                    ):
+                        continue
+                    seen_ids.add(version.pk)
+                    yield version
+
+    def get_version(self, version_id, month):
+        for version in self.iter_versions(months=[month]):
+            if version.pk == version_id:
+                return version
+        return None
+
+    def _deserialize(self, line):
+        row = json.loads(line)
+        previous_id = row.pop("previous_version_id")
+        m2m_ids = row.pop("m2m_ids", {})
+        [deserialized] = serializers.deserialize("python", [row])
+        version = deserialized.object
+        version.archived_previous_version_id = previous_id
+        for attname, ids in m2m_ids.items():
+            setattr(version, attname, ids)
+        return version
+
+
+def archive_records_before(version_cls, eternal_ids, cutoff, archive, using=None):
+    """
+    moves the versions of some records from before cutoff to the archive, except for each record's anchor
+    returns the number of archived versions
+    run inside a transaction: the rows are deleted once written
+    """
+    date_field_name = version_cls.get_valid_from_field_name()
+    versions = (
+        version_cls.objects.using(using)
+        .filter(eternal_id__in=eternal_ids, **{f"{date_field_name}__lt": cutoff})
+        .order_by("eternal_id", *version_cls.get_version_ordering())
+    )
+
+    to_archive = []
+    anchors = {}
+    # archived version id -> the version that takes over its m2m events
+    successor_ids = {}
+    for _eternal_id, record_versions in groupby(versions, key=attrgetter("eternal_id")):
+        record_versions = list(record_versions)
+        anchor = record_versions[-1]
+        # delta versions need the rows since their snapshot
+        keep_from_id = anchor.pk
+        if version_cls.delta_snapshot_interval is not None:
+            keep_from_id = anchor.delta_base_id or anchor.pk
+
+        last_archived = None
+        first_kept = anchor
+        for version in record_versions[:-1]:
+            if version.pk >= keep_from_id:
+                first_kept = version
+                break
+            to_archive.append((version, last_archived and last_archived.pk))
+            last_archived = version
+
+        # the oldest version left in the database points back into the archive
+        if last_archived is not None:
+            anchors[first_kept.pk] = [last_archived.pk, archive.get_month(last_archived)]
+            for version in record_versions:
+                if version.pk < keep_from_id:
+                    successor_ids[version.pk] = first_kept.pk
+
+    if not to_archive:
+        return 0
+
+    archive.write(to_archive, anchors=anchors)
+    if version_cls.m2m_history == "events":
+        version_cls.move_m2m_events(successor_ids, using=using)
+    version_cls._base_manager.using(using).filter(
+        id__in=[version.pk for version, _previous_id in to_archive]
+    ).delete()
+    return len(to_archive)
@@ -0,0 +1,208 @@
+"""
+Writes versions from a worker thread, so that requests only pay for the live row write.
+Versions are built in the request (same timestamps, same pre_save receivers),
+queued once the live write commits, and inserted in batches with bulk_create
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import close_old_connections, router, transaction
+
+from .core import VersioningConfigException
+
+logger = logging.getLogger(__name__)
+
+DURABILITY_MODES = ("on_commit", "best_effort")
+
+_stop = object()
+
+
+class BackgroundVersionWriter:
+    """
+    on_commit durability: a commit wakes the writer up to insert right away,
+    queueing blocks while the queue is full,
+    and a failed batch is retried one version at a time so only the bad versions are lost
+
+    best_effort durability: versions wait up to flush_interval to be batched with others,
+    versions are dropped when the queue is full,
+    and a failed batch is dropped
+
+    either way, versions still queued when the process dies are lost, see shutdown
+    """
+
+    def __init__(self, batch_size=500, flush_interval=1.0, max_queue_size=10000):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue_size)
+        self.thread = None
+        self.dropped_version_writes = 0
+
+    def start(self):
+        self.thread = threading.Thread(
+            target=self.run, name="zeus-version-writer", daemon=True
+        )
+        self.thread.start()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def put(self, version_cls, versions, using, durability):
+        item = (version_cls, versions, using, durability)
+        if durability == "on_commit":
+            self.queue.put(item)
+            return
+
+        try:
+            self.queue.put_nowait(item)
+        except queue.Full:
+            self.dropped_version_writes += len(versions)
+            logger.warning(
+                "version queue full, dropped %s %s",
+                len(versions),
+                version_cls._meta.label,
+            )
+
+    def run(self):
+        while True:
+            items = self.get_batch(block=True)
+            stopping = _stop in items
+            self.write_batch([item for item in items if item is not _stop])
+            for _item in items:
+                self.queue.task_done()
+            close_old_connections()
+            if stopping:
+                return
+
+    def get_batch(self, block):
+        items = []
+        try:
+            items.append(self.queue.get(block=block))
+        except queue.Empty:
+            return items
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(items) < self.batch_size and items[-1] is not _stop:
+            # on_commit versions don't wait for company
+            wait = items[-1][3] != "on_commit"
+            timeout = deadline - time.monotonic()
+            try:
+                if wait and timeout > 0:
+                    items.append(self.queue.get(timeout=timeout))
+                else:
+                    items.append(self.queue.get_nowait())
+            except queue.Empty:
+                break
+        return items
+
+    def write_batch(self, items):
+        # one bulk insert per version class and database, in queueing order
+        grouped = defaultdict(list)
+        for version_cls, versions, using, durability in items:
+            grouped[(version_cls, using, durability)].extend(versions)
+
+        for (version_cls, using, durability), versions in grouped.items():
+            try:
+                self.write_versions(version_cls, versions, using)
+            except Exception:
+                logger.exception(
+                    "failed writing %s %s", len(versions), version_cls._meta.label
+                )
+                if durability == "on_commit" and len(versions) > 1:
+                    for ver in versions:
+                        self.retry_version(version_cls, ver, using)
+
+    def write_versions(self, version_cls, versions, using):
+        if version_cls.skip_unchanged_versions:
+            _, versions = version_cls._drop_unchanged_versions(versions, versions, using)
+        if versions:
+            version_cls.bulk_insert_versions(versions, using=using)
+
+    def retry_version(self, version_cls, ver, using):
+        ver.pk = None
+        ver._restore_full_state()
+        try:
+            self.write_versions(version_cls, [ver], using)
+        except Exception:
+            logger.exception(
+                "failed writing %s for %s", version_cls._meta.label, ver.eternal_id
+            )
+
+    def drain(self):
+        """
+        writes everything queued so far, from the calling thread if the writer isn't running
+        """
+        if self.is_running():
+            self.queue.join()
+            return
+
+        while True:
+            items = self.get_batch(block=False)
+            if not items:
+                return
+            self.write_batch([item for item in items if item is not _stop])
+            for _item in items:
+                self.queue.task_done()
+
+    def stop(self, timeout=None):
+        if self.is_running():
+            self.queue.put(_stop)
+            self.thread.join(timeout)
+            if self.thread.is_alive():
+                return
+        self.drain()
+
+
+_version_writer = None
+_version_writer_lock = threading.Lock()
+
+
+def get_version_writer():
+    """
+    the process's writer, started on first use
+    settings.ZEUS_VERSION_WRITER holds BackgroundVersionWriter's kwargs
+    """
+    global _version_writer
+    with _version_writer_lock:
+        if _version_writer is None:
+            _version_writer = BackgroundVersionWriter(
+                **getattr(settings, "ZEUS_VERSION_WRITER", {})
+            )
+            _version_writer.start()
+            atexit.register(shutdown_version_writer)
+        return _version_writer
+
+
+def shutdown_version_writer(timeout=None):
+    """
+    writes out whatever is still queued and stops the writer,
+    call it from a worker's shutdown hook if atexit doesn't run there
+    """
+    global _version_writer
+    with _version_writer_lock:
+        writer, _version_writer = _version_writer, None
+    if writer is not None:
+        writer.stop(timeout)
+
+
+def queue_version_writes(version_cls, live_instances, using=None):
+    durability = version_cls.background_write_durability
+    if durability not in DURABILITY_MODES:
+        raise VersioningConfigException(
+            f"{version_cls.__name__}.background_write_durability must be one of {DURABILITY_MODES}"
+        )
+
+    using = using or router.db_for_write(version_cls)
+    versions = version_cls.bulk_build_from_originals(live_instances, using=using)
+    if not versions:
+        return
+
+    # the worker's connection can't see the live rows before they're committed
+    transaction.on_commit(
+        lambda: get_version_writer().put(version_cls, versions, using, durability),
+        using=using,
+    )
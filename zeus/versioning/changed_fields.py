@@ -0,0 +1,52 @@
+"""
+Indexing of the changed_fields column, for version models with track_changed_fields = True
+
+changelogs filtered by field look versions up with changed_fields @> '["field"]',
+on PostgreSQL a GIN index answers that without scanning the table.
+Other databases get no index
+"""
+from django.db.migrations.operations.base import Operation
+
+
+def get_index_name(version_cls):
+    return f"{version_cls._meta.db_table}_changed_fields_gin"[-63:]
+
+
+class IndexChangedFields(Operation):
+    """
+    add this to a migration after the version model's changed_fields column exists,
+    e.g. IndexChangedFields("bookversion")
+    """
+
+    reversible = True
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def deconstruct(self):
+        return (self.__class__.__qualname__, [self.model_name], {})
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        version_cls = to_state.apps.get_model(app_label, self.model_name)
+        quote = schema_editor.quote_name
+        column = version_cls._meta.get_field("changed_fields").column
+        schema_editor.execute(
+            f"CREATE INDEX IF NOT EXISTS {quote(get_index_name(version_cls))} "
+            f"ON {quote(version_cls._meta.db_table)} USING gin ({quote(column)})"
+        )
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor != "postgresql":
+            return
+        version_cls = from_state.apps.get_model(app_label, self.model_name)
+        schema_editor.execute(
+            f"DROP INDEX IF EXISTS {schema_editor.quote_name(get_index_name(version_cls))}"
+        )
+
+    def describe(self):
+        return f"Index the changed fields of {self.model_name}"
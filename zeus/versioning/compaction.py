@@ -0,0 +1,112 @@
+"""
+Thins out history: squashes consecutive identical versions,
+and keeps a single version per day for days older than a given date
+"""
+from itertools import groupby
+from operator import attrgetter
+
+from django.db.models import F, Max
+from django.utils import timezone
+
+
+def select_kept_versions(record_versions, date_field_name, daily_before=None):
+    """
+    record_versions are a record's versions, oldest first
+    """
+    kept = record_versions
+    if daily_before is not None:
+        # a day's last version holds the state that day ended with
+        kept = []
+        for ver in record_versions:
+            date = getattr(ver, date_field_name)
+            if (
+                kept
+                and date < daily_before
+                and timezone.localtime(getattr(kept[-1], date_field_name)).date()
+                == timezone.localtime(date).date()
+            ):
+                kept[-1] = ver
+            else:
+                kept.append(ver)
+
+    squashed = []
+    for ver in kept:
+        # the first of identical versions is the one that made the change
+        if squashed and squashed[-1].get_snapshot() == ver.get_snapshot():
+            continue
+        squashed.append(ver)
+    return squashed
+
+
+def compact_records(
+    version_cls, eternal_ids, daily_before=None, dry_run=False, using=None
+):
+    """
+    returns the number of versions deleted (or that would be, with dry_run)
+    run inside a transaction
+    """
+    date_field_name = version_cls.get_valid_from_field_name()
+    versions = (
+        version_cls.objects.using(using)
+        .filter(eternal_id__in=eternal_ids)
+        .order_by("eternal_id", *version_cls.get_version_ordering())
+    )
+
+    deleted_ids = []
+    kept_by_eternal_id = {}
+    # deleted version id -> the next version kept
+    successor_ids = {}
+    for eternal_id, record_versions in groupby(versions, key=attrgetter("eternal_id")):
+        record_versions = list(record_versions)
+        kept = select_kept_versions(record_versions, date_field_name, daily_before)
+        if len(kept) == len(record_versions):
+            continue
+        kept_ids = {ver.pk for ver in kept}
+        # versions after the last one kept are identical to it
+        successor_id = kept[-1].pk
+        for ver in reversed(record_versions):
+            if ver.pk in kept_ids:
+                successor_id = ver.pk
+            else:
+                deleted_ids.append(ver.pk)
+                successor_ids[ver.pk] = successor_id
+        kept_by_eternal_id[eternal_id] = kept
+
+    if dry_run or not deleted_ids:
+        return len(deleted_ids)
+
+    if version_cls.m2m_history == "events":
+        version_cls.move_m2m_events(successor_ids, using=using)
+
+    manager = version_cls._base_manager.using(using)
+    manager.filter(id__in=deleted_ids).delete()
+
+    if version_cls.number_versions:
+        renumber_versions(version_cls, kept_by_eternal_id, using)
+    if version_cls.delta_snapshot_interval is not None:
+        for kept in kept_by_eternal_id.values():
+            version_cls.rebase_deltas(kept, using=using)
+    if version_cls.track_validity:
+        version_cls.rebuild_validity(list(kept_by_eternal_id), using=using)
+    if version_cls.track_changed_fields:
+        # kept versions now follow different ones
+        for kept in kept_by_eternal_id.values():
+            version_cls.rebuild_changed_fields(kept, using=using)
+
+    return len(deleted_ids)
+
+
+def renumber_versions(version_cls, kept_by_eternal_id, using):
+    manager = version_cls._base_manager.using(using)
+    records = manager.filter(eternal_id__in=list(kept_by_eternal_id))
+
+    # numbers are unique per record: shift them out of the way before assigning new ones
+    offset = records.aggregate(latest=Max("version_number"))["latest"] + 1
+    records.update(version_number=F("version_number") + offset)
+
+    renumbered = []
+    for kept in kept_by_eternal_id.values():
+        for number, ver in enumerate(kept, start=1):
+            ver.version_number = number
+            renumbered.append(ver)
+    manager.bulk_update(renumbered, ["version_number"])
@@ -0,0 +1 @@
+from zeus.versioning.testing.fixtures import *
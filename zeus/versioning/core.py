@@ -1,9 +1,48 @@
-from django.db import models
-from django.db.models import F, Manager, OuterRef, QuerySet, Subquery
+import hashlib
+import json
+import threading
+from collections import defaultdict
+from contextlib import nullcontext
+from functools import partial, reduce
+from itertools import groupby, islice
+from operator import attrgetter, or_
+
+from django.apps import apps
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import DEFAULT_DB_ALIAS, connections, models, router, transaction
+from django.db.models import (
+    Case,
+    F,
+    Manager,
+    Max,
+    OuterRef,
+    Q,
+    QuerySet,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
 from django.db.models.base import ModelBase
-from django.db.models.signals import m2m_changed, post_save
+from django.db.models.expressions import Col
+from django.db.models.query import ModelIterable
+from django.db.models.signals import m2m_changed, post_save, pre_delete, pre_save
+from django.db.models.sql.datastructures import BaseTable
 from django.utils import timezone
 
+from asgiref.sync import sync_to_async
+
+from .deletion import DELETE_STRATEGIES, is_database_cascade_supported
+from .fields import CompressedField
+from .instrumentation import count_version_writes, measure_version_writes
+from .partitioning import PARTITION_INTERVALS
+from .triggers import (
+    check_trigger_versioning,
+    forward_acting_user,
+    get_acting_user_id,
+    versioning_session,
+)
+
 # other imports, to remove
 
 
@@ -15,67 +54,514 @@ class VersioningConfigException(VersioningException):
     pass
 
 
-def find_m2m_field(from_class, to_class):
-    return next(
-        rel
-        for rel in from_class._meta.get_fields()
-        if isinstance(rel, models.ManyToManyField) and rel.related_model is to_class
+# through model -> [(versioned ManyToManyField, version class)], filled in as version classes are created
+# the version class isn't always field.model's, an m2m declared on a parent model is versioned by its child's,
+# and by the parent's own if both are versioned
+versioned_m2m_fields_by_through = {}
+
+
+class PendingVersionBuffer:
+    """
+    Collects the (version class, eternal id) pairs touched during a transaction.
+    On commit, each touched record gets exactly one version,
+    built from its committed state with one bulk insert per version class and savepoint
+
+    pairs are kept per savepoint, each with its own on_commit flush. Django drops the flush
+    of a savepoint that rolls back, so records only touched there get no version
+    """
+
+    def __init__(self, using):
+        self.using = using
+        # savepoint ids -> version class -> eternal ids, dicts rather than sets to keep insertion order
+        self.pending = {}
+        # version class -> eternal ids already versioned by an earlier flush of this commit
+        self.flushed = defaultdict(set)
+
+    def add(self, version_cls, eternal_id):
+        # atomic blocks without a savepoint add None, they can't roll back on their own
+        savepoint_ids = tuple(
+            sid
+            for sid in transaction.get_connection(self.using).savepoint_ids
+            if sid is not None
+        )
+        if savepoint_ids not in self.pending:
+            self.pending[savepoint_ids] = defaultdict(dict)
+            transaction.on_commit(partial(self.flush, savepoint_ids), using=self.using)
+        self.pending[savepoint_ids][version_cls][eternal_id] = None
+
+    def is_registered(self):
+        # on_commit callbacks are dropped when their (sub)transaction is rolled back
+        # and cleared once they've run, either way this buffer is stale
+        connection = transaction.get_connection(self.using)
+        return any(
+            getattr(entry[1], "func", None) == self.flush
+            for entry in connection.run_on_commit
+        )
+
+    def flush(self, savepoint_ids):
+        pending = self.pending.pop(savepoint_ids)
+        with transaction.atomic(using=self.using):
+            for version_cls, eternal_ids in pending.items():
+                flushed = self.flushed[version_cls]
+                eternal_ids = [i for i in eternal_ids if i not in flushed]
+                if not eternal_ids:
+                    continue
+                flushed.update(eternal_ids)
+                # re-reading rows handles deleted records
+                live_records = (
+                    version_cls.live_model._base_manager.using(self.using)
+                    .filter(pk__in=eternal_ids)
+                    .order_by("pk")
+                )
+                write_versions_for(version_cls, live_records, self.using)
+
+
+_pending_version_buffers = threading.local()
+
+_skipped_version_writes_lock = threading.Lock()
+
+
+def get_pending_version_buffer(using):
+    using = using or DEFAULT_DB_ALIAS
+    buffers = _pending_version_buffers.__dict__.setdefault("by_alias", {})
+    buffer = buffers.get(using, None)
+    if buffer is None or not buffer.is_registered():
+        buffer = PendingVersionBuffer(using)
+        buffers[using] = buffer
+
+    return buffer
+
+
+def write_versions_for(version_cls, live_records, using):
+    with measure_version_writes(version_cls, using):
+        if version_cls.write_versions_in_background:
+            from .background import queue_version_writes
+
+            queue_version_writes(version_cls, live_records, using=using)
+        else:
+            version_cls.bulk_create_from_originals(live_records, using=using)
+
+
+def should_buffer_version(version_cls, using):
+    return (
+        version_cls.coalesce_versions_in_transaction
+        and transaction.get_connection(using).in_atomic_block
     )
 
 
-def on_m2m_change(instance, action, model, pk_set, **_kwargs):
-    field = find_m2m_field(instance.__class__, model)
+def on_m2m_change(sender, instance, action, reverse, pk_set, using=None, **_kwargs):
+    registered = versioned_m2m_fields_by_through[sender]
+    if reverse:
+        # instance is on the related side, pk_set holds live records of any of the version classes
+        for field, history_class in registered:
+            with measure_version_writes(history_class, using):
+                on_reverse_m2m_change(
+                    history_class, field, instance, action, pk_set, using
+                )
+        return
 
-    hidden_attr = f"_{field.name}_m2m_ids"
-    if not hasattr(instance, hidden_attr):
+    history_class = getattr(type(instance), "_history_class", None)
+    field = next((f for f, cls in registered if cls is history_class), None)
+    if field is None:
+        # e.g. the unversioned parent of a versioned model
+        return
 
-        # m2m changes, when performed on their own, wont trigger a new version. So we call .save() to force a new version
+    with measure_version_writes(history_class, using):
+        if should_buffer_version(history_class, using):
+            if action.startswith("post_"):
+                get_pending_version_buffer(using).add(history_class, instance.pk)
+            return
+
+        if action not in ("post_add", "post_remove", "post_clear"):
+            return
+
+        if history_class.write_versions_in_background:
+            write_versions_for(history_class, [instance], using)
+            return
+
+        # m2m changes, when performed on their own, wont trigger a new version
         # BUT, a form is expected to create a single version
         # so we keep track of this state manually via an attribute
         # TODO: find a way to autmatically clear this attribute
-        if not (
-            hasattr(instance, "_apply_changes_to_last_ver")
-            and instance._apply_changes_to_last_ver
-        ):
-            instance.save()
+        if getattr(instance, "_apply_changes_to_last_ver", False):
+            # a second try re-reads the latest version, when the cached one has been superseded
+            for _attempt in range(2):
+                version_id, old_ids = get_current_version_m2m_ids(instance, field)
+                if version_id is None:
+                    break
+                if apply_m2m_change_in_place(
+                    history_class,
+                    instance,
+                    field,
+                    version_id,
+                    old_ids,
+                    action,
+                    pk_set,
+                    using,
+                ):
+                    count_version_writes(history_class, "updated")
+                    return
+                forget_current_version(instance)
+
+        # the relation is already updated, so a fresh version captures it
+        version = history_class.create_from_original(instance)
+        remember_current_version(instance, version)
+
+
+def apply_m2m_change_in_place(
+    history_class, instance, field, version_id, old_ids, action, pk_set, using
+):
+    """
+    applies an m2m change to the version with version_id,
+    returns False without writing anything when it isn't the record's latest version anymore
+    """
+    if action == "post_add":
+        new_ids = set(old_ids).union(set(pk_set))
+    elif action == "post_remove":
+        new_ids = set(old_ids) - set(pk_set)
+    else:
+        new_ids = []
+    new_ids = history_class.serialize_m2m_ids(new_ids)
+
+    # e.g. another instance of the same row saved since this one cached its version
+    manager = history_class._base_manager.using(using)
+    latest = manager.filter(id=version_id).filter(
+        id=Subquery(
+            manager.filter(eternal_id=OuterRef("eternal_id"))
+            .order_by(*history_class.get_latest_first_ordering())
+            .values("id")[:1]
+        )
+    )
+
+    changed_fields_update = get_changed_fields_update(
+        history_class,
+        instance,
+        version_id,
+        field,
+        set(old_ids) != set(new_ids),
+        using,
+    )
+
+    if history_class.m2m_history == "events":
+        if not latest.exists():
+            return False
+        history_class.add_m2m_events(
+            version_id, instance.pk, field.name, old_ids, new_ids, using=using
+        )
+        if changed_fields_update:
+            latest.update(**changed_fields_update)
+    # only the json column changes, skip the full-row save
+    elif not latest.update(**{field.name: new_ids}, **changed_fields_update):
+        return False
+
+    setattr(instance, f"_{field.name}_m2m_ids", new_ids)
+    if hasattr(instance, "_version_snapshot"):
+        instance._version_snapshot[1][field.name] = new_ids
+    return True
+
+
+def on_reverse_m2m_change(history_class, field, related_instance, action, pk_set, using):
+    # one per version class, they all see the same clear()
+    hidden_attr = f"_{field.name}_cleared_live_ids_{history_class._meta.label_lower}"
+    if action == "pre_clear":
+        # clear() doesn't say which live records it affects, find out before they're gone
+        through = field.remote_field.through
+        source_attname = through._meta.get_field(field.m2m_field_name()).attname
+        target_attname = through._meta.get_field(field.m2m_reverse_field_name()).attname
+        live_ids = (
+            through._base_manager.using(using)
+            .filter(**{target_attname: related_instance.pk})
+            .values_list(source_attname, flat=True)
+        )
+        setattr(related_instance, hidden_attr, list(live_ids))
+        return
+
+    if action == "post_clear":
+        live_ids = getattr(related_instance, hidden_attr, [])
+        delattr(related_instance, hidden_attr)
+    elif action in ("post_add", "post_remove"):
+        live_ids = pk_set
+    else:
+        return
+
+    if should_buffer_version(history_class, using):
+        buffer = get_pending_version_buffer(using)
+        for live_id in live_ids:
+            buffer.add(history_class, live_id)
+        return
+
+    # every affected live record gets a new version, in a single batch
+    live_records = (
+        history_class.live_model._base_manager.using(using)
+        .filter(pk__in=list(live_ids))
+        .order_by("pk")
+    )
+    write_versions_for(history_class, live_records, using)
+
+
+def remember_current_version(live_instance, version):
+    """
+    caches what the live instance's latest version holds,
+    so that later m2m changes can update it without reading it back
+    """
+    live_instance._apply_changes_to_last_ver = True
+    live_instance._current_version_id = version.pk
+    for f in version.m2m_fields:
+        setattr(live_instance, f"_{f.name}_m2m_ids", getattr(version, f.attname))
+    if version.skip_unchanged_versions:
+        live_instance._version_snapshot = (version.pk, version.get_snapshot())
+    if version.track_changed_fields:
+        live_instance._current_changed_fields = (version.pk, version.changed_fields)
+
+
+def merge_changed_fields(changed_fields, more_changed_fields):
+    return [
+        *changed_fields,
+        *[name for name in more_changed_fields if name not in changed_fields],
+    ]
+
+
+def get_changed_fields_update(
+    history_class, live_instance, version_id, field, changed, using
+):
+    """
+    the update that adds an m2m field changed in place to the current version's changed_fields
+    """
+    if not history_class.track_changed_fields or not changed:
+        return {}
+
+    cached_version_id, changed_fields = getattr(
+        live_instance, "_current_changed_fields", (None, None)
+    )
+    if cached_version_id != version_id:
+        changed_fields = (
+            history_class._base_manager.using(using)
+            .filter(id=version_id)
+            .values_list("changed_fields", flat=True)
+            .first()
+        )
+    if changed_fields is None or field.name in changed_fields:
+        live_instance._current_changed_fields = (version_id, changed_fields)
+        return {}
 
-        initial_ids = [obj.pk for obj in getattr(instance, field.name).all()]
-        setattr(instance, hidden_attr, initial_ids)
+    changed_fields = merge_changed_fields(changed_fields, [field.name])
+    live_instance._current_changed_fields = (version_id, changed_fields)
+    return {"changed_fields": changed_fields}
 
-    if action in ("post_add", "post_remove"):
-        old_ids = getattr(instance, hidden_attr)
-        if action == "post_remove":
-            new_ids = set(old_ids) - set(pk_set)
 
-        if action == "post_add":
-            new_ids = set(old_ids).union(set(pk_set))
+def forget_current_version(live_instance):
+    # what remember_current_version cached is stale, it's read again when needed
+    live_instance._current_version_id = None
+    live_instance.__dict__.pop("_version_snapshot", None)
 
-        new_ids = sorted(new_ids)
-        setattr(instance, hidden_attr, new_ids)
 
-        related_versions = instance.versions
-        related_versions.last().set_m2m(field, new_ids)
+def get_current_version_m2m_ids(live_instance, field):
+    hidden_attr = f"_{field.name}_m2m_ids"
+    version_id = getattr(live_instance, "_current_version_id", None)
+    if version_id is not None and hasattr(live_instance, hidden_attr):
+        return version_id, getattr(live_instance, hidden_attr)
+
+    history_class = live_instance._history_class
+    # the same version apply_m2m_change_in_place accepts as the latest
+    versions = live_instance.versions.order_by(*history_class.get_latest_first_ordering())
+    if history_class.m2m_history == "events":
+        version_id = versions.values_list("id", flat=True).first()
+        if version_id is None:
+            return None, None
+        ids = history_class.serialize_m2m_ids(
+            history_class.get_current_m2m_ids([live_instance.pk])[live_instance.pk][
+                field.name
+            ]
+        )
+    else:
+        current = versions.values_list("id", field.name).first()
+        if current is None:
+            return None, None
+        version_id, ids = current
 
+    live_instance._current_version_id = version_id
+    setattr(live_instance, hidden_attr, ids)
+    return version_id, ids
 
-def save_copy_post_save(sender, instance, **_kwargs):
-    if hasattr(sender, "_history_class"):
-        if (
-            hasattr(instance, "_apply_changes_to_last_ver")
-            and instance._apply_changes_to_last_ver
-        ):
-            sender._history_class.update_instance_version(instance)
-        else:
-            sender._history_class.create_from_original(instance)
 
-        setattr(instance, "_apply_changes_to_last_ver", True)
+def save_copy_post_save(sender, instance, using=None, **_kwargs):
+    if hasattr(sender, "_history_class"):
+        with measure_version_writes(sender._history_class, using):
+            if should_buffer_version(sender._history_class, using):
+                get_pending_version_buffer(using).add(sender._history_class, instance.pk)
+                return
+
+            if sender._history_class.write_versions_in_background:
+                write_versions_for(sender._history_class, [instance], using)
+                return
+
+            if (
+                hasattr(instance, "_apply_changes_to_last_ver")
+                and instance._apply_changes_to_last_ver
+            ):
+                version = sender._history_class.update_instance_version(instance)
+            elif sender._history_class.skip_unchanged_versions:
+                version = sender._history_class.create_from_original_if_changed(instance)
+                if version is None:
+                    # the next save still has to be compared, rather than update the last version
+                    return
+            else:
+                version = sender._history_class.create_from_original(instance)
+
+            remember_current_version(instance, version)
 
     setattr(instance, "_apply_changes_to_last_ver", True)
 
 
+def on_live_delete(sender, instance, using=None, **_kwargs):
+    # runs inside the collector's transaction, before the live row is deleted
+    history_class = sender._history_class
+    strategy = history_class.live_delete_strategy
+    if strategy == "tombstone":
+        history_class.create_tombstone(instance)
+    elif strategy == "chunked" or not is_database_cascade_supported(connections[using]):
+        history_class.delete_versions_in_chunks([instance.pk], using=using)
+
+
+class VersionWindowTable(BaseTable):
+    """
+    Replaces a version table in the FROM clause with a derived table of the same alias,
+    the full table plus the previous and most recent version ids of each row.
+    Window functions run before WHERE, filtering outside the derived table keeps them computed over every version
+    """
+
+    previous_version_id_column = "_zeus_previous_version_id"
+    most_recent_version_id_column = "_zeus_most_recent_version_id"
+
+    def __init__(self, table_name, alias, eternal_column, order_columns):
+        super().__init__(table_name, alias)
+        self.eternal_column = eternal_column
+        self.order_columns = order_columns
+
+    def as_sql(self, compiler, connection):
+        qn = connection.ops.quote_name
+        window = "PARTITION BY {} ORDER BY {}".format(
+            qn(self.eternal_column), ", ".join(qn(col) for col in self.order_columns)
+        )
+        sql = (
+            f"(SELECT {qn(self.table_name)}.*, "
+            f"LAG({qn('id')}) OVER ({window}) AS {qn(self.previous_version_id_column)}, "
+            f"LAST_VALUE({qn('id')}) OVER ({window} ROWS BETWEEN UNBOUNDED PRECEDING AND UNBOUNDED FOLLOWING) "
+            f"AS {qn(self.most_recent_version_id_column)} "
+            f"FROM {qn(self.table_name)}) {compiler.quote_name_unless_alias(self.table_alias)}"
+        )
+        return sql, []
+
+    def relabeled_clone(self, change_map):
+        return self.__class__(
+            self.table_name,
+            change_map.get(self.table_alias, self.table_alias),
+            self.eternal_column,
+            self.order_columns,
+        )
+
+    def equals(self, other, with_filtered_relation):
+        return super().equals(other, with_filtered_relation) and isinstance(
+            other, self.__class__
+        )
+
+
+def version_window_column(alias, column_name):
+    target = models.IntegerField()
+    target.set_attributes_from_name(column_name)
+    return Col(alias, target)
+
+
 class HistoryQueryset(QuerySet):
+    # window functions scale linearly with the number of versions,
+    # but only some backends support them, see with_window_functions
+    use_window_functions = False
+
+    def _clone(self):
+        clone = super()._clone()
+        clone.use_window_functions = self.use_window_functions
+        return clone
+
+    def _needs_hydration(self):
+        return self.model.needs_hydration() and self._iterable_class is ModelIterable
+
+    def _fetch_all(self):
+        fetched = self._result_cache is not None
+        super()._fetch_all()
+        if not fetched and self._needs_hydration():
+            self.model.hydrate_versions(self._result_cache, using=self.db)
+
+    def iterator(self, chunk_size=2000):
+        if not self._needs_hydration():
+            return super().iterator(chunk_size=chunk_size)
+        return self._hydrated_iterator(chunk_size)
+
+    def _hydrated_iterator(self, chunk_size):
+        for chunk in chunked(super().iterator(chunk_size=chunk_size), chunk_size):
+            self.model.hydrate_versions(chunk, using=self.db)
+            yield from chunk
+
+    def with_window_functions(self, enabled=True):
+        """
+        compute previous/most recent version ids with LAG/LAST_VALUE over each record's versions,
+        rather than a correlated subquery per row.
+        Falls back to subqueries on backends that lack window functions
+        """
+        clone = self._chain()
+        clone.use_window_functions = enabled
+        return clone
+
+    def _can_use_window_functions(self):
+        return (
+            self.use_window_functions
+            and connections[self.db].features.supports_over_clause
+        )
+
+    def _annotate_from_version_window(self, **column_names_by_annotation):
+        clone = self._chain()
+        query = clone.query
+        alias = query.get_initial_alias()
+        base_table = query.alias_map[alias]
+        if not isinstance(base_table, VersionWindowTable):
+            opts = self.model._meta
+            query.alias_map[alias] = VersionWindowTable(
+                base_table.table_name,
+                base_table.table_alias,
+                eternal_column=opts.get_field("eternal").column,
+                order_columns=[
+                    opts.get_field(name).column
+                    for name in self.model.get_version_ordering()
+                ],
+            )
+
+        return clone.annotate(
+            **{
+                annotation: version_window_column(alias, column_name)
+                for annotation, column_name in column_names_by_annotation.items()
+            }
+        )
+
     def with_previous_version_id(self):
+        if self.model.track_validity:
+            # previous_version is already a column
+            return self._chain()
+
+        if self._can_use_window_functions():
+            return self._annotate_from_version_window(
+                previous_version_id=VersionWindowTable.previous_version_id_column
+            )
+
         # we need a non-filtered QS clone of the same type
         another_qs = HistoryQueryset(self.model, self._db)
+        if self.model.number_versions:
+            prev_version_id_subquery = Subquery(
+                another_qs.filter(
+                    eternal_id=OuterRef("eternal_id"),
+                    version_number=OuterRef("version_number") - 1,
+                ).values("id")[:1]
+            )
+            return self.annotate(previous_version_id=prev_version_id_subquery)
+
         prev_version_id_subquery = Subquery(
             another_qs.filter(
                 eternal_id=OuterRef("eternal_id"),
@@ -87,41 +573,326 @@ class HistoryQueryset(QuerySet):
         return self.annotate(previous_version_id=prev_version_id_subquery)
 
     def with_most_recent_version_id(self):
+        if self._can_use_window_functions():
+            return self._annotate_from_version_window(
+                most_recent_version_id=VersionWindowTable.most_recent_version_id_column
+            )
+
         most_recent_version_id_subquery = Subquery(
             self.model.objects.filter(eternal_id=OuterRef("eternal_id"))
-            .order_by("-business_date")
+            .order_by(*self.model.get_latest_first_ordering())
             .values("pk")[:1]
         )
         return self.annotate(most_recent_version_id=most_recent_version_id_subquery)
 
     def only_most_recent_versions(self):
+        if self.model.track_validity:
+            return self.filter(is_current=True)
+
         return self.with_most_recent_version_id().filter(id=F("most_recent_version_id"))
 
+    def as_of(self, date):
+        """
+        the version each record had at a given business_date, in a single set-based query
+        """
+        return self._as_of("business_date", date)
+
+    def as_of_system_date(self, date):
+        return self._as_of("system_date", date)
+
+    def _as_of(self, date_field_name, date):
+        if (
+            self.model.track_validity
+            and date_field_name == self.model.get_valid_from_field_name()
+        ):
+            return self.filter(
+                Q(valid_to__isnull=True) | Q(valid_to__gt=date),
+                **{f"{date_field_name}__lte": date},
+            )
+
+        # like with_previous_version_id, candidates come from a non-filtered QS
+        candidates = HistoryQueryset(self.model, self._db).filter(
+            **{f"{date_field_name}__lte": date}
+        )
+        if connections[self.db].features.can_distinct_on_fields:
+            version_ids = (
+                candidates.order_by("eternal_id", f"-{date_field_name}", "-id")
+                .distinct("eternal_id")
+                .values("id")
+            )
+        else:
+            latest_candidate_id_subquery = Subquery(
+                candidates.filter(eternal_id=OuterRef("eternal_id"))
+                .order_by(f"-{date_field_name}", "-id")
+                .values("id")[:1]
+            )
+            version_ids = candidates.filter(id=latest_candidate_id_subquery).values("id")
+
+        return self.filter(id__in=version_ids)
+
+    def iter_recreated_originals(self, chunk_size=2000):
+        """
+        streams live-shaped objects, see VersionModel.recreate_original
+        e.g. Version.objects.as_of(date).iter_recreated_originals()
+        """
+        for version in self.iterator(chunk_size=chunk_size):
+            yield version.recreate_original()
 
-class HistoryManager(Manager):
+
+class HistoryManager(Manager.from_queryset(HistoryQueryset)):
     def get_queryset(self):
         return HistoryQueryset(self.model, using=self._db)
 
     def latest_versions_for_eternal_ids(self, eternal_ids):
 
-        return self.model.objects.filter(
-            eternal_id__in=eternal_ids
-        ).only_most_recent_versions()
+        return self.filter(eternal_id__in=eternal_ids).only_most_recent_versions()
+
+    def eternal_ids_related_as_of(self, field_name, related_id, date):
+        """
+        ids of the records whose m2m field_name held related_id at date (business_date, or system_date)
+        """
+        date_field_name = self.model.get_valid_from_field_name()
+        if self.model.m2m_history == "events":
+            return (
+                self.model.m2m_event_model._base_manager.using(self.db)
+                .filter(
+                    field_name=field_name,
+                    related_id=related_id,
+                    **{f"version__{date_field_name}__lte": date},
+                )
+                .values("eternal_id")
+                .annotate(balance=m2m_event_balance())
+                .filter(balance__gt=0)
+                .values_list("eternal_id", flat=True)
+            )
+
+        return (
+            self.get_queryset()
+            ._as_of(date_field_name, date)
+            .filter(**{f"{field_name}__contains": [related_id]})
+            .values_list("eternal_id", flat=True)
+        )
+
+    def archived(
+        self, start_date=None, end_date=None, eternal_ids=None, archive_dir=None
+    ):
+        """
+        iterates over versions moved out by the archive_versions command, see zeus.versioning.archive
+        """
+        from .archive import VersionArchive
+
+        return VersionArchive(self.model, archive_dir).iter_versions(
+            start_date, end_date, eternal_ids=eternal_ids
+        )
+
+    def bulk_create_from_originals(
+        self, live_instances, batch_size=None, **version_attrs
+    ):
+        return self.model.bulk_create_from_originals(
+            live_instances, batch_size=batch_size, using=self._db, **version_attrs
+        )
+
+    async def abulk_create_from_originals(
+        self, live_instances, batch_size=None, **version_attrs
+    ):
+        return await self.model.abulk_create_from_originals(
+            live_instances, batch_size=batch_size, using=self._db, **version_attrs
+        )
+
+
+def chunked(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        chunk = list(islice(iterator, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+class VersionedLiveQuerySet(QuerySet):
+    """
+    bulk_create, bulk_update and update() skip model signals,
+    these variants also write a version for every affected row
+
+    extra keyword arguments (e.g. edited_by, business_date) are set on every version,
+    so update_versioned takes the values to update as a dict, e.g.
+    qs.update_versioned({"name": "new"}, edited_by=user)
+    """
+
+    def _trigger_session(self, version_attrs):
+        if set(version_attrs) - {"edited_by"}:
+            raise VersioningException(
+                "only edited_by can be set on versions written by triggers"
+            )
+        version_attrs.setdefault("edited_by", get_acting_user_id())
+        return versioning_session(using=self.db, **version_attrs)
+
+    def bulk_create_versioned(self, objs, batch_size=None, **version_attrs):
+        if self.model._history_class.version_with_triggers:
+            with self._trigger_session(version_attrs):
+                return self.bulk_create(objs, batch_size=batch_size)
+
+        connection = connections[self.db]
+        if not connection.features.can_return_rows_from_bulk_insert:
+            raise VersioningException(
+                "versioned bulk_create requires a database that returns primary keys from bulk inserts"
+            )
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = self.bulk_create(objs, batch_size=batch_size)
+            # freshly inserted rows can't have any m2m relations yet
+            self.model._history_class.bulk_create_from_originals(
+                objs,
+                batch_size=batch_size,
+                using=self.db,
+                fetch_m2m=False,
+                **version_attrs,
+            )
+
+        return objs
+
+    def bulk_update_versioned(self, objs, fields, batch_size=None, **version_attrs):
+        objs = list(objs)
+        if self.model._history_class.version_with_triggers:
+            with self._trigger_session(version_attrs):
+                self.bulk_update(objs, fields, batch_size=batch_size)
+            return
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            self.bulk_update(objs, fields, batch_size=batch_size)
+            self.model._history_class.bulk_create_from_originals(
+                objs, batch_size=batch_size, using=self.db, **version_attrs
+            )
+
+    def update_versioned(self, values, batch_size=None, **version_attrs):
+        history_class = self.model._history_class
+        if history_class.version_with_triggers:
+            # a single statement, however many rows
+            with self._trigger_session(version_attrs):
+                return self.update(**values)
+
+        with transaction.atomic(using=self.db, savepoint=False):
+            # rows may not match the filters anymore once updated
+            pks = list(self.values_list("pk", flat=True))
+            updated_count = 0
+            for pk_chunk in chunked(pks, batch_size or 1000):
+                rows = self.model._base_manager.using(self.db).filter(pk__in=pk_chunk)
+                updated_count += rows.update(**values)
+                history_class.bulk_create_from_originals(
+                    rows.order_by("pk"), using=self.db, **version_attrs
+                )
+
+        return updated_count
+
+
+class VersionedLiveManager(Manager.from_queryset(VersionedLiveQuerySet)):
+    pass
+
+
+def content_digest(value):
+    serialized = json.dumps(value, sort_keys=True, cls=DjangoJSONEncoder)
+    return hashlib.sha256(serialized.encode()).hexdigest()
+
+
+class DeduplicatedValue(property):
+    """
+    Stands in for a deduplicated field on version instances:
+    only the value's digest is a column, the value itself is kept once in the version model's blob table.
+    Versions loaded through HistoryQueryset get their values in bulk, others load them on access.
+    A property, so that the value can also be passed to the model's constructor
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.digest_attname = f"{name}_digest"
+        self.cache_attname = f"_{name}_deduplicated"
+        super().__init__(self.get_value, self.set_value)
+
+    def get_value(self, instance):
+        digest = getattr(instance, self.digest_attname)
+        cached_digest, value = instance.__dict__.get(self.cache_attname, (None, None))
+        if digest is None or digest == cached_digest:
+            return value
+
+        value = instance.load_blob_values([digest])[digest]
+        self.set_cached(instance, digest, value)
+        return value
+
+    def set_value(self, instance, value):
+        digest = None if value is None else content_digest(value)
+        setattr(instance, self.digest_attname, digest)
+        self.set_cached(instance, digest, value)
+
+    def set_cached(self, instance, digest, value):
+        instance.__dict__[self.cache_attname] = (digest, value)
+
+
+class M2MEventIds(property):
+    """
+    Stands in for an m2m field on versions with m2m_history = "events":
+    the ids are rebuilt from the version model's m2m event table.
+    Versions loaded through HistoryQueryset get them in bulk, others load them on access
+    """
+
+    def __init__(self, name):
+        self.name = name
+        self.cache_attname = f"_{name}_m2m_ids_cache"
+        super().__init__(self.get_value, self.set_value)
+
+    def get_value(self, instance):
+        if self.cache_attname not in instance.__dict__:
+            if instance.pk is None:
+                return []
+            instance._load_m2m_ids([instance], instance._state.db)
+        return instance.__dict__[self.cache_attname]
+
+    def set_value(self, instance, value):
+        instance.__dict__[self.cache_attname] = value
+
+
+def m2m_event_balance():
+    # events alternate between added and removed, so 1 means present and 0 absent
+    return Sum(
+        Case(
+            When(added=True, then=Value(1)),
+            default=Value(-1),
+            output_field=models.IntegerField(),
+        )
+    )
+
+
+def get_version_models():
+    return [
+        model
+        for model in apps.get_models()
+        if issubclass(model, VersionModel) and not model._meta.abstract
+    ]
 
 
 def m2m_default_empty_list():
     return []
 
 
-def create_version_field_from_live_field(field):
+# how the eternal foreign key handles deleted live rows, see zeus.versioning.deletion
+ETERNAL_FIELD_OPTIONS = {
+    "cascade": {"on_delete": models.CASCADE},
+    "database": {"on_delete": models.DO_NOTHING},
+    "chunked": {"on_delete": models.DO_NOTHING},
+    "tombstone": {"on_delete": models.DO_NOTHING, "db_constraint": False},
+}
+
+
+def create_version_field_from_live_field(
+    field, compression=None, compression_threshold=1024, delete_strategy="cascade"
+):
     name = field.attname
 
     ## forces uses of id as the primary key
     if name == "id":
         new_field = models.ForeignKey(
             field.model,
-            on_delete=models.CASCADE,
             related_name="versions",
+            **ETERNAL_FIELD_OPTIONS[delete_strategy],
         )
         return "eternal", new_field
 
@@ -154,7 +925,9 @@ def create_version_field_from_live_field(field):
             raise VersioningConfigException("Unexpected foreignkey type")
 
     else:
-        new_field = clone_with_unique_false(field)
+        new_field = clone_with_unique_false(
+            field, compression=compression, compression_threshold=compression_threshold
+        )
         new_field.primary_key = False
 
     new_field.choices = field.choices
@@ -162,7 +935,7 @@ def create_version_field_from_live_field(field):
     return name, new_field
 
 
-def clone_with_unique_false(field):
+def clone_with_unique_false(field, compression=None, compression_threshold=1024):
     name, path, args, kwargs = field.deconstruct()
 
     # auto_now can cause bugs with every new version getting a fresh new value
@@ -170,6 +943,26 @@ def clone_with_unique_false(field):
     kwargs.pop("auto_now_add", None)
     kwargs.pop("auto_now", None)
 
+    if compression is not None:
+        if isinstance(field, models.JSONField):
+            value_type = "json"
+        elif isinstance(field, (models.TextField, models.CharField)):
+            value_type = "text"
+        else:
+            raise VersioningConfigException(
+                f"only text and json fields can be compressed, not {field.name}"
+            )
+        return CompressedField(
+            value_type=value_type,
+            algorithm=compression,
+            threshold=compression_threshold,
+            **{
+                key: kwargs[key]
+                for key in ("verbose_name", "null", "blank", "default", "db_column")
+                if key in kwargs
+            },
+        )
+
     if kwargs.get("unique", False):
         new_kwargs = {
             **kwargs,
@@ -200,7 +993,8 @@ class VersionModelMeta(ModelBase):
                 "must define live_model attribute on version class"
             )
 
-        if hasattr(live_model, "_history_class"):
+        # a child model inherits its versioned parent's, and can have its own
+        if "_history_class" in live_model.__dict__:
             raise VersioningConfigException(
                 "cannot define 2 history classes for a single model"
             )
@@ -212,24 +1006,90 @@ class VersionModelMeta(ModelBase):
             field_obj.contribute_to_class(version_cls, name)
 
         # many-to-many
-        versioned_m2m_fields = cls._create_m2m_fields(version_cls, live_model)
-        version_cls.m2m_fields = versioned_m2m_fields.values()
-        for name, field_obj in versioned_m2m_fields.items():
-            field_obj.contribute_to_class(version_cls, name)
+        if version_cls.m2m_history == "events":
+            cls._setup_m2m_events(version_cls)
+        elif version_cls.m2m_history == "json":
+            versioned_m2m_fields = cls._create_m2m_fields(version_cls, live_model)
+            version_cls.m2m_fields = versioned_m2m_fields.values()
+            for name, field_obj in versioned_m2m_fields.items():
+                field_obj.contribute_to_class(version_cls, name)
+        else:
+            raise VersioningConfigException('m2m_history must be "json" or "events"')
+
+        if version_cls.track_validity:
+            for name, field_obj in cls._create_validity_fields().items():
+                field_obj.contribute_to_class(version_cls, name)
+            if version_cls.enforce_single_current_version:
+                cls._add_current_version_constraint(version_cls)
+        elif version_cls.enforce_single_current_version:
+            raise VersioningConfigException(
+                "enforce_single_current_version needs track_validity"
+            )
+
+        if version_cls.delta_snapshot_interval is not None:
+            for name, field_obj in cls._create_delta_fields().items():
+                field_obj.contribute_to_class(version_cls, name)
+
+        if version_cls.track_changed_fields:
+            # null for versions written before tracking was turned on, see record_changed_fields
+            changed_fields = models.JSONField(null=True, blank=True, editable=False)
+            changed_fields.contribute_to_class(version_cls, "changed_fields")
+
+        if version_cls.live_delete_strategy == "tombstone":
+            is_deleted = models.BooleanField(default=False)
+            is_deleted.contribute_to_class(version_cls, "is_deleted")
+
+        if version_cls.number_versions:
+            version_number = models.PositiveIntegerField(editable=False)
+            version_number.contribute_to_class(version_cls, "version_number")
+            cls._add_version_number_constraint(version_cls)
+
+        if version_cls.deduplicated_fields:
+            cls._setup_deduplication(version_cls, live_model)
+
+        if version_cls.partition_by is not None:
+            cls._check_partitioning(version_cls)
+
+        if version_cls.version_with_triggers:
+            check_trigger_versioning(version_cls)
+
+        cls._add_indexes(version_cls)
 
         live_model._history_class = version_cls
-        cls._attach_signals(live_model)
+        cls._attach_signals(live_model, version_cls)
         live_model.reset_version_attrs = VersionModelMeta.reset_version_attrs
 
         return version_cls
 
     @staticmethod
     def _get_versioned_fields(live_model, version_cls):
+        if version_cls.live_delete_strategy not in DELETE_STRATEGIES:
+            raise VersioningConfigException(
+                f"live_delete_strategy must be one of {DELETE_STRATEGIES}"
+            )
         tracked_fields = version_cls.get_fields_to_version()
 
         versioned_fields = {}
         for field in tracked_fields:
-            new_name, new_field = create_version_field_from_live_field(field)
+            if field.name in version_cls.deduplicated_fields:
+                # the value lives in the blob table, see DeduplicatedValue
+                versioned_fields[f"{field.attname}_digest"] = models.CharField(
+                    max_length=64, null=True, blank=True
+                )
+                continue
+
+            compression = None
+            if field.name in version_cls.compressed_fields:
+                compression = version_cls.compression
+            new_name, new_field = create_version_field_from_live_field(
+                field,
+                compression=compression,
+                compression_threshold=version_cls.compression_threshold,
+                delete_strategy=version_cls.live_delete_strategy,
+            )
+            if version_cls.delta_snapshot_interval is not None and new_name != "eternal":
+                # unchanged fields are left empty on delta versions
+                new_field.null = True
             versioned_fields[new_name] = new_field
 
         return versioned_fields
@@ -244,17 +1104,178 @@ class VersionModelMeta(ModelBase):
         return m2m_fields_to_add
 
     @staticmethod
-    def _attach_signals(live_model):
-        post_save.connect(save_copy_post_save, live_model)
+    def _setup_m2m_events(version_cls):
+        if version_cls.partition_by is not None:
+            raise VersioningConfigException(
+                "m2m events need a foreign key to versions, partitioned version tables can't have one"
+            )
+
+        # the live fields stand in for the versioned ones, for their name and attname
+        version_cls.m2m_fields = list(version_cls.get_m2m_fields_to_version())
+        for field in version_cls.m2m_fields:
+            setattr(version_cls, field.attname, M2MEventIds(field.attname))
+
+        version_cls.m2m_event_model = type(
+            f"{version_cls.__name__}M2MEvent",
+            (models.Model,),
+            {
+                "__module__": version_cls.__module__,
+                "Meta": type(
+                    "Meta",
+                    (),
+                    {
+                        "app_label": version_cls._meta.app_label,
+                        "indexes": [
+                            # rebuilding a record's ids
+                            models.Index(fields=["eternal_id", "field_name"]),
+                            # which records had a related object, see eternal_ids_related_as_of
+                            models.Index(fields=["field_name", "related_id"]),
+                        ],
+                    },
+                ),
+                "version": models.ForeignKey(
+                    version_cls, on_delete=models.CASCADE, related_name="m2m_events"
+                ),
+                "eternal_id": models.IntegerField(),
+                "field_name": models.CharField(max_length=100),
+                "related_id": models.BigIntegerField(),
+                "added": models.BooleanField(),
+            },
+        )
 
-        for field in live_model._meta.many_to_many:
-            through_model = getattr(live_model, field.name).through
+    @staticmethod
+    def _check_partitioning(version_cls):
+        if version_cls.partition_by not in PARTITION_INTERVALS:
+            raise VersioningConfigException(
+                f"partition_by must be one of {PARTITION_INTERVALS}"
+            )
+        # postgres requires unique constraints, and so foreign keys' targets,
+        # to include the partition key
+        if version_cls.track_validity or version_cls.number_versions:
+            raise VersioningConfigException(
+                "partitioned version tables can't use track_validity or number_versions"
+            )
+
+    @staticmethod
+    def _setup_deduplication(version_cls, live_model):
+        if version_cls.delta_snapshot_interval is not None:
+            raise VersioningConfigException(
+                "deduplicated_fields can't be combined with delta_snapshot_interval"
+            )
+
+        versioned_field_names = {f.name for f in version_cls.get_fields_to_version()}
+        for name in version_cls.deduplicated_fields:
+            live_field = live_model._meta.get_field(name)
+            if name not in versioned_field_names or live_field.is_relation:
+                raise VersioningConfigException(
+                    f"{name} is not a versioned, non-relational field of {live_model.__name__}"
+                )
+            # blobs are stored as json, other types wouldn't come back as they went in
+            if not isinstance(
+                live_field, (models.JSONField, models.TextField, models.CharField)
+            ):
+                raise VersioningConfigException(
+                    f"only text and json fields can be deduplicated, not {name}"
+                )
+            setattr(version_cls, name, DeduplicatedValue(name))
+
+        version_cls.blob_model = type(
+            f"{version_cls.__name__}Blob",
+            (models.Model,),
+            {
+                "__module__": version_cls.__module__,
+                "Meta": type("Meta", (), {"app_label": version_cls._meta.app_label}),
+                "digest": models.CharField(max_length=64, primary_key=True),
+                "value": models.JSONField(encoder=DjangoJSONEncoder),
+            },
+        )
+
+    @staticmethod
+    def _create_delta_fields():
+        return {
+            # versioned fields that differ from the previous version, on every version
+            "delta_fields": models.JSONField(default=list),
+            # number of versions since the last full snapshot, 0 for full snapshots
+            "delta_depth": models.PositiveIntegerField(default=0),
+            # the full snapshot that delta versions build upon
+            "delta_base": models.ForeignKey(
+                "self",
+                null=True,
+                blank=True,
+                on_delete=models.DO_NOTHING,
+                db_constraint=False,
+                related_name="+",
+            ),
+        }
+
+    @staticmethod
+    def _create_validity_fields():
+        return {
+            "previous_version": models.ForeignKey(
+                "self",
+                null=True,
+                blank=True,
+                on_delete=models.SET_NULL,
+                related_name="+",
+            ),
+            "valid_to": models.DateTimeField(null=True, blank=True),
+            "is_current": models.BooleanField(default=True),
+        }
+
+    @staticmethod
+    def _add_current_version_constraint(version_cls):
+        constraint = models.UniqueConstraint(
+            fields=["eternal"],
+            condition=Q(is_current=True),
+            name=f"{version_cls._meta.db_table}_one_current"[-63:],
+        )
+        version_cls._meta.constraints.append(constraint)
+        version_cls._meta.original_attrs["constraints"] = version_cls._meta.constraints
+
+    @staticmethod
+    def _add_version_number_constraint(version_cls):
+        # also serves as the index for latest/previous version lookups
+        constraint = models.UniqueConstraint(
+            fields=["eternal", "version_number"],
+            name=f"{version_cls._meta.db_table}_version_number_uniq"[-63:],
+        )
+        version_cls._meta.constraints.append(constraint)
+        version_cls._meta.original_attrs["constraints"] = version_cls._meta.constraints
+
+    @staticmethod
+    def _add_indexes(version_cls):
+        # indexes from Meta have already been named by ModelBase,
+        # these are added after the fact since they refer to generated fields
+        for fields in version_cls.get_version_indexes():
+            index = models.Index(fields=list(fields))
+            index.set_name_with_model(version_cls)
+            version_cls._meta.indexes.append(index)
+
+        # the migration autodetector only looks at options declared in Meta
+        version_cls._meta.original_attrs["indexes"] = version_cls._meta.indexes
+
+    @staticmethod
+    def _attach_signals(live_model, version_cls):
+        # the triggers write versions for saves, m2m changes still go through python
+        if not version_cls.version_with_triggers:
+            post_save.connect(save_copy_post_save, live_model)
+        else:
+            pre_save.connect(forward_acting_user, live_model)
+        if version_cls.live_delete_strategy != "cascade":
+            pre_delete.connect(on_live_delete, live_model)
+
+        for field in version_cls.get_m2m_fields_to_version():
+            through_model = field.remote_field.through
+            versioned_m2m_fields_by_through.setdefault(through_model, []).append(
+                (field, version_cls)
+            )
             m2m_changed.connect(on_m2m_change, sender=through_model)
 
     # 'self' here refers to live model, we attach this dynamically
     def reset_version_attrs(self):
-        if hasattr(self, "_apply_changes_to_last_ver"):
-            del self._apply_changes_to_last_ver
+        for attr in ("_apply_changes_to_last_ver", "_current_version_id"):
+            if hasattr(self, attr):
+                delattr(self, attr)
 
         for field in self._meta.many_to_many:
             hidden_attr = f"_{field.name}_m2m_ids"
@@ -271,6 +1292,77 @@ class VersionModel(models.Model, metaclass=VersionModelMeta):
 
     system_date = models.DateTimeField(default=timezone.now)
 
+    # inside transaction.atomic(), defer versioning until commit
+    # and write a single version per touched record, whatever the number of saves and m2m changes
+    coalesce_versions_in_transaction = False
+
+    # maintain previous_version, valid_to and is_current columns as versions are written
+    # so that latest/previous/as-of lookups are plain indexed predicates
+    # validity starts at business_date, or system_date for models without one
+    track_validity = False
+    # a partial unique constraint on eternal where is_current, turn it on in a later migration
+    # than track_validity's, once backfill_version_validity has run on tables that already have versions
+    enforce_single_current_version = False
+
+    # number versions 1, 2, 3... per record, in a version_number column
+    # numbers are assigned under a lock on the live row, so concurrent writers can't collide
+    number_versions = False
+
+    # store only changed fields, with a full snapshot every delta_snapshot_interval versions
+    # versions loaded through HistoryQueryset are rebuilt in full, in bulk
+    # m2m ids are always stored in full
+    delta_snapshot_interval = None
+
+    # names of (large) fields to store once per distinct value, in a generated blob model
+    # version rows only keep a <name>_digest column
+    deduplicated_fields = []
+
+    # names of text/json fields to store compressed (compression is zlib or lzma)
+    # values are only compressed from compression_threshold bytes,
+    # and decompressed on first access
+    compressed_fields = []
+    compression = "zlib"
+    compression_threshold = 1024
+
+    # "month" or "year": range-partition the table on business_date (or system_date)
+    # on postgres, see zeus.versioning.partitioning
+    partition_by = None
+
+    # don't write a version when a save leaves every versioned field as it was
+    # skipped writes are counted in skipped_version_writes
+    skip_unchanged_versions = False
+    skipped_version_writes = 0
+
+    # what deleting a live row does to its versions:
+    # "cascade", "database", "chunked" or "tombstone", see zeus.versioning.deletion
+    live_delete_strategy = "cascade"
+    live_delete_chunk_size = 1000
+
+    # "json" stores every version's m2m ids as a sorted list
+    # "events" only stores the ids added and removed by each version, in a generated <Name>M2MEvent model,
+    # lists are rebuilt when versions are loaded
+    m2m_history = "json"
+
+    # field-name tuples to index, None means get_default_version_indexes()
+    # and an empty list means no extra indexes
+    version_indexes = None
+
+    # build versions in the request, but insert them in batches from a worker thread
+    # durability is "on_commit" or "best_effort", see zeus.versioning.background
+    # every save and m2m change gets its own version, unless coalescing in a transaction
+    write_versions_in_background = False
+    background_write_durability = "on_commit"
+
+    # write versions from database triggers on the live table instead of post_save,
+    # so that update(), bulk_create and raw SQL are versioned too
+    # install them with the InstallVersionTriggers migration operation, see zeus.versioning.triggers
+    version_with_triggers = False
+
+    # record on each version which versioned fields (m2m included) changed from the previous one,
+    # in a changed_fields column, so changelogs filtered by field don't compare versions
+    # on postgres, index it with the IndexChangedFields migration operation, see zeus.versioning.changed_fields
+    track_changed_fields = False
+
     @classmethod
     def get_fields_to_version(cls):
         # override to include/exclude individual fields from the live model
@@ -281,6 +1373,569 @@ class VersionModel(models.Model, metaclass=VersionModelMeta):
         # override to include/exclude individual fields from the live model
         return cls.live_model._meta.many_to_many
 
+    @classmethod
+    def get_version_indexes(cls):
+        if cls.version_indexes is None:
+            return cls.get_default_version_indexes()
+        return cls.version_indexes
+
+    @classmethod
+    def get_default_version_indexes(cls):
+        # history queries filter on eternal or edited_by and order by date
+        date_field = cls.get_valid_from_field_name()
+        field_names = {f.name for f in cls._meta.concrete_fields}
+
+        indexes = [("eternal", date_field), (date_field,)]
+        if "edited_by" in field_names:
+            indexes.append(("edited_by", date_field))
+        if cls.track_validity:
+            indexes.append(("eternal", "is_current"))
+        return indexes
+
+    @classmethod
+    def get_version_ordering(cls):
+        # the order of a record's versions, oldest first
+        if cls.number_versions:
+            return ["version_number"]
+        return [cls.get_valid_from_field_name(), "id"]
+
+    @classmethod
+    def get_latest_first_ordering(cls):
+        return [f"-{name}" for name in cls.get_version_ordering()]
+
+    @classmethod
+    def get_valid_from_field_name(cls):
+        field_names = {f.name for f in cls._meta.concrete_fields}
+        return "business_date" if "business_date" in field_names else "system_date"
+
+    @classmethod
+    def prepare_new_versions(cls, versions, using=None):
+        """
+        runs on built versions right before they're inserted, whichever the write path
+        """
+        if cls.number_versions or cls.track_validity:
+            cls._lock_live_rows(versions, using)
+        if cls.number_versions:
+            cls._assign_version_numbers(versions, using)
+        if cls.track_validity:
+            cls._link_to_current_versions(versions, using)
+        if cls.track_changed_fields:
+            # before stripping, which blanks unchanged fields
+            cls._record_changed_fields(versions, using)
+        if cls.delta_snapshot_interval is not None:
+            cls._strip_unchanged_fields(versions, using)
+        if cls.deduplicated_fields:
+            cls._write_blobs(versions, using)
+        if cls.m2m_history == "events":
+            cls._diff_m2m_ids(versions, using)
+
+    @classmethod
+    def finalize_new_versions(cls, versions, using=None):
+        """
+        runs on versions right after they're inserted, whichever the write path
+        """
+        if cls.track_validity:
+            cls._link_versions_within_batch(versions, using)
+        if cls.delta_snapshot_interval is not None:
+            for ver in versions:
+                ver._restore_full_state()
+        if cls.m2m_history == "events":
+            cls._write_m2m_events(versions, using)
+
+    @classmethod
+    def _writing_new_versions(cls, using):
+        # these hooks issue extra reads/writes that must land together with the insert
+        if (
+            cls.number_versions
+            or cls.track_validity
+            or cls.delta_snapshot_interval is not None
+            or cls.deduplicated_fields
+            or cls.m2m_history == "events"
+        ):
+            return transaction.atomic(using=using)
+        return nullcontext()
+
+    @classmethod
+    def _lock_live_rows(cls, versions, using):
+        # concurrent writers for the same record queue up here until the insert commits
+        # rows are locked in pk order so that writers of overlapping batches can't deadlock
+        list(
+            cls.live_model._base_manager.using(using)
+            .select_for_update()
+            .filter(pk__in={ver.eternal_id for ver in versions})
+            .order_by("pk")
+            .values_list("pk", flat=True)
+        )
+
+    @classmethod
+    def _assign_version_numbers(cls, versions, using):
+        eternal_ids = sorted({ver.eternal_id for ver in versions})
+        latest_numbers = dict(
+            cls._base_manager.using(using)
+            .filter(eternal_id__in=eternal_ids)
+            .order_by()
+            .values("eternal_id")
+            .annotate(latest=Max("version_number"))
+            .values_list("eternal_id", "latest")
+        )
+        for ver in versions:
+            number = latest_numbers.get(ver.eternal_id, 0) + 1
+            ver.version_number = latest_numbers[ver.eternal_id] = number
+
+    @classmethod
+    def get_delta_field_names(cls):
+        return [f.attname for f in cls.get_fields_to_version() if not f.name in ["id"]]
+
+    @classmethod
+    def _strip_unchanged_fields(cls, versions, using):
+        field_names = cls.get_delta_field_names()
+
+        # rows are chained in insertion (id) order
+        latest_ids = (
+            cls._base_manager.using(using)
+            .filter(eternal_id__in={ver.eternal_id for ver in versions})
+            .order_by()
+            .values("eternal_id")
+            .annotate(latest_id=Max("id"))
+            .values("latest_id")
+        )
+        latest_by_eternal_id = {
+            ver.eternal_id: ver
+            for ver in cls.objects.using(using).filter(id__in=latest_ids).order_by()
+        }
+
+        for ver in versions:
+            previous = latest_by_eternal_id.get(ver.eternal_id, None)
+            cls._strip_unchanged_fields_from(ver, previous, field_names)
+            latest_by_eternal_id[ver.eternal_id] = ver
+
+    @classmethod
+    def _write_blobs(cls, versions, using):
+        values_by_digest = {}
+        for ver in versions:
+            for name in cls.deduplicated_fields:
+                digest = getattr(ver, f"{name}_digest")
+                if digest is not None:
+                    values_by_digest[digest] = getattr(ver, name)
+
+        blob_manager = cls.blob_model._base_manager.using(using)
+        existing = set(
+            blob_manager.filter(digest__in=values_by_digest).values_list(
+                "digest", flat=True
+            )
+        )
+        # concurrent writers may still race to insert the same value
+        blob_manager.bulk_create(
+            [
+                cls.blob_model(digest=digest, value=value)
+                for digest, value in values_by_digest.items()
+                if digest not in existing
+            ],
+            ignore_conflicts=True,
+        )
+
+    @classmethod
+    def load_blob_values(cls, digests, using=None):
+        return dict(
+            cls.blob_model._base_manager.using(using)
+            .filter(digest__in=set(digests))
+            .values_list("digest", "value")
+        )
+
+    @classmethod
+    def _load_deduplicated_values(cls, versions, using):
+        properties = [getattr(cls, name) for name in cls.deduplicated_fields]
+        digests = {
+            getattr(ver, prop.digest_attname)
+            for ver in versions
+            for prop in properties
+            if getattr(ver, prop.digest_attname) is not None
+        }
+        if not digests:
+            return
+
+        values_by_digest = cls.load_blob_values(digests, using=using)
+        for ver in versions:
+            for prop in properties:
+                digest = getattr(ver, prop.digest_attname)
+                if digest is not None:
+                    prop.set_cached(ver, digest, values_by_digest[digest])
+
+    @classmethod
+    def get_current_m2m_ids(cls, eternal_ids, using=None):
+        """
+        {eternal_id: {field_name: set of ids}} as of each record's latest version, in one query
+        """
+        ids = defaultdict(lambda: defaultdict(set))
+        present = (
+            cls.m2m_event_model._base_manager.using(using)
+            .filter(eternal_id__in=list(eternal_ids))
+            .values("eternal_id", "field_name", "related_id")
+            .annotate(balance=m2m_event_balance())
+            .filter(balance__gt=0)
+        )
+        for row in present:
+            ids[row["eternal_id"]][row["field_name"]].add(row["related_id"])
+        return ids
+
+    @classmethod
+    def _diff_m2m_ids(cls, versions, using):
+        current_ids = cls.get_current_m2m_ids({ver.eternal_id for ver in versions}, using)
+        for ver in versions:
+            ids_by_field = current_ids[ver.eternal_id]
+            ver._m2m_events = []
+            for field in cls.m2m_fields:
+                new_ids = set(getattr(ver, field.attname))
+                ver._m2m_events += cls._get_m2m_events(
+                    field.name, ids_by_field[field.name], new_ids
+                )
+                # the next version of the same record in this batch builds upon this one
+                ids_by_field[field.name] = new_ids
+
+    @staticmethod
+    def _get_m2m_events(field_name, old_ids, new_ids):
+        old_ids, new_ids = set(old_ids), set(new_ids)
+        return [
+            *[(field_name, related_id, True) for related_id in sorted(new_ids - old_ids)],
+            *[
+                (field_name, related_id, False)
+                for related_id in sorted(old_ids - new_ids)
+            ],
+        ]
+
+    @classmethod
+    def _write_m2m_events(cls, versions, using):
+        events = []
+        for ver in versions:
+            events += [
+                cls.m2m_event_model(
+                    version_id=ver.pk,
+                    eternal_id=ver.eternal_id,
+                    field_name=field_name,
+                    related_id=related_id,
+                    added=added,
+                )
+                for field_name, related_id, added in ver.__dict__.pop("_m2m_events", [])
+            ]
+        cls.m2m_event_model._base_manager.using(using).bulk_create(events)
+
+    @classmethod
+    def add_m2m_events(
+        cls, version_id, eternal_id, field_name, old_ids, new_ids, using=None
+    ):
+        """
+        applies an m2m change to an existing version, in place
+        only valid for a record's latest version
+        """
+        cls.m2m_event_model._base_manager.using(using).bulk_create(
+            [
+                cls.m2m_event_model(
+                    version_id=version_id,
+                    eternal_id=eternal_id,
+                    field_name=field_name,
+                    related_id=related_id,
+                    added=added,
+                )
+                for field_name, related_id, added in cls._get_m2m_events(
+                    field_name, old_ids, new_ids
+                )
+            ]
+        )
+
+    @classmethod
+    def move_m2m_events(cls, target_ids_by_version_id, using=None):
+        """
+        hands the events of versions about to be deleted to a later version of the same record,
+        which then holds the same ids as before
+        """
+        version_ids_by_target = defaultdict(list)
+        for version_id, target_id in target_ids_by_version_id.items():
+            version_ids_by_target[target_id].append(version_id)
+
+        event_manager = cls.m2m_event_model._base_manager.using(using)
+        for target_id, version_ids in version_ids_by_target.items():
+            event_manager.filter(version_id__in=version_ids).update(version_id=target_id)
+
+    @classmethod
+    def _load_m2m_ids(cls, versions, using):
+        """
+        replays each record's events, in version order, up to each of the loaded versions
+        """
+        versions = [ver for ver in versions if ver.pk is not None]
+        ordering = cls.get_version_ordering()
+        get_key = lambda ver: tuple(getattr(ver, name) for name in ordering)
+
+        events_by_eternal_id = defaultdict(list)
+        events = (
+            cls.m2m_event_model._base_manager.using(using)
+            .filter(eternal_id__in={ver.eternal_id for ver in versions})
+            .order_by("eternal_id", *[f"version__{name}" for name in ordering], "id")
+            .values_list(
+                "eternal_id",
+                *[f"version__{name}" for name in ordering],
+                "field_name",
+                "related_id",
+                "added",
+            )
+        )
+        for eternal_id, *key, field_name, related_id, added in events:
+            events_by_eternal_id[eternal_id].append(
+                (tuple(key), field_name, related_id, added)
+            )
+
+        versions = sorted(versions, key=lambda ver: (ver.eternal_id, get_key(ver)))
+        for eternal_id, record_versions in groupby(
+            versions, key=attrgetter("eternal_id")
+        ):
+            ids = {field.name: set() for field in cls.m2m_fields}
+            events = iter(events_by_eternal_id[eternal_id])
+            event = next(events, None)
+            for ver in record_versions:
+                while event is not None and event[0] <= get_key(ver):
+                    _key, field_name, related_id, added = event
+                    field_ids = ids.setdefault(field_name, set())
+                    if added:
+                        field_ids.add(related_id)
+                    else:
+                        field_ids.discard(related_id)
+                    event = next(events, None)
+
+                for field in cls.m2m_fields:
+                    getattr(cls, field.attname).set_value(
+                        ver, cls.serialize_m2m_ids(ids[field.name])
+                    )
+
+    @classmethod
+    def get_stored_attname(cls, attname):
+        # the column holding a versioned field, digests stand in for deduplicated values
+        if attname in cls.deduplicated_fields:
+            return f"{attname}_digest"
+        return attname
+
+    @classmethod
+    def _strip_unchanged_fields_from(cls, ver, previous, field_names):
+        ver._full_state = {name: getattr(ver, name) for name in field_names}
+        if previous is None:
+            ver.delta_fields = field_names
+        else:
+            previous_state = getattr(previous, "_full_state", None) or {
+                name: getattr(previous, name) for name in field_names
+            }
+            ver.delta_fields = [
+                name
+                for name in field_names
+                if previous_state[name] != ver._full_state[name]
+            ]
+
+        # a previous version from the same batch has no id yet to build upon
+        if (
+            previous is None
+            or previous.pk is None
+            or previous.delta_depth + 1 >= cls.delta_snapshot_interval
+        ):
+            ver.delta_depth = 0
+            ver.delta_base_id = None
+        else:
+            ver.delta_depth = previous.delta_depth + 1
+            ver.delta_base_id = previous.delta_base_id or previous.pk
+            for name in field_names:
+                if name not in ver.delta_fields:
+                    setattr(ver, name, None)
+
+    @classmethod
+    def rebase_deltas(cls, record_versions, using=None):
+        """
+        rewrites the delta columns of a record's remaining versions, e.g. once some were deleted
+        record_versions must be every version of the record, fully loaded
+        """
+        field_names = cls.get_delta_field_names()
+        previous = None
+        for ver in sorted(record_versions, key=attrgetter("pk")):
+            cls._strip_unchanged_fields_from(ver, previous, field_names)
+            previous = ver
+
+        cls._base_manager.using(using).bulk_update(
+            record_versions, [*field_names, "delta_fields", "delta_depth", "delta_base"]
+        )
+        for ver in record_versions:
+            ver._restore_full_state()
+
+    def _restore_full_state(self):
+        for name, value in getattr(self, "_full_state", {}).items():
+            setattr(self, name, value)
+
+    @classmethod
+    def needs_hydration(cls):
+        return (
+            cls.delta_snapshot_interval is not None
+            or bool(cls.deduplicated_fields)
+            or cls.m2m_history == "events"
+        )
+
+    @classmethod
+    def hydrate_versions(cls, versions, using=None):
+        """
+        fills in what loaded versions don't hold themselves, in bulk
+        """
+        if cls.delta_snapshot_interval is not None:
+            cls._hydrate_deltas(versions, using)
+        if cls.deduplicated_fields:
+            cls._load_deduplicated_values(versions, using)
+        if cls.m2m_history == "events":
+            cls._load_m2m_ids(versions, using)
+
+    @classmethod
+    def _hydrate_deltas(cls, versions, using):
+        """
+        fills in the fields that delta versions don't store, from their snapshot and the deltas in between
+        """
+        delta_versions = [ver for ver in versions if ver.delta_depth]
+        if not delta_versions:
+            return
+
+        ranges_by_eternal_id = {}
+        for ver in delta_versions:
+            low, high = ranges_by_eternal_id.get(
+                ver.eternal_id, (ver.delta_base_id, ver.pk)
+            )
+            ranges_by_eternal_id[ver.eternal_id] = (
+                min(low, ver.delta_base_id),
+                max(high, ver.pk),
+            )
+
+        field_names = cls.get_delta_field_names()
+        chain_rows = (
+            cls._base_manager.using(using)
+            .filter(
+                reduce(
+                    or_,
+                    (
+                        Q(eternal_id=eternal_id, id__gte=low, id__lt=high)
+                        for eternal_id, (low, high) in ranges_by_eternal_id.items()
+                    ),
+                )
+            )
+            .order_by("id")
+            .only("id", "eternal_id", "delta_fields", "delta_base", *field_names)
+        )
+        rows_by_base_id = defaultdict(list)
+        for row in chain_rows:
+            rows_by_base_id[row.delta_base_id or row.pk].append(row)
+
+        for ver in delta_versions:
+            state = {}
+            for row in rows_by_base_id[ver.delta_base_id]:
+                if row.pk >= ver.pk:
+                    break
+                if row.pk == ver.delta_base_id:
+                    state = {name: getattr(row, name) for name in field_names}
+                else:
+                    state.update({name: getattr(row, name) for name in row.delta_fields})
+
+            for name in field_names:
+                if name not in ver.delta_fields:
+                    setattr(ver, name, state.get(name, None))
+
+    @classmethod
+    def _link_to_current_versions(cls, versions, using):
+        """
+        closes the records' current versions before the new ones are inserted,
+        so that a record never has two current versions
+        """
+        valid_from_attname = cls._meta.get_field(cls.get_valid_from_field_name()).attname
+        manager = cls._base_manager.using(using)
+        current_version_ids = dict(
+            manager.filter(
+                eternal_id__in={v.eternal_id for v in versions}, is_current=True
+            ).values_list("eternal_id", "id")
+        )
+
+        latest_by_eternal_id = {}
+        closed_ids_by_valid_to = defaultdict(list)
+        for ver in versions:
+            earlier = latest_by_eternal_id.get(ver.eternal_id, None)
+            if earlier is None:
+                ver.previous_version_id = current_version_ids.get(ver.eternal_id, None)
+                if ver.previous_version_id is not None:
+                    valid_to = getattr(ver, valid_from_attname)
+                    closed_ids_by_valid_to[valid_to].append(ver.previous_version_id)
+            else:
+                # several versions of the same record in one batch, linked once they have ids
+                earlier.valid_to = getattr(ver, valid_from_attname)
+                earlier.is_current = False
+            ver.valid_to = None
+            ver.is_current = True
+            latest_by_eternal_id[ver.eternal_id] = ver
+
+        # bulk-written versions share the same date, so this is usually a single update
+        for valid_to, version_ids in closed_ids_by_valid_to.items():
+            manager.filter(id__in=version_ids).update(valid_to=valid_to, is_current=False)
+
+    @classmethod
+    def _link_versions_within_batch(cls, versions, using):
+        latest_by_eternal_id = {}
+        relinked = []
+        for ver in versions:
+            earlier = latest_by_eternal_id.get(ver.eternal_id, None)
+            if earlier is not None:
+                ver.previous_version_id = earlier.pk
+                relinked.append(ver)
+            latest_by_eternal_id[ver.eternal_id] = ver
+
+        if relinked:
+            cls._base_manager.using(using).bulk_update(relinked, ["previous_version"])
+
+    @classmethod
+    def rebuild_validity(cls, eternal_ids, using=None):
+        """
+        recomputes previous_version, valid_to and is_current from scratch for some records
+        returns the number of versions that had to be updated
+        """
+        valid_from = cls.get_valid_from_field_name()
+        versions = (
+            cls._base_manager.using(using)
+            .filter(eternal_id__in=eternal_ids)
+            .order_by("eternal_id", *cls.get_version_ordering())
+            .only(
+                "id",
+                "eternal_id",
+                valid_from,
+                "previous_version",
+                "valid_to",
+                "is_current",
+            )
+        )
+
+        changed = []
+        for _eternal_id, record_versions in groupby(
+            versions, key=attrgetter("eternal_id")
+        ):
+            record_versions = list(record_versions)
+            for index, ver in enumerate(record_versions):
+                previous = record_versions[index - 1] if index > 0 else None
+                following = (
+                    record_versions[index + 1]
+                    if index + 1 < len(record_versions)
+                    else None
+                )
+                expected = (
+                    previous.pk if previous else None,
+                    getattr(following, valid_from) if following else None,
+                    following is None,
+                )
+                if (ver.previous_version_id, ver.valid_to, ver.is_current) != expected:
+                    ver.previous_version_id, ver.valid_to, ver.is_current = expected
+                    changed.append(ver)
+
+        # versions stop being current before others become current, one record never has two
+        manager = cls._base_manager.using(using)
+        for becoming_current in (False, True):
+            manager.bulk_update(
+                [ver for ver in changed if ver.is_current == becoming_current],
+                ["previous_version", "valid_to", "is_current"],
+            )
+        return len(changed)
+
     @classmethod
     def build_from_original(cls, live_instance, m2m_dict=None):
         instance_dict = {
@@ -289,13 +1944,14 @@ class VersionModel(models.Model, metaclass=VersionModelMeta):
             if not f.name in ["id"]
         }
 
-        instance_dict.update(
-            {
-                f.attname: cls.serialize_m2m_ids(
-                    [related.id for related in getattr(live_instance, f.name).all()]
-                )
+        if m2m_dict is None:
+            m2m_dict = {
+                f.name: [related.id for related in getattr(live_instance, f.name).all()]
                 for f in cls.m2m_fields
             }
+
+        instance_dict.update(
+            {f.attname: cls.serialize_m2m_ids(m2m_dict[f.name]) for f in cls.m2m_fields}
         )
 
         instance_dict["eternal"] = live_instance
@@ -303,29 +1959,374 @@ class VersionModel(models.Model, metaclass=VersionModelMeta):
         return ver
 
     @classmethod
-    def create_from_original(cls, live_instance):
+    def get_snapshot_field_names(cls):
+        # what build_from_original copies from the live instance
+        return [
+            f.attname for f in cls.get_fields_to_version() if not f.name in ["id"]
+        ] + [f.attname for f in cls.m2m_fields]
+
+    def get_snapshot(self):
+        return {name: getattr(self, name) for name in self.get_snapshot_field_names()}
+
+    @classmethod
+    def get_changed_field_names(cls, snapshot, previous_snapshot):
+        """
+        names of the versioned fields that differ between two snapshots, all of them without a previous one
+        """
+        names_by_attname = {
+            f.attname: f.name for f in cls.get_fields_to_version() if f.name != "id"
+        }
+        names_by_attname.update({f.attname: f.name for f in cls.m2m_fields})
+        return [
+            name
+            for attname, name in names_by_attname.items()
+            if previous_snapshot is None
+            or previous_snapshot[attname] != snapshot[attname]
+        ]
+
+    @classmethod
+    def _record_changed_fields(cls, versions, using):
+        snapshots = {
+            ver.eternal_id: ver.get_snapshot()
+            for ver in cls.objects.db_manager(using).latest_versions_for_eternal_ids(
+                {ver.eternal_id for ver in versions}
+            )
+        }
+        for ver in versions:
+            snapshot = ver.get_snapshot()
+            ver.changed_fields = cls.get_changed_field_names(
+                snapshot, snapshots.get(ver.eternal_id, None)
+            )
+            # the next version of the same record in this batch builds upon this one
+            snapshots[ver.eternal_id] = snapshot
+
+    @classmethod
+    def rebuild_changed_fields(cls, record_versions, using=None):
+        """
+        recomputes changed_fields of a record's versions, e.g. once some were deleted
+        record_versions must be every version of the record, oldest first and fully loaded
+        """
+        previous_snapshot = None
+        for ver in record_versions:
+            snapshot = ver.get_snapshot()
+            ver.changed_fields = cls.get_changed_field_names(snapshot, previous_snapshot)
+            previous_snapshot = snapshot
+
+        cls._base_manager.using(using).bulk_update(record_versions, ["changed_fields"])
+
+    @classmethod
+    def count_skipped_write(cls):
+        with _skipped_version_writes_lock:
+            cls.skipped_version_writes += 1
+        count_version_writes(cls, "skipped")
+
+    @classmethod
+    def create_from_original_if_changed(cls, live_instance):
+        """
+        like create_from_original, but returns None instead of writing a version
+        identical to the last one
+        """
         ver = cls.build_from_original(live_instance)
-        ver.save()
+        using = router.db_for_read(cls)
+        latest_first = cls.get_latest_first_ordering()
+        version_id, snapshot = getattr(live_instance, "_version_snapshot", (None, None))
+        # the cached snapshot only stands for the latest version until another writer adds one
+        if (
+            version_id is None
+            or cls._base_manager.using(using)
+            .filter(eternal_id=live_instance.pk)
+            .order_by(*latest_first)
+            .values_list("id", flat=True)
+            .first()
+            != version_id
+        ):
+            # read through objects, so that delta and m2m event versions are rebuilt in full
+            latest = (
+                cls.objects.using(using)
+                .filter(eternal_id=live_instance.pk)
+                .order_by(*latest_first)
+                .first()
+            )
+            snapshot = latest and latest.get_snapshot()
+
+        if snapshot == ver.get_snapshot():
+            cls.count_skipped_write()
+            return None
+
+        return cls._insert_new_version(ver)
+
+    @classmethod
+    def create_from_original(cls, live_instance):
+        with measure_version_writes(cls):
+            ver = cls.build_from_original(live_instance)
+            return cls._insert_new_version(ver)
+
+    @classmethod
+    async def acreate_from_original(cls, live_instance):
+        """
+        create_from_original for async code, the whole write is a single hop to the ORM's thread
+        """
+        return await sync_to_async(cls.create_from_original)(live_instance)
+
+    @classmethod
+    def _insert_new_version(cls, ver):
+        using = router.db_for_write(cls, instance=ver)
+        with cls._writing_new_versions(using):
+            cls.prepare_new_versions([ver], using=using)
+            ver.save(using=using)
+            cls.finalize_new_versions([ver], using=using)
+        count_version_writes(cls, "created")
         return ver
 
+    @classmethod
+    def _drop_unchanged_versions(cls, live_instances, versions, using):
+        snapshots = {
+            ver.eternal_id: ver.get_snapshot()
+            for ver in cls.objects.db_manager(using).latest_versions_for_eternal_ids(
+                {ver.eternal_id for ver in versions}
+            )
+        }
+
+        kept_live_instances, kept_versions = [], []
+        for live_instance, ver in zip(live_instances, versions):
+            snapshot = ver.get_snapshot()
+            if snapshots.get(ver.eternal_id, None) == snapshot:
+                cls.count_skipped_write()
+                continue
+            snapshots[ver.eternal_id] = snapshot
+            kept_live_instances.append(live_instance)
+            kept_versions.append(ver)
+
+        return kept_live_instances, kept_versions
+
+    @classmethod
+    def create_tombstone(cls, live_instance):
+        """
+        writes a last version, marked is_deleted, for a live instance about to be deleted
+        """
+        ver = cls.build_from_original(live_instance)
+        ver.is_deleted = True
+        return cls._insert_new_version(ver)
+
+    @classmethod
+    def delete_versions_in_chunks(cls, eternal_ids, using=None):
+        """
+        deletes the versions of some records without loading them, live_delete_chunk_size rows per DELETE
+        run inside a transaction, foreign keys between versions are only checked at commit
+        """
+        manager = cls._base_manager.using(using)
+        deleted_count = 0
+        while True:
+            version_ids = list(
+                manager.filter(eternal_id__in=eternal_ids).values_list("id", flat=True)[
+                    : cls.live_delete_chunk_size
+                ]
+            )
+            if not version_ids:
+                return deleted_count
+
+            if cls.m2m_history == "events":
+                cls.m2m_event_model._base_manager.using(using).filter(
+                    version_id__in=version_ids
+                )._raw_delete(manager.db)
+            deleted_count += manager.filter(id__in=version_ids)._raw_delete(manager.db)
+
+    @classmethod
+    def get_m2m_ids_by_live_id(cls, live_ids, using=None):
+        """
+        fetches m2m ids for many live records, one query per m2m field
+        returns {field_name: {live_id: [related_id, ...]}}
+        """
+        m2m_ids = {}
+        for field in cls.get_m2m_fields_to_version():
+            through = field.remote_field.through
+            source_attname = through._meta.get_field(field.m2m_field_name()).attname
+            target_attname = through._meta.get_field(
+                field.m2m_reverse_field_name()
+            ).attname
+
+            ids_by_live_id = {live_id: [] for live_id in live_ids}
+            related_pairs = (
+                through._base_manager.using(using)
+                .filter(**{f"{source_attname}__in": live_ids})
+                .values_list(source_attname, target_attname)
+            )
+            for live_id, related_id in related_pairs:
+                ids_by_live_id[live_id].append(related_id)
+
+            m2m_ids[field.name] = ids_by_live_id
+
+        return m2m_ids
+
+    @classmethod
+    def bulk_build_from_originals(
+        cls, live_instances, using=None, fetch_m2m=True, **version_attrs
+    ):
+        using = using or router.db_for_write(cls)
+        live_instances = list(live_instances)
+        live_ids = [inst.pk for inst in live_instances]
+        if fetch_m2m:
+            m2m_ids = cls.get_m2m_ids_by_live_id(live_ids, using=using)
+        else:
+            m2m_ids = {f.name: defaultdict(list) for f in cls.get_m2m_fields_to_version()}
+
+        # the whole batch shares the same timestamps
+        now = timezone.now()
+        date_attrs = {
+            f.attname: now
+            for f in cls._meta.concrete_fields
+            if f.name in ("system_date", "business_date")
+        }
+
+        versions = []
+        for live_instance in live_instances:
+            m2m_dict = {
+                field_name: ids_by_live_id[live_instance.pk]
+                for field_name, ids_by_live_id in m2m_ids.items()
+            }
+            ver = cls.build_from_original(live_instance, m2m_dict=m2m_dict)
+            for attname, value in date_attrs.items():
+                setattr(ver, attname, value)
+            versions.append(ver)
+
+        # bulk_create doesn't send pre_save,
+        # but receivers (e.g. WhodidMiddleware's) still expect to see every version
+        if pre_save.has_listeners(cls):
+            for ver in versions:
+                pre_save.send(
+                    sender=cls, instance=ver, raw=False, using=using, update_fields=None
+                )
+
+        for ver in versions:
+            for attr, value in version_attrs.items():
+                setattr(ver, attr, value)
+
+        return versions
+
+    @classmethod
+    def bulk_create_from_originals(
+        cls, live_instances, batch_size=None, using=None, fetch_m2m=True, **version_attrs
+    ):
+        """
+        writes a version for each live instance,
+        m2m ids are fetched with one query per m2m field per batch
+        """
+        if batch_size is None:
+            live_instances = list(live_instances)
+            batches = [live_instances] if live_instances else []
+        else:
+            batches = chunked(live_instances, batch_size)
+
+        created = []
+        for batch in batches:
+            versions = cls.bulk_build_from_originals(
+                batch, using=using, fetch_m2m=fetch_m2m, **version_attrs
+            )
+            if cls.skip_unchanged_versions:
+                batch, versions = cls._drop_unchanged_versions(batch, versions, using)
+                if not versions:
+                    continue
+            created.extend(cls.bulk_insert_versions(versions, using=using))
+
+            # mirror the post_save receiver: further m2m edits apply to these versions
+            for live_instance, version in zip(batch, versions):
+                remember_current_version(live_instance, version)
+
+        return created
+
+    @classmethod
+    async def abulk_create_from_originals(
+        cls, live_instances, batch_size=None, using=None, fetch_m2m=True, **version_attrs
+    ):
+        """
+        bulk_create_from_originals for async code, every batch is written in the same hop
+        """
+        return await sync_to_async(cls.bulk_create_from_originals)(
+            list(live_instances),
+            batch_size=batch_size,
+            using=using,
+            fetch_m2m=fetch_m2m,
+            **version_attrs,
+        )
+
+    @classmethod
+    def bulk_insert_versions(cls, versions, using=None):
+        """
+        inserts built versions with a single bulk_create
+        """
+        using = using or router.db_for_write(cls)
+        with cls._writing_new_versions(using):
+            cls.prepare_new_versions(versions, using=using)
+            created = cls._base_manager.using(using).bulk_create(versions)
+            cls.finalize_new_versions(versions, using=using)
+        count_version_writes(cls, "created", len(created))
+        return created
+
     @classmethod
     def update_instance_version(cls, instance):
-        version = instance.versions.last()
+        with measure_version_writes(cls):
+            version = cls._update_instance_version(instance)
+        count_version_writes(cls, "updated")
+        return version
+
+    @classmethod
+    def _update_instance_version(cls, instance):
+        version = instance.versions.order_by(*cls.get_latest_first_ordering()).first()
+        old_state = {f.attname: getattr(version, f.attname) for f in version._meta.fields}
+        old_snapshot = version.get_snapshot()
         # update all non-m2m fields
         for f in cls.live_model._meta.fields:
             if not f.name in ["id", "system_date"]:
                 setattr(version, f.attname, instance.serializable_value(f.name))
 
+        if cls.track_changed_fields and version.changed_fields is not None:
+            # compared to the version being replaced rather than the previous one, so possibly too many
+            version.changed_fields = merge_changed_fields(
+                version.changed_fields,
+                cls.get_changed_field_names(version.get_snapshot(), old_snapshot),
+            )
+
+        if cls.deduplicated_fields:
+            # the new values are stored like on insert, the version only points at them
+            cls._write_blobs([version], router.db_for_write(cls, instance=version))
+
+        if cls.delta_snapshot_interval is None:
+            version.save()
+            return version
+
+        changed = {
+            name
+            for name in cls.get_delta_field_names()
+            if getattr(version, name) != old_state[name]
+        }
+        version.delta_fields = [
+            name
+            for name in cls.get_delta_field_names()
+            if name in changed or name in version.delta_fields
+        ]
+        version._full_state = {
+            name: getattr(version, name) for name in cls.get_delta_field_names()
+        }
+        if version.delta_depth:
+            for name in cls.get_delta_field_names():
+                if name not in version.delta_fields:
+                    setattr(version, name, None)
         version.save()
+        version._restore_full_state()
+        return version
 
     @staticmethod
     def serialize_m2m_ids(pk_list):
         return sorted(pk_list)
 
     def get_m2m_ids(self, key):
-        getattr(self, key)
+        return getattr(self, key)
 
     def set_m2m(self, field, pk_set):
+        if self.m2m_history == "events":
+            self.add_m2m_events(
+                self.pk, self.eternal_id, field.name, getattr(self, field.attname), pk_set
+            )
         setattr(self, field.name, self.serialize_m2m_ids(pk_set))
         self.save()
 
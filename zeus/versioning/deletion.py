@@ -0,0 +1,77 @@
+"""
+What happens to versions when their live row is deleted, see VersionModel.live_delete_strategy
+
+"cascade": django's collector deletes the versions, loading them first when anything references them
+"database": PostgreSQL deletes them through ON DELETE CASCADE foreign keys,
+    installed by the CascadeVersionDeletes migration operation. Other databases fall back to "chunked"
+"chunked": versions are deleted with raw DELETEs of live_delete_chunk_size rows, never loaded
+"tombstone": versions are kept, and a last version with is_deleted = True records the deletion
+"""
+from django.db.migrations.operations.base import Operation
+
+DELETE_STRATEGIES = ("cascade", "database", "chunked", "tombstone")
+
+
+def is_database_cascade_supported(connection):
+    return connection.vendor == "postgresql"
+
+
+def get_cascading_foreign_keys(version_cls):
+    # (model, foreign key) pairs that the database has to cascade through
+    foreign_keys = [(version_cls, version_cls._meta.get_field("eternal"))]
+    if version_cls.m2m_history == "events":
+        event_model = version_cls.m2m_event_model
+        foreign_keys.append((event_model, event_model._meta.get_field("version")))
+    return foreign_keys
+
+
+def set_foreign_key_cascade(schema_editor, model, field, cascade):
+    quote = schema_editor.quote_name
+    table = quote(model._meta.db_table)
+    for name in schema_editor._constraint_names(model, [field.column], foreign_key=True):
+        schema_editor.execute(f"ALTER TABLE {table} DROP CONSTRAINT {quote(name)}")
+
+    to_meta = field.remote_field.model._meta
+    name = f"{model._meta.db_table}_{field.column}_fk_cascade"[-63:]
+    schema_editor.execute(
+        f"ALTER TABLE {table} ADD CONSTRAINT {quote(name)} "
+        f"FOREIGN KEY ({quote(field.column)}) "
+        f"REFERENCES {quote(to_meta.db_table)} ({quote(field.target_field.column)})"
+        f"{' ON DELETE CASCADE' if cascade else ''} DEFERRABLE INITIALLY DEFERRED"
+    )
+
+
+class CascadeVersionDeletes(Operation):
+    """
+    add this to a migration after the version model's table exists,
+    e.g. CascadeVersionDeletes("bookversion"), for version models with live_delete_strategy = "database"
+    """
+
+    reversible = True
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def deconstruct(self):
+        return (self.__class__.__qualname__, [self.model_name], {})
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def _set_cascade(self, app_label, schema_editor, cascade):
+        from django.apps import apps
+
+        if not is_database_cascade_supported(schema_editor.connection):
+            return
+        version_cls = apps.get_model(app_label, self.model_name)
+        for model, field in get_cascading_foreign_keys(version_cls):
+            set_foreign_key_cascade(schema_editor, model, field, cascade)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        self._set_cascade(app_label, schema_editor, cascade=True)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        self._set_cascade(app_label, schema_editor, cascade=False)
+
+    def describe(self):
+        return f"Cascade deletes of live rows to {self.model_name} in the database"
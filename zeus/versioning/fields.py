@@ -0,0 +1,109 @@
+import json
+import lzma
+import zlib
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import models
+from django.db.models.query_utils import DeferredAttribute
+
+# first byte of stored values
+HEADERS = {
+    None: b"\x00",
+    "zlib": b"z",
+    "lzma": b"x",
+}
+CODECS = {
+    "zlib": (zlib.compress, zlib.decompress),
+    "lzma": (lzma.compress, lzma.decompress),
+}
+
+
+class CompressedValueAttribute(DeferredAttribute):
+    """
+    Stores what the database returns as is, and only decompresses on first access.
+    A data descriptor (unlike DeferredAttribute), so that every access goes through it
+    """
+
+    def __get__(self, instance, cls=None):
+        if instance is None:
+            return self
+        value = super().__get__(instance, cls)
+        if isinstance(value, (bytes, memoryview)):
+            value = self.field.decode(bytes(value))
+            instance.__dict__[self.field.attname] = value
+        return value
+
+    def __set__(self, instance, value):
+        instance.__dict__[self.field.attname] = value
+
+
+class CompressedField(models.BinaryField):
+    """
+    Version-table stand-in for a text or JSON field, stored as binary,
+    compressed once the serialized value reaches threshold bytes.
+    Raw query results (values(), values_list()) hold the stored bytes
+    """
+
+    descriptor_class = CompressedValueAttribute
+
+    def __init__(
+        self, *args, value_type="text", algorithm="zlib", threshold=1024, **kwargs
+    ):
+        if value_type not in ("text", "json"):
+            raise ValueError(f"unknown value_type {value_type}")
+        if algorithm not in CODECS:
+            raise ValueError(f"unknown compression algorithm {algorithm}")
+        self.value_type = value_type
+        self.algorithm = algorithm
+        self.threshold = threshold
+        super().__init__(*args, **kwargs)
+
+    def deconstruct(self):
+        name, path, args, kwargs = super().deconstruct()
+        kwargs.update(
+            value_type=self.value_type, algorithm=self.algorithm, threshold=self.threshold
+        )
+        return name, path, args, kwargs
+
+    def encode(self, value):
+        if self.value_type == "json":
+            data = json.dumps(value, cls=DjangoJSONEncoder).encode()
+        else:
+            data = str(value).encode()
+
+        if len(data) < self.threshold:
+            return HEADERS[None] + data
+        compress, _decompress = CODECS[self.algorithm]
+        return HEADERS[self.algorithm] + compress(data)
+
+    def decode(self, stored):
+        header, data = stored[:1], stored[1:]
+        for algorithm, algorithm_header in HEADERS.items():
+            if header == algorithm_header:
+                break
+        else:
+            raise ValueError(f"unknown compression header {header!r}")
+
+        if algorithm is not None:
+            _compress, decompress = CODECS[algorithm]
+            data = decompress(data)
+
+        if self.value_type == "json":
+            return json.loads(data)
+        return data.decode()
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        # values that were never accessed go back untouched
+        if value is not None and not isinstance(value, (bytes, memoryview)):
+            value = self.encode(value)
+        return super().get_db_prep_value(value, connection, prepared)
+
+    def value_from_object(self, obj):
+        return getattr(obj, self.attname)
+
+    # serializers deal in decoded values
+    def value_to_string(self, obj):
+        return self.value_from_object(obj)
+
+    def to_python(self, value):
+        return value
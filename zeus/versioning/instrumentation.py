@@ -0,0 +1,196 @@
+"""
+Measures what versioning adds to writes: versions created, updated and skipped,
+time spent, queries issued and bytes written, per version model
+
+measurements are aggregated into a VersionWriteReport per collect_version_stats block,
+VersionStatsMiddleware opens one per request. Writes outside any block aren't measured
+
+when a block ends, its report goes to the stats sink:
+set_stats_sink(sink), or settings.ZEUS_VERSIONING_STATS_SINK (a dotted path to a sink class)
+a sink is anything with a record(report) method, e.g. LoggingStatsSink or MemoryStatsSink
+"""
+import logging
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import connections, router
+from django.utils.module_loading import import_string
+
+from zeus.django.query_counting import QueryCollector
+
+logger = logging.getLogger(__name__)
+
+_current_report = ContextVar("zeus_versioning_report", default=None)
+# the outermost measured write, nested ones are part of it
+_measuring = ContextVar("zeus_versioning_measuring", default=False)
+
+_unset = object()
+_stats_sink = _unset
+
+
+class VersionWriteStats:
+    def __init__(self):
+        self.created = 0
+        self.updated = 0
+        self.skipped = 0
+        self.seconds = 0.0
+        self.queries = 0
+        # approximate, the size of the parameters sent with INSERT and UPDATE statements
+        self.bytes_written = 0
+
+    def add(self, other):
+        for attr, value in vars(other).items():
+            setattr(self, attr, getattr(self, attr) + value)
+
+    def as_dict(self):
+        return dict(vars(self))
+
+
+class VersionWriteReport:
+    def __init__(self, label=None):
+        self.label = label
+        # version model label -> VersionWriteStats
+        self.by_model = defaultdict(VersionWriteStats)
+
+    def totals(self):
+        totals = VersionWriteStats()
+        for stats in self.by_model.values():
+            totals.add(stats)
+        return totals
+
+    def as_dict(self):
+        return {
+            "label": self.label,
+            "models": {label: s.as_dict() for label, s in self.by_model.items()},
+            "totals": self.totals().as_dict(),
+        }
+
+
+class LoggingStatsSink:
+    """
+    logs one line per report, at INFO
+    """
+
+    def __init__(self, logger_name=__name__):
+        self.logger = logging.getLogger(logger_name)
+
+    def record(self, report):
+        totals = report.totals()
+        self.logger.info(
+            "versioning for %s: %s created, %s updated, %s skipped, "
+            "%.1fms, %s queries, %s bytes",
+            report.label,
+            totals.created,
+            totals.updated,
+            totals.skipped,
+            totals.seconds * 1000,
+            totals.queries,
+            totals.bytes_written,
+            extra={"versioning_stats": report.as_dict()},
+        )
+
+
+class MemoryStatsSink:
+    """
+    keeps every report, for tests
+    """
+
+    def __init__(self):
+        self.reports = []
+
+    def record(self, report):
+        self.reports.append(report)
+
+
+def get_stats_sink():
+    global _stats_sink
+    if _stats_sink is _unset:
+        path = getattr(settings, "ZEUS_VERSIONING_STATS_SINK", None)
+        _stats_sink = import_string(path)() if path else None
+    return _stats_sink
+
+
+def set_stats_sink(sink):
+    """
+    replaces the sink (None turns reporting off), returns the previous one
+    """
+    global _stats_sink
+    previous = get_stats_sink()
+    _stats_sink = sink
+    return previous
+
+
+@contextmanager
+def collect_version_stats(label=None):
+    """
+    measures version writes in this block, e.g. in a management command,
+    yields the report, which is also sent to the stats sink at the end
+    """
+    report = VersionWriteReport(label)
+    token = _current_report.set(report)
+    try:
+        yield report
+    finally:
+        _current_report.reset(token)
+        sink = get_stats_sink()
+        if sink is not None and report.by_model:
+            try:
+                sink.record(report)
+            except Exception:
+                logger.exception("failed recording versioning stats")
+
+
+def count_version_writes(version_cls, outcome, count=1):
+    """
+    outcome is "created", "updated" or "skipped"
+    """
+    report = _current_report.get()
+    if report is not None:
+        stats = report.by_model[version_cls._meta.label]
+        setattr(stats, outcome, getattr(stats, outcome) + count)
+
+
+def get_written_bytes(queries):
+    written = 0
+    for query in queries:
+        if query["sql"].lstrip()[:6].upper() not in ("INSERT", "UPDATE"):
+            continue
+        rows = query["params"] if query["many"] else [query["params"]]
+        for params in rows:
+            for value in params or ():
+                if value is None:
+                    continue
+                if isinstance(value, (bytes, memoryview)):
+                    written += len(value)
+                else:
+                    written += len(str(value).encode())
+    return written
+
+
+@contextmanager
+def measure_version_writes(version_cls, using=None):
+    """
+    times the block and collects its queries, charged to version_cls
+    """
+    report = _current_report.get()
+    if report is None or _measuring.get():
+        yield
+        return
+
+    collector = QueryCollector()
+    connection = connections[using or router.db_for_write(version_cls)]
+    token = _measuring.set(True)
+    start = time.perf_counter()
+    try:
+        with connection.execute_wrapper(collector):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        _measuring.reset(token)
+        stats = report.by_model[version_cls._meta.label]
+        stats.seconds += elapsed
+        stats.queries += len(collector.queries)
+        stats.bytes_written += get_written_bytes(collector.queries)
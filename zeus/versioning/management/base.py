@@ -0,0 +1,136 @@
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, transaction
+
+from zeus.versioning.core import get_version_models
+
+
+class VersionModelCommand(BaseCommand):
+    """
+    a command run on the version models given as app_label.ModelName arguments,
+    or on every version model it applies to
+    """
+
+    models_help = "app_label.ModelName of version models, defaults to all of them"
+    not_applicable_message = "{label} is not a version model"
+
+    def add_arguments(self, parser):
+        parser.add_argument("models", nargs="*", help=self.models_help)
+        parser.add_argument("--database", default=DEFAULT_DB_ALIAS)
+
+    def applies_to(self, model):
+        return hasattr(model, "live_model")
+
+    def get_models(self, labels):
+        if not labels:
+            return [m for m in get_version_models() if self.applies_to(m)]
+
+        version_models = []
+        for label in labels:
+            try:
+                model = apps.get_model(label)
+            except (LookupError, ValueError) as e:
+                raise CommandError(str(e))
+            if not self.applies_to(model):
+                raise CommandError(self.not_applicable_message.format(label=label))
+            version_models.append(model)
+        return version_models
+
+
+class BatchedVersionModelCommand(VersionModelCommand):
+    """
+    works through each model's records in batches, with one transaction per batch,
+    printing its progress. An interrupted run can be resumed with --start-after
+
+    subclasses implement get_queryset and process_batch
+    """
+
+    default_batch_size = 500
+    # the keyset pagination column, get_queryset must be ordered by it
+    batch_key = "eternal_id"
+    # what process_batch counts, e.g. "versions deleted", or None if it counts nothing
+    counted = None
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=self.default_batch_size,
+            help="records per batch",
+        )
+        parser.add_argument(
+            "--start-after",
+            type=int,
+            default=None,
+            help=f"{self.batch_key} to resume from, only useful with a single model",
+        )
+
+    def handle(self, *args, models, batch_size, start_after, database, **options):
+        version_models = self.get_models(models)
+        if start_after is not None and len(version_models) != 1:
+            raise CommandError("--start-after requires exactly one model")
+
+        self.setup(**options)
+        for version_cls in version_models:
+            self.process_model(version_cls, batch_size, start_after, database)
+
+    def setup(self, **options):
+        """
+        receives the command's own options, before any model is processed
+        """
+
+    def get_queryset(self, version_cls, database):
+        """
+        the rows to batch, ordered by batch_key, e.g. the eternal ids of some versions
+        """
+        raise NotImplementedError
+
+    def get_key(self, row):
+        return row
+
+    def process_batch(self, version_cls, batch, database):
+        """
+        runs inside the batch's transaction, returns the number of things counted
+        """
+        raise NotImplementedError
+
+    def describe(self, count, record_count):
+        if self.counted is None:
+            return f"{record_count} records"
+        return f"{count} {self.counted} over {record_count} records"
+
+    def process_model(self, version_cls, batch_size, start_after, database):
+        label = version_cls._meta.label
+        rows = self.get_queryset(version_cls, database)
+
+        started = time.monotonic()
+        count = 0
+        record_count = 0
+        last_key = start_after
+        while True:
+            # keyset pagination, so each batch is a fresh, cheap query
+            page = rows
+            if last_key is not None:
+                page = page.filter(**{f"{self.batch_key}__gt": last_key})
+            batch = list(page[:batch_size])
+            if not batch:
+                break
+            last_key = self.get_key(batch[-1])
+
+            # one short transaction per batch, rather than one long lock on the table
+            with transaction.atomic(using=database):
+                count += self.process_batch(version_cls, batch, database) or 0
+            record_count += len(batch)
+
+            elapsed = time.monotonic() - started
+            self.stdout.write(
+                f"{label}: {self.describe(count, record_count)}, last {self.batch_key} {last_key} "
+                f"({elapsed:.1f}s, {record_count / max(elapsed, 1e-3):.0f} records/s)"
+            )
+
+        self.stdout.write(
+            self.style.SUCCESS(f"{label}: done, {self.describe(count, record_count)}")
+        )
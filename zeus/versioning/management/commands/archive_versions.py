@@ -0,0 +1,56 @@
+from datetime import datetime
+from datetime import time as datetime_time
+
+from django.core.management.base import CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from zeus.versioning.archive import VersionArchive, archive_records_before
+from zeus.versioning.management.base import BatchedVersionModelCommand
+
+
+class Command(BatchedVersionModelCommand):
+    help = (
+        "Moves versions from before a date to gzipped JSON lines files, "
+        "keeping each record's latest version from before that date"
+    )
+    models_help = (
+        "app_label.ModelName of version models to archive, defaults to all of them"
+    )
+    counted = "versions archived"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--before", type=parse_date, required=True, help="cutoff date (YYYY-MM-DD)"
+        )
+        parser.add_argument(
+            "--archive-dir",
+            default=None,
+            help="defaults to settings.ZEUS_VERSION_ARCHIVE_DIR",
+        )
+
+    def setup(self, *, before, archive_dir, **options):
+        if before is None:
+            raise CommandError("--before must be a YYYY-MM-DD date")
+        self.cutoff = timezone.make_aware(datetime.combine(before, datetime_time.min))
+        self.archive_dir = archive_dir
+
+    def process_model(self, version_cls, *args):
+        self.archive = VersionArchive(version_cls, self.archive_dir)
+        super().process_model(version_cls, *args)
+
+    def get_queryset(self, version_cls, database):
+        date_field_name = version_cls.get_valid_from_field_name()
+        return (
+            version_cls._base_manager.using(database)
+            .filter(**{f"{date_field_name}__lt": self.cutoff})
+            .order_by("eternal_id")
+            .values_list("eternal_id", flat=True)
+            .distinct()
+        )
+
+    def process_batch(self, version_cls, batch, database):
+        return archive_records_before(
+            version_cls, batch, self.cutoff, self.archive, using=database
+        )
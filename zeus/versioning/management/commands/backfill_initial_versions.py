@@ -0,0 +1,37 @@
+from django.db.models import Exists, OuterRef
+
+from zeus.versioning.management.base import BatchedVersionModelCommand
+
+
+class Command(BatchedVersionModelCommand):
+    help = (
+        "Writes a first version for every live row that has none, e.g. once a table gets versioned, "
+        "with one bulk insert per batch of rows"
+    )
+    models_help = (
+        "app_label.ModelName of version models to backfill, defaults to all of them"
+    )
+    default_batch_size = 1000
+    batch_key = "pk"
+    counted = "versions created"
+
+    def get_queryset(self, version_cls, database):
+        # rows that already have a version are skipped, so reruns pick up where they stopped
+        return (
+            version_cls.live_model._base_manager.using(database)
+            .filter(
+                ~Exists(
+                    version_cls._base_manager.using(database).filter(
+                        eternal_id=OuterRef("pk")
+                    )
+                )
+            )
+            .order_by("pk")
+        )
+
+    def get_key(self, row):
+        return row.pk
+
+    def process_batch(self, version_cls, batch, database):
+        # m2m ids are fetched with one query per m2m field per batch
+        return len(version_cls.bulk_create_from_originals(batch, using=database))
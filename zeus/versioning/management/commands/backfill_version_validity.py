@@ -0,0 +1,27 @@
+from zeus.versioning.management.base import BatchedVersionModelCommand
+
+
+class Command(BatchedVersionModelCommand):
+    help = (
+        "Fills in previous_version, valid_to and is_current on version models "
+        "with track_validity, a batch of records at a time"
+    )
+    models_help = (
+        "app_label.ModelName of version models to backfill, defaults to all of them"
+    )
+    not_applicable_message = "{label} is not a version model with track_validity"
+    counted = "versions updated"
+
+    def applies_to(self, model):
+        return getattr(model, "track_validity", False)
+
+    def get_queryset(self, version_cls, database):
+        return (
+            version_cls._base_manager.using(database)
+            .order_by("eternal_id")
+            .values_list("eternal_id", flat=True)
+            .distinct()
+        )
+
+    def process_batch(self, version_cls, batch, database):
+        return version_cls.rebuild_validity(batch, using=database)
@@ -0,0 +1,46 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+from zeus.versioning.compaction import compact_records
+from zeus.versioning.management.base import BatchedVersionModelCommand
+
+
+class Command(BatchedVersionModelCommand):
+    help = (
+        "Deletes versions identical to the one before them and, with --daily-after, "
+        "all but the last version of each day for older days, a batch of records at a time"
+    )
+    models_help = (
+        "app_label.ModelName of version models to compact, defaults to all of them"
+    )
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--daily-after",
+            type=int,
+            default=None,
+            help="keep only one version per day for versions older than this many days",
+        )
+        parser.add_argument("--dry-run", action="store_true")
+
+    def setup(self, *, daily_after, dry_run, **options):
+        self.daily_before = None
+        if daily_after is not None:
+            self.daily_before = timezone.now() - timedelta(days=daily_after)
+        self.dry_run = dry_run
+        self.counted = "versions to delete" if dry_run else "versions deleted"
+
+    def get_queryset(self, version_cls, database):
+        return (
+            version_cls._base_manager.using(database)
+            .order_by("eternal_id")
+            .values_list("eternal_id", flat=True)
+            .distinct()
+        )
+
+    def process_batch(self, version_cls, batch, database):
+        return compact_records(
+            version_cls, batch, self.daily_before, dry_run=self.dry_run, using=database
+        )
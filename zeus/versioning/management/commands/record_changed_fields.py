@@ -0,0 +1,36 @@
+from itertools import groupby
+from operator import attrgetter
+
+from zeus.versioning.management.base import BatchedVersionModelCommand
+
+
+class Command(BatchedVersionModelCommand):
+    help = (
+        "Fills in changed_fields of versions written before track_changed_fields was turned on, "
+        "a batch of records at a time"
+    )
+    models_help = "app_label.ModelName of version models, defaults to all of them tracking changed fields"
+    not_applicable_message = "{label} doesn't track changed fields"
+
+    def applies_to(self, model):
+        return getattr(model, "track_changed_fields", False)
+
+    def get_queryset(self, version_cls, database):
+        return (
+            version_cls._base_manager.using(database)
+            .filter(changed_fields__isnull=True)
+            .order_by("eternal_id")
+            .values_list("eternal_id", flat=True)
+            .distinct()
+        )
+
+    def process_batch(self, version_cls, batch, database):
+        versions = (
+            version_cls.objects.using(database)
+            .filter(eternal_id__in=batch)
+            .order_by("eternal_id", *version_cls.get_version_ordering())
+        )
+        for _eternal_id, record_versions in groupby(
+            versions, key=attrgetter("eternal_id")
+        ):
+            version_cls.rebuild_changed_fields(list(record_versions), using=database)
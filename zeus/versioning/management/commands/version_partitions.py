@@ -0,0 +1,91 @@
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+from zeus.versioning.management.base import VersionModelCommand
+from zeus.versioning.partitioning import (
+    create_partition,
+    detach_partition,
+    get_partition_range,
+    get_range_partitions,
+    is_partitioning_supported,
+)
+
+
+class Command(VersionModelCommand):
+    help = (
+        "Creates upcoming range partitions of partitioned version tables, "
+        "and optionally detaches old ones"
+    )
+    models_help = (
+        "app_label.ModelName of version models, defaults to all partitioned ones"
+    )
+    not_applicable_message = "{label} is not a partitioned version model"
+
+    def add_arguments(self, parser):
+        super().add_arguments(parser)
+        parser.add_argument(
+            "--ahead",
+            type=int,
+            default=3,
+            help="number of partitions to have after the current one",
+        )
+        parser.add_argument(
+            "--since",
+            type=parse_date,
+            default=None,
+            help="also create partitions from this date (YYYY-MM-DD), e.g. for existing rows",
+        )
+        parser.add_argument(
+            "--detach-before",
+            type=parse_date,
+            default=None,
+            help="detach partitions that end before this date (YYYY-MM-DD)",
+        )
+
+    def handle(self, *args, models, ahead, since, detach_before, database, **options):
+        connection = connections[database]
+        if not is_partitioning_supported(connection):
+            self.stdout.write(
+                f"{connection.vendor} tables aren't partitioned, nothing to do"
+            )
+            return
+
+        for version_cls in self.get_models(models):
+            with transaction.atomic(using=database):
+                self.create_partitions(connection, version_cls, ahead, since)
+                if detach_before is not None:
+                    self.detach_partitions(connection, version_cls, detach_before)
+
+    def applies_to(self, model):
+        return getattr(model, "partition_by", None) is not None
+
+    def create_partitions(self, connection, version_cls, ahead, since):
+        table = version_cls._meta.db_table
+        interval = version_cls.partition_by
+        column = version_cls._meta.get_field(
+            version_cls.get_valid_from_field_name()
+        ).column
+
+        current_lower, _upper = get_partition_range(interval, timezone.now())
+        lower, _upper = get_partition_range(interval, since or timezone.now())
+        lower = min(lower, current_lower)
+
+        # every partition since `since`, the current one, and `ahead` more
+        remaining = ahead + 1
+        while remaining:
+            name = create_partition(connection, table, column, interval, lower)
+            if name:
+                self.stdout.write(f"created {name}")
+            if lower >= current_lower:
+                remaining -= 1
+            _lower, lower = get_partition_range(interval, lower)
+
+    def detach_partitions(self, connection, version_cls, detach_before):
+        table = version_cls._meta.db_table
+        interval = version_cls.partition_by
+        for name, lower in get_range_partitions(connection, table, interval):
+            _lower, upper = get_partition_range(interval, lower)
+            if upper.date() <= detach_before:
+                detach_partition(connection, table, name)
+                self.stdout.write(f"detached {name}")
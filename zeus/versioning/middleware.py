@@ -1,43 +1,146 @@
-from django.conf import settings
-from django.db import connections
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
 from django.db.models import signals
 
+from asgiref.sync import sync_to_async
 
-def mark_whodid(user, sender, instance, **kwargs):
-    if hasattr(sender, "edited_by"):
+from .instrumentation import collect_version_stats
+
+_unset = object()
+
+# the user behind the current write request, each request (thread or task) sees its own
+_current_editor = ContextVar("zeus_versioning_editor", default=_unset)
+# aliases of the connections whose trigger session variable holds the acting user,
+# see zeus.versioning.triggers
+_forwarded_aliases = ContextVar("zeus_versioning_forwarded_aliases", default=None)
+
+
+def mark_whodid(sender, instance, **kwargs):
+    user = _current_editor.get()
+    if user is not _unset:
         instance.edited_by = user
 
 
+def connect_whodid_receiver(sender, **kwargs):
+    # once per model, so that requests don't touch the signal (and its cache) at all
+    if hasattr(sender, "edited_by"):
+        signals.pre_save.connect(
+            mark_whodid, sender=sender, dispatch_uid=("zeus-whodid", sender)
+        )
+
+
+def connect_whodid_receivers():
+    """
+    called from VersioningConfig.ready(), which also connects models defined after it
+    """
+    for model in apps.get_models():
+        connect_whodid_receiver(model)
+
+
+@contextmanager
+def editor_context(user, forwarded):
+    token = _current_editor.set(user)
+    forwarded_token = _forwarded_aliases.set(forwarded)
+    try:
+        yield
+    finally:
+        _forwarded_aliases.reset(forwarded_token)
+        _current_editor.reset(token)
+
+
+def release_forwarded_editors(forwarded):
+    if forwarded:
+        from .triggers import reset_forwarded_editors
+
+        reset_forwarded_editors(forwarded)
+
+
+@contextmanager
+def acting_as(user):
+    """
+    saves inside this block get edited_by = user, e.g. in management commands or tasks
+    """
+    forwarded = set()
+    try:
+        with editor_context(user, forwarded):
+            yield
+    finally:
+        # once the outer user is back, so the connections get it
+        release_forwarded_editors(forwarded)
+
+
+def get_editor(request):
+    if hasattr(request, "user") and request.user.is_authenticated:
+        return request.user
+    return None
+
+
 class WhodidMiddleware:
+    """
+    works under WSGI and ASGI, under ASGI the user follows the request into
+    sync_to_async threads, since those run in a copy of the request's context
+    """
+
+    sync_capable = True
+    async_capable = True
+
     def __init__(self, get_response):
         self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            # makes django await this middleware instead of wrapping it in a thread
+            self._is_coroutine = asyncio.coroutines._is_coroutine
 
     def __call__(self, request):
-        if request.method not in ("GET", "HEAD", "OPTIONS", "TRACE"):
-            if hasattr(request, "user") and request.user.is_authenticated:
-                user = request.user
-            else:
-                user = None
-
-            def wrapped_mark_whodid(*args, **kwargs):
-                return mark_whodid(user, *args, **kwargs)
-
-            signals.pre_save.connect(
-                wrapped_mark_whodid,
-                dispatch_uid=(
-                    self.__class__,
-                    request,
-                ),
-                weak=False,
-            )
-
-        response = self.get_response(request)
-
-        signals.pre_save.disconnect(
-            dispatch_uid=(
-                self.__class__,
-                request,
-            )
-        )
+        if self.is_async:
+            return self.__acall__(request)
+
+        if request.method in ("GET", "HEAD", "OPTIONS", "TRACE"):
+            return self.get_response(request)
+
+        with acting_as(get_editor(request)):
+            return self.get_response(request)
+
+    async def __acall__(self, request):
+        if request.method in ("GET", "HEAD", "OPTIONS", "TRACE"):
+            return await self.get_response(request)
+
+        # request.user is lazy, loading it queries the session
+        user = await sync_to_async(get_editor)(request)
+        forwarded = set()
+        try:
+            with editor_context(user, forwarded):
+                return await self.get_response(request)
+        finally:
+            # the connections belong to the thread the request's ORM calls ran in
+            if forwarded:
+                await sync_to_async(release_forwarded_editors)(forwarded)
+
+
+class VersionStatsMiddleware:
+    """
+    reports each request's version writes to the stats sink, see zeus.versioning.instrumentation
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = asyncio.iscoroutinefunction(get_response)
+        if self.is_async:
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+
+        with collect_version_stats(f"{request.method} {request.path}"):
+            return self.get_response(request)
 
-        return response
+    async def __acall__(self, request):
+        with collect_version_stats(f"{request.method} {request.path}"):
+            return await self.get_response(request)
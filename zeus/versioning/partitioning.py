@@ -0,0 +1,294 @@
+"""
+Range partitioning of version tables on their business_date (or system_date),
+using PostgreSQL's declarative partitioning.
+Other databases keep regular tables: the migration operation and the partition command are no-ops there
+"""
+from datetime import datetime, timezone
+
+from django.db.migrations.operations.base import Operation
+
+PARTITION_INTERVALS = ("month", "year")
+PARTITION_NAME_FORMATS = {"month": "%Y%m", "year": "%Y"}
+
+
+def is_partitioning_supported(connection):
+    return connection.vendor == "postgresql"
+
+
+def get_partition_range(interval, date):
+    if interval == "month":
+        lower = datetime(date.year, date.month, 1, tzinfo=timezone.utc)
+        if date.month == 12:
+            upper = datetime(date.year + 1, 1, 1, tzinfo=timezone.utc)
+        else:
+            upper = datetime(date.year, date.month + 1, 1, tzinfo=timezone.utc)
+    elif interval == "year":
+        lower = datetime(date.year, 1, 1, tzinfo=timezone.utc)
+        upper = datetime(date.year + 1, 1, 1, tzinfo=timezone.utc)
+    else:
+        raise ValueError(f"unknown partition interval {interval}")
+    return lower, upper
+
+
+def get_partition_name(table_name, interval, lower):
+    return f"{table_name}_p{lower.strftime(PARTITION_NAME_FORMATS[interval])}"
+
+
+def get_default_partition_name(table_name):
+    return f"{table_name}_default"
+
+
+def partition_table(schema_editor, model, field_name):
+    """
+    swaps a regular table for one partitioned by range on field_name, keeping its rows
+    rows land in a default partition until partitions are created with the version_partitions command
+    the primary key becomes (id, field_name), postgres requires it to include the partition key
+    """
+    quote = schema_editor.quote_name
+    table = model._meta.db_table
+    old_table = f"{table}__unpartitioned"
+    _check_not_referenced(schema_editor.connection, table)
+    partition_column = model._meta.get_field(field_name).column
+    pk_column = model._meta.pk.column
+
+    schema_editor.execute(f"ALTER TABLE {quote(table)} RENAME TO {quote(old_table)}")
+    schema_editor.execute(
+        f"CREATE TABLE {quote(table)} (LIKE {quote(old_table)} INCLUDING DEFAULTS) "
+        f"PARTITION BY RANGE ({quote(partition_column)})"
+    )
+    schema_editor.execute(
+        f"CREATE TABLE {quote(get_default_partition_name(table))} "
+        f"PARTITION OF {quote(table)} DEFAULT"
+    )
+    _move_table_contents(schema_editor, old_table, table, pk_column)
+
+    schema_editor.execute(
+        f"ALTER TABLE {quote(table)} ADD CONSTRAINT {quote(table + '_pkey')} "
+        f"PRIMARY KEY ({quote(pk_column)}, {quote(partition_column)})"
+    )
+    _create_indexes_and_foreign_keys(schema_editor, model)
+
+
+def unpartition_table(schema_editor, model):
+    quote = schema_editor.quote_name
+    table = model._meta.db_table
+    partitioned_table = f"{table}__partitioned"
+    _check_not_referenced(schema_editor.connection, table)
+
+    schema_editor.execute(
+        f"ALTER TABLE {quote(table)} RENAME TO {quote(partitioned_table)}"
+    )
+    # partition and index names would clash with the new table's
+    for name in get_partition_names(schema_editor.connection, partitioned_table):
+        schema_editor.execute(
+            f"ALTER TABLE {quote(name)} RENAME TO {quote(name + '__old')}"
+        )
+    schema_editor.execute(
+        f"ALTER TABLE {quote(partitioned_table)} "
+        f"RENAME CONSTRAINT {quote(table + '_pkey')} TO {quote(partitioned_table + '_pkey')}"
+    )
+    _drop_indexes(schema_editor, partitioned_table)
+
+    schema_editor.create_model(model)
+    pk_column = model._meta.pk.column
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [table, pk_column])
+        (new_sequence,) = cursor.fetchone()
+    _move_table_contents(schema_editor, partitioned_table, table, pk_column)
+    # the original sequence carries on numbering
+    if new_sequence:
+        schema_editor.execute(f"DROP SEQUENCE {new_sequence}")
+
+
+def _move_table_contents(schema_editor, from_table, to_table, pk_column):
+    quote = schema_editor.quote_name
+    schema_editor.execute(
+        f"INSERT INTO {quote(to_table)} SELECT * FROM {quote(from_table)}"
+    )
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute("SELECT pg_get_serial_sequence(%s, %s)", [from_table, pk_column])
+        (sequence,) = cursor.fetchone()
+    if sequence:
+        schema_editor.execute(
+            f"ALTER TABLE {quote(to_table)} ALTER COLUMN {quote(pk_column)} "
+            f"SET DEFAULT nextval('{sequence}'::regclass)"
+        )
+        schema_editor.execute(
+            f"ALTER SEQUENCE {sequence} OWNED BY {quote(to_table)}.{quote(pk_column)}"
+        )
+    # rows written earlier in the transaction leave deferred foreign key checks behind,
+    # which would prevent the drop. Only the dropped table's constraints are switched,
+    # they go with it, so the transaction's constraint mode is left as it was
+    constraint_names = _get_deferrable_foreign_key_names(
+        schema_editor.connection, from_table
+    )
+    if constraint_names:
+        schema_editor.execute(
+            f"SET CONSTRAINTS {', '.join(quote(n) for n in constraint_names)} IMMEDIATE"
+        )
+    schema_editor.execute(f"DROP TABLE {quote(from_table)}")
+
+
+def _check_not_referenced(connection, table):
+    """
+    the table is swapped for a new one, foreign keys pointing at it would have to be dropped
+    """
+    from .core import VersioningConfigException
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT referencing.relname, pg_constraint.conname FROM pg_constraint
+            JOIN pg_class referencing ON referencing.oid = pg_constraint.conrelid
+            WHERE pg_constraint.contype = 'f' AND pg_constraint.confrelid = %s::regclass
+            AND pg_constraint.conrelid != pg_constraint.confrelid
+            ORDER BY 1, 2
+            """,
+            [connection.ops.quote_name(table)],
+        )
+        references = [f"{name} on {relname}" for relname, name in cursor.fetchall()]
+    if references:
+        raise VersioningConfigException(
+            f"{table} is referenced by foreign keys ({', '.join(references)}), "
+            f"drop them before swapping the table and recreate them after"
+        )
+
+
+def _get_deferrable_foreign_key_names(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT conname FROM pg_constraint "
+            "WHERE contype = 'f' AND condeferrable AND conrelid = %s::regclass",
+            [connection.ops.quote_name(table)],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def _drop_indexes(schema_editor, table):
+    with schema_editor.connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT indexname FROM pg_indexes WHERE tablename = %s AND indexname != %s",
+            [table, table + "_pkey"],
+        )
+        index_names = [row[0] for row in cursor.fetchall()]
+    for name in index_names:
+        schema_editor.execute(f"DROP INDEX {schema_editor.quote_name(name)}")
+
+
+def _create_indexes_and_foreign_keys(schema_editor, model):
+    for statement in schema_editor._model_indexes_sql(model):
+        schema_editor.execute(statement)
+
+    for field in model._meta.local_fields:
+        if field.remote_field and field.db_constraint:
+            schema_editor.execute(
+                schema_editor._create_fk_sql(
+                    model, field, "_fk_%(to_table)s_%(to_column)s"
+                )
+            )
+
+
+def get_partition_names(connection, table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            """
+            SELECT child.relname FROM pg_inherits
+            JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+            JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+            WHERE parent.relname = %s
+            ORDER BY child.relname
+            """,
+            [table],
+        )
+        return [row[0] for row in cursor.fetchall()]
+
+
+def get_range_partitions(connection, table, interval):
+    """
+    (name, lower bound) of the partitions created by create_partition, oldest first
+    """
+    prefix = f"{table}_p"
+    partitions = []
+    for name in get_partition_names(connection, table):
+        if not name.startswith(prefix):
+            continue
+        try:
+            lower = datetime.strptime(
+                name[len(prefix) :], PARTITION_NAME_FORMATS[interval]
+            ).replace(tzinfo=timezone.utc)
+        except ValueError:
+            continue
+        partitions.append((name, lower))
+    return partitions
+
+
+def create_partition(connection, table, partition_column, interval, date):
+    """
+    creates the partition holding date, moving its rows out of the default partition
+    returns the partition's name, or None if it already exists
+    """
+    quote = connection.ops.quote_name
+    lower, upper = get_partition_range(interval, date)
+    name = get_partition_name(table, interval, lower)
+    if name in get_partition_names(connection, table):
+        return None
+
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE TABLE {quote(name)} (LIKE {quote(table)} INCLUDING DEFAULTS)"
+        )
+        cursor.execute(
+            f"WITH moved AS ("
+            f"DELETE FROM {quote(get_default_partition_name(table))} "
+            f"WHERE {quote(partition_column)} >= %s AND {quote(partition_column)} < %s "
+            f"RETURNING *"
+            f") INSERT INTO {quote(name)} SELECT * FROM moved",
+            [lower, upper],
+        )
+        cursor.execute(
+            f"ALTER TABLE {quote(table)} ATTACH PARTITION {quote(name)} "
+            f"FOR VALUES FROM (%s) TO (%s)",
+            [lower, upper],
+        )
+    return name
+
+
+def detach_partition(connection, table, name):
+    """
+    the detached table keeps its rows, e.g. to be archived then dropped
+    """
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(f"ALTER TABLE {quote(table)} DETACH PARTITION {quote(name)}")
+
+
+class PartitionVersionTable(Operation):
+    """
+    add this to a migration after the version model's table exists,
+    e.g. PartitionVersionTable("bookversion", "business_date")
+    """
+
+    reversible = True
+
+    def __init__(self, model_name, field_name):
+        self.model_name = model_name
+        self.field_name = field_name
+
+    def deconstruct(self):
+        return (self.__class__.__qualname__, [self.model_name, self.field_name], {})
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if is_partitioning_supported(schema_editor.connection):
+            model = to_state.apps.get_model(app_label, self.model_name)
+            partition_table(schema_editor, model, self.field_name)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if is_partitioning_supported(schema_editor.connection):
+            model = to_state.apps.get_model(app_label, self.model_name)
+            unpartition_table(schema_editor, model)
+
+    def describe(self):
+        return f"Partition {self.model_name} by range of {self.field_name}"
@@ -0,0 +1,147 @@
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+
+from django.core.management import call_command
+
+import pytest
+
+from django_sample.models import Author, Book, BookVersion
+from zeus.changelog.consecutive_versions_fetcher import (
+    ConsecutiveVersionsFetcher,
+    SingleRecordConsecutiveVersionsFetcher,
+)
+
+
+@pytest.fixture
+def archived_books(settings, tmp_path):
+    settings.ZEUS_VERSION_ARCHIVE_DIR = str(tmp_path)
+    author = Author.objects.create(first_name="john", last_name="smith")
+
+    def create_book_with_monthly_titles(*titles):
+        # one version per title, on the 1st of each month of 2020
+        book = Book.objects.create(author=author, title=titles[0])
+        for index, title in enumerate(titles):
+            if index:
+                book.reset_version_attrs()
+                book.title = title
+                book.save()
+            book.versions.filter(title=title).update(
+                business_date=datetime(2020, index + 1, 1, tzinfo=timezone.utc)
+            )
+        return book
+
+    book1 = create_book_with_monthly_titles("b1_v1", "b1_v2", "b1_v3", "b1_v4")
+    book2 = create_book_with_monthly_titles("b2_v1", "b2_v2")
+
+    call_command(
+        "archive_versions",
+        "django_sample.BookVersion",
+        "--before=2020-03-15",
+        stdout=StringIO(),
+    )
+    return tmp_path, book1, book2
+
+
+def get_titles(entries):
+    return [
+        (
+            e["version"].title,
+            e["previous_version"] and e["previous_version"].title,
+        )
+        for e in entries
+    ]
+
+
+def test_old_versions_are_moved_to_monthly_files(archived_books):
+    archive_dir, book1, book2 = archived_books
+
+    # each book keeps its latest version from before the cutoff
+    assert list(book1.versions.values_list("title", flat=True)) == ["b1_v3", "b1_v4"]
+    assert list(book2.versions.values_list("title", flat=True)) == ["b2_v2"]
+
+    model_dir = archive_dir / "django_sample.bookversion"
+    assert sorted(p.name for p in model_dir.glob("*.gz")) == [
+        "2020-01.jsonl.gz",
+        "2020-02.jsonl.gz",
+    ]
+    assert sorted(v.title for v in BookVersion.objects.archived()) == [
+        "b1_v1",
+        "b1_v2",
+        "b2_v1",
+    ]
+    assert [
+        v.title
+        for v in BookVersion.objects.archived(
+            start_date=datetime(2020, 2, 1, tzinfo=timezone.utc)
+        )
+    ] == ["b1_v2"]
+
+
+def test_changelog_merges_archived_versions(archived_books):
+    _archive_dir, book1, book2 = archived_books
+
+    fetcher = ConsecutiveVersionsFetcher(
+        page_size=3,
+        page_num=2,
+        models=[Book],
+        start_date=datetime(2020, 1, 1, tzinfo=timezone.utc),
+        include_archived=True,
+    )
+    assert fetcher.get_total_entry_count() == 6
+    assert get_titles(fetcher.get_fully_fetched_edit_entries()) == [
+        ("b1_v2", "b1_v1"),
+        ("b1_v1", None),
+        ("b2_v1", None),
+    ]
+
+    fetcher = ConsecutiveVersionsFetcher(
+        page_size=10,
+        page_num=1,
+        models=[Book],
+        start_date=datetime(2020, 1, 1, tzinfo=timezone.utc),
+        include_archived=True,
+        exclude_create=True,
+    )
+    # the versions left in the database link back to the archive
+    assert get_titles(fetcher.get_fully_fetched_edit_entries()) == [
+        ("b1_v4", "b1_v3"),
+        ("b1_v3", "b1_v2"),
+        ("b2_v2", "b2_v1"),
+        ("b1_v2", "b1_v1"),
+    ]
+
+    fetcher = SingleRecordConsecutiveVersionsFetcher(
+        page_size=10, page_num=1, model=Book, primary_key=book2.pk
+    )
+    fetcher.start_date = datetime(2020, 1, 1, tzinfo=timezone.utc)
+    fetcher.include_archived = True
+    assert get_titles(fetcher.get_fully_fetched_edit_entries()) == [
+        ("b2_v2", "b2_v1"),
+        ("b2_v1", None),
+    ]
+
+
+def test_changelog_only_reads_archived_months_from_its_start_date(archived_books):
+    archive_dir, _book1, _book2 = archived_books
+
+    fetcher = ConsecutiveVersionsFetcher(
+        page_size=10, page_num=1, models=[Book], include_archived=True
+    )
+    with pytest.raises(Exception, match="without a start_date"):
+        fetcher.get_total_entry_count()
+
+    # the index tells which files overlap the dates, older ones are never opened
+    (archive_dir / "django_sample.bookversion" / "2020-01.jsonl.gz").unlink()
+    fetcher = ConsecutiveVersionsFetcher(
+        page_size=10,
+        page_num=1,
+        models=[Book],
+        start_date=datetime(2020, 2, 1, tzinfo=timezone.utc),
+        include_archived=True,
+    )
+    assert fetcher.get_total_entry_count() == 4
+
+
+def test_changelog_without_archive_is_unchanged(archived_books):
+    fetcher = ConsecutiveVersionsFetcher(page_size=10, page_num=1, models=[Book])
+    assert fetcher.get_total_entry_count() == 3
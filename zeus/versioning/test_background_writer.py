@@ -0,0 +1,144 @@
+from django.db import models, transaction
+
+import pytest
+
+from django_sample.models import AuthorVersion
+from zeus.django.query_counting import assert_max_queries
+from zeus.versioning import background
+from zeus.versioning.background import BackgroundVersionWriter
+from zeus.versioning.core import VersionModel
+
+
+@pytest.fixture(scope="module")
+def backgrounded(register_model):
+    module = "django_sample.models"
+
+    class BackgroundGroup(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class BackgroundLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+        groups = models.ManyToManyField(BackgroundGroup)
+
+    class BackgroundVersion(VersionModel):
+        __module__ = module
+        live_model = BackgroundLiveModel
+        write_versions_in_background = True
+        number_versions = True
+
+    register_model(BackgroundGroup)
+    register_model(BackgroundLiveModel)
+    register_model(BackgroundVersion)
+
+    class NameSpace:
+        Group = BackgroundGroup
+        LiveModel = BackgroundLiveModel
+        VersionModel = BackgroundVersion
+
+    return NameSpace
+
+
+@pytest.fixture
+def writer(monkeypatch):
+    # not started: tables registered in the test transaction aren't visible to other threads
+    writer = BackgroundVersionWriter()
+    monkeypatch.setattr(background, "_version_writer", writer)
+    return writer
+
+
+def test_versions_are_queued_on_commit(backgrounded, writer, capture_on_commit_callbacks):
+    with capture_on_commit_callbacks() as callbacks:
+        # only the live insert, and the m2m read that builds the version
+        with assert_max_queries(2):
+            obj = backgrounded.LiveModel.objects.create(name="v1")
+        obj.name = "v2"
+        obj.save()
+
+    assert writer.queue.empty()
+    for callback in callbacks:
+        callback()
+    assert writer.queue.qsize() == 2
+    assert obj.versions.count() == 0
+
+    # both versions go in with a single bulk_create
+    with assert_max_queries(5):
+        writer.drain()
+    versions = list(obj.versions.order_by("version_number"))
+    assert [(v.name, v.version_number) for v in versions] == [("v1", 1), ("v2", 2)]
+
+
+def test_rolled_back_writes_are_not_queued(
+    backgrounded, writer, capture_on_commit_callbacks
+):
+    with capture_on_commit_callbacks(execute=True):
+        try:
+            with transaction.atomic():
+                backgrounded.LiveModel.objects.create(name="rolled back")
+                raise ValueError()
+        except ValueError:
+            pass
+
+    assert writer.queue.empty()
+
+
+def test_m2m_changes_are_queued(backgrounded, writer, capture_on_commit_callbacks):
+    group = backgrounded.Group.objects.create(name="group")
+    with capture_on_commit_callbacks(execute=True):
+        obj = backgrounded.LiveModel.objects.create(name="v1")
+        obj.groups.add(group)
+
+    writer.drain()
+    assert list(obj.versions.order_by("id").values_list("groups", flat=True)) == [
+        [],
+        [group.pk],
+    ]
+
+
+def test_failed_batches_are_retried_one_version_at_a_time(backgrounded, writer):
+    obj = backgrounded.LiveModel.objects.create(name="v1")
+    other = backgrounded.LiveModel.objects.create(name="v1")
+    versions = backgrounded.VersionModel.bulk_build_from_originals([obj, other])
+    versions[1].name = "too long for the column"
+
+    writer.put(backgrounded.VersionModel, versions, "default", "on_commit")
+    writer.drain()
+
+    assert obj.versions.count() == 1
+    assert other.versions.count() == 0
+
+
+def test_best_effort_drops_versions_when_the_queue_is_full(backgrounded):
+    writer = BackgroundVersionWriter(max_queue_size=1)
+    obj = backgrounded.LiveModel.objects.create(name="v1")
+    versions = backgrounded.VersionModel.bulk_build_from_originals([obj])
+
+    writer.put(backgrounded.VersionModel, versions, "default", "best_effort")
+    writer.put(backgrounded.VersionModel, versions, "default", "best_effort")
+    assert writer.queue.qsize() == 1
+    assert writer.dropped_version_writes == 1
+
+
+def test_worker_thread_batches_and_drains_on_shutdown(monkeypatch):
+    written_batches = []
+
+    class RecordingWriter(BackgroundVersionWriter):
+        def write_batch(self, items):
+            written_batches.append([versions for _cls, versions, _using, _mode in items])
+
+    monkeypatch.setattr(background, "BackgroundVersionWriter", RecordingWriter)
+    monkeypatch.setattr(background, "_version_writer", None)
+    writer = background.get_version_writer()
+    assert writer.is_running()
+
+    # best effort versions wait to be batched together
+    writer.put(AuthorVersion, ["v1"], "default", "best_effort")
+    writer.put(AuthorVersion, ["v2"], "default", "best_effort")
+    writer.drain()
+    assert written_batches == [[["v1"], ["v2"]]]
+
+    writer.put(AuthorVersion, ["v3"], "default", "on_commit")
+    background.shutdown_version_writer()
+    assert not writer.is_running()
+    assert written_batches[-1] == [["v3"]]
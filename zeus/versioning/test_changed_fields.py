@@ -0,0 +1,127 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import models
+from django.utils import timezone
+
+import pytest
+
+from zeus.changelog.consecutive_versions_fetcher import ConsecutiveVersionsFetcher
+from zeus.versioning.compaction import compact_records
+from zeus.versioning.core import VersionModel
+
+
+@pytest.fixture(scope="module")
+def tracked(register_model):
+    module = "django_sample.models"
+
+    class TrackedTag(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class TrackedLiveModel(models.Model):
+        __module__ = module
+        title = models.CharField(max_length=20)
+        body = models.TextField(default="")
+        tags = models.ManyToManyField(TrackedTag)
+
+    class TrackedVersion(VersionModel):
+        __module__ = module
+        live_model = TrackedLiveModel
+        track_changed_fields = True
+        business_date = models.DateTimeField(default=timezone.now)
+
+    register_model(TrackedTag)
+    register_model(TrackedLiveModel)
+    register_model(TrackedVersion)
+
+    class NameSpace:
+        LiveModel = TrackedLiveModel
+        VersionModel = TrackedVersion
+        tags = [TrackedTag.objects.create(name=f"tag{i}") for i in range(2)]
+
+    return NameSpace
+
+
+def new_version(obj, **attrs):
+    obj.reset_version_attrs()
+    for attr, value in attrs.items():
+        setattr(obj, attr, value)
+    obj.save()
+
+
+def get_changed_fields(obj):
+    return list(obj.versions.order_by("id").values_list("changed_fields", flat=True))
+
+
+def test_versions_record_their_changed_fields(tracked):
+    t0, t1 = tracked.tags
+    obj = tracked.LiveModel.objects.create(title="a")
+    obj.tags.add(t0)
+    new_version(obj, title="b")
+    new_version(obj, body="text")
+    obj.tags.add(t1)
+    new_version(obj, title="b")
+
+    assert get_changed_fields(obj) == [
+        ["title", "body", "tags"],
+        ["title"],
+        ["body", "tags"],
+        [],
+    ]
+
+
+def test_versions_of_a_batch_build_upon_each_other(tracked):
+    obj = tracked.LiveModel.objects.create(title="a")
+    first = tracked.LiveModel.objects.get(pk=obj.pk)
+    first.title = "b"
+    second = tracked.LiveModel.objects.get(pk=obj.pk)
+    second.title = "b"
+    second.body = "text"
+
+    tracked.VersionModel.bulk_create_from_originals([first, second])
+
+    assert get_changed_fields(obj)[1:] == [["title"], ["body"]]
+
+
+def test_fetcher_filters_on_changed_fields(tracked):
+    obj = tracked.LiveModel.objects.create(title="a")
+    new_version(obj, title="b")
+    new_version(obj, body="text")
+
+    fetcher = ConsecutiveVersionsFetcher(
+        page_size=10,
+        page_num=1,
+        models=[tracked.LiveModel],
+        fields_by_model={tracked.LiveModel: ["body"]},
+    )
+    entries = [
+        e
+        for e in fetcher.get_fully_fetched_edit_entries()
+        if e["version"].eternal_id == obj.pk
+    ]
+    assert [e["version"].body for e in entries] == ["text"]
+    assert "changed_fields" in str(
+        fetcher._get_values_qs_for_single_model(tracked.LiveModel).query
+    )
+
+
+def test_compaction_and_backfill_rebuild_changed_fields(tracked):
+    obj = tracked.LiveModel.objects.create(title="a")
+    new_version(obj, title="b")
+    new_version(obj, title="b")
+    new_version(obj, body="text")
+    tracked.VersionModel.objects.filter(eternal_id=obj.pk).update(changed_fields=None)
+
+    call_command(
+        "record_changed_fields", "django_sample.TrackedVersion", stdout=StringIO()
+    )
+    assert get_changed_fields(obj) == [
+        ["title", "body", "tags"],
+        ["title"],
+        [],
+        ["body"],
+    ]
+
+    compact_records(tracked.VersionModel, [obj.pk])
+    assert get_changed_fields(obj) == [["title", "body", "tags"], ["title"], ["body"]]
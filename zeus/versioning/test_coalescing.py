@@ -0,0 +1,119 @@
+from django.db import models, transaction
+
+import pytest
+
+from zeus.django.query_counting import assert_max_queries
+from zeus.versioning.core import VersionModel
+
+
+@pytest.fixture(scope="module")
+def coalescing(register_model):
+    module = "django_sample.models"
+
+    class CoalescedGroup(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class CoalescedLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+        groups = models.ManyToManyField(CoalescedGroup)
+
+    class CoalescedVersion(VersionModel):
+        __module__ = module
+        live_model = CoalescedLiveModel
+        coalesce_versions_in_transaction = True
+
+    register_model(CoalescedGroup)
+    register_model(CoalescedLiveModel)
+    register_model(CoalescedVersion)
+
+    class NameSpace:
+        Group = CoalescedGroup
+        LiveModel = CoalescedLiveModel
+        VersionModel = CoalescedVersion
+        group1 = CoalescedGroup.objects.create(name="group1")
+        group2 = CoalescedGroup.objects.create(name="group2")
+
+    return NameSpace
+
+
+def test_saves_and_m2m_changes_write_one_version_on_commit(
+    coalescing, capture_on_commit_callbacks
+):
+    with capture_on_commit_callbacks() as callbacks:
+        with transaction.atomic():
+            obj = coalescing.LiveModel.objects.create(name="v1")
+            obj.groups.add(coalescing.group1)
+            obj.name = "v2"
+            obj.save()
+            obj.groups.add(coalescing.group2)
+
+            # nothing is written until commit
+            assert obj.versions.count() == 0
+
+    assert len(callbacks) == 1
+
+    # 1 live select, 1 m2m select, 1 version insert (+ savepoint queries)
+    with assert_max_queries(5):
+        callbacks[0]()
+
+    assert obj.versions.count() == 1
+    version = obj.versions.get()
+    assert version.name == "v2"
+    assert version.groups == [coalescing.group1.pk, coalescing.group2.pk]
+
+
+def test_many_records_are_flushed_in_bulk(coalescing, capture_on_commit_callbacks):
+    with capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            objs = [coalescing.LiveModel.objects.create(name=f"obj{i}") for i in range(5)]
+            for obj in objs:
+                obj.name = obj.name + "_edited"
+                obj.save()
+
+    for obj in objs:
+        assert obj.versions.count() == 1
+        assert obj.versions.get().name == obj.name
+
+
+def test_rolled_back_savepoint_is_discarded(coalescing, capture_on_commit_callbacks):
+    with capture_on_commit_callbacks(execute=True):
+        try:
+            with transaction.atomic():
+                doomed = coalescing.LiveModel.objects.create(name="doomed")
+                raise ValueError()
+        except ValueError:
+            pass
+
+        with transaction.atomic():
+            survivor = coalescing.LiveModel.objects.create(name="survivor")
+
+    assert not coalescing.VersionModel.objects.filter(eternal_id=doomed.pk).exists()
+    assert survivor.versions.count() == 1
+
+
+def test_records_only_touched_in_a_rolled_back_savepoint_get_no_version(
+    coalescing, capture_on_commit_callbacks
+):
+    with capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            kept = coalescing.LiveModel.objects.create(name="kept")
+            untouched = coalescing.LiveModel.objects.create(name="untouched")
+
+    with capture_on_commit_callbacks(execute=True):
+        with transaction.atomic():
+            kept.name = "kept_edited"
+            kept.save()
+            try:
+                with transaction.atomic():
+                    untouched.name = "rolled back"
+                    untouched.save()
+                    kept.groups.add(coalescing.group1)
+                    raise ValueError()
+            except ValueError:
+                pass
+
+    assert [v.name for v in kept.versions.order_by("id")] == ["kept", "kept_edited"]
+    assert kept.versions.last().groups == []
+    assert untouched.versions.count() == 1
@@ -0,0 +1,148 @@
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import models
+from django.utils import timezone
+
+import pytest
+
+from zeus.versioning.compaction import compact_records
+from zeus.versioning.core import VersionModel
+
+
+@pytest.fixture(scope="module")
+def compacting(register_model):
+    module = "django_sample.models"
+
+    class CompactingLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class CompactingVersion(VersionModel):
+        __module__ = module
+        live_model = CompactingLiveModel
+        number_versions = True
+        track_validity = True
+
+    class CompactingDeltaLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+        body = models.TextField(default="")
+
+    class CompactingDeltaVersion(VersionModel):
+        __module__ = module
+        live_model = CompactingDeltaLiveModel
+        delta_snapshot_interval = 2
+
+    register_model(CompactingLiveModel)
+    register_model(CompactingVersion)
+    register_model(CompactingDeltaLiveModel)
+    register_model(CompactingDeltaVersion)
+
+    class NameSpace:
+        LiveModel = CompactingLiveModel
+        VersionModel = CompactingVersion
+        DeltaLiveModel = CompactingDeltaLiveModel
+        DeltaVersionModel = CompactingDeltaVersion
+
+    return NameSpace
+
+
+def create_with_names(live_model, *names):
+    obj = live_model.objects.create(name=names[0])
+    for name in names[1:]:
+        obj.reset_version_attrs()
+        obj.name = name
+        obj.save()
+    return obj
+
+
+def get_names(obj):
+    return list(obj.versions.order_by("id").values_list("name", flat=True))
+
+
+def test_identical_consecutive_versions_are_squashed(compacting):
+    obj = create_with_names(compacting.LiveModel, "a", "a", "b", "b", "b", "a")
+    version_cls = compacting.VersionModel
+
+    assert compact_records(version_cls, [obj.pk], dry_run=True) == 3
+    assert len(get_names(obj)) == 6
+
+    assert compact_records(version_cls, [obj.pk]) == 3
+    assert get_names(obj) == ["a", "b", "a"]
+
+    versions = list(obj.versions.order_by("id"))
+    assert [v.version_number for v in versions] == [1, 2, 3]
+    assert [v.previous_version_id for v in versions] == [
+        None,
+        versions[0].pk,
+        versions[1].pk,
+    ]
+    assert [v.is_current for v in versions] == [False, False, True]
+    assert versions[0].valid_to == versions[1].system_date
+
+    # compacting again is a no-op
+    assert compact_records(version_cls, [obj.pk]) == 0
+
+
+def test_old_days_keep_their_last_version(compacting):
+    obj = create_with_names(compacting.LiveModel, "a", "b", "c", "d", "e")
+    now = timezone.now()
+    old_day = now - timedelta(days=30)
+    dates = [
+        old_day,
+        old_day + timedelta(minutes=1),
+        old_day + timedelta(minutes=2),
+        now,
+        now,
+    ]
+    for ver, date in zip(obj.versions.order_by("id"), dates):
+        compacting.VersionModel.objects.filter(pk=ver.pk).update(system_date=date)
+
+    compact_records(
+        compacting.VersionModel, [obj.pk], daily_before=now - timedelta(days=7)
+    )
+    # recent versions are all kept
+    assert get_names(obj) == ["c", "d", "e"]
+
+
+def test_deltas_are_rebased(compacting):
+    obj = compacting.DeltaLiveModel.objects.create(name="a", body="long body")
+    for name in ["a", "b", "b", "c"]:
+        obj.reset_version_attrs()
+        obj.name = name
+        obj.save()
+
+    version_cls = compacting.DeltaVersionModel
+    assert compact_records(version_cls, [obj.pk]) == 2
+
+    versions = list(obj.versions.order_by("id"))
+    assert [(v.name, v.body) for v in versions] == [
+        ("a", "long body"),
+        ("b", "long body"),
+        ("c", "long body"),
+    ]
+    assert versions[0].delta_base_id is None
+    assert versions[1].delta_fields == ["name"]
+    assert versions[1].delta_base_id == versions[0].pk
+
+
+def test_compact_versions_command(compacting):
+    obj = create_with_names(compacting.LiveModel, "x", "x", "y")
+    other = create_with_names(compacting.LiveModel, "z", "z")
+
+    out = StringIO()
+    call_command(
+        "compact_versions",
+        "django_sample.CompactingVersion",
+        "--batch-size=1",
+        "--dry-run",
+        stdout=out,
+    )
+    assert "versions to delete" in out.getvalue()
+    assert len(get_names(obj)) == 3
+
+    call_command("compact_versions", "django_sample.CompactingVersion", stdout=StringIO())
+    assert get_names(obj) == ["x", "y"]
+    assert get_names(other) == ["z"]
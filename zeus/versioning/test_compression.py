@@ -0,0 +1,83 @@
+from django.db import models
+
+import pytest
+
+from zeus.versioning.core import VersionModel
+from zeus.versioning.fields import CompressedField
+
+
+@pytest.fixture(scope="module")
+def compressed(register_model):
+    module = "django_sample.models"
+
+    class CompressedLiveModel(models.Model):
+        __module__ = module
+        title = models.CharField(max_length=20)
+        body = models.TextField(blank=True)
+        payload = models.JSONField(null=True)
+
+    class CompressedVersion(VersionModel):
+        __module__ = module
+        live_model = CompressedLiveModel
+        compressed_fields = ["body", "payload"]
+        compression = "lzma"
+        compression_threshold = 100
+
+    register_model(CompressedLiveModel)
+    register_model(CompressedVersion)
+
+    class NameSpace:
+        LiveModel = CompressedLiveModel
+        VersionModel = CompressedVersion
+
+    return NameSpace
+
+
+def test_large_values_are_stored_compressed(compressed):
+    big_body = "lorem ipsum " * 1000
+    obj = compressed.LiveModel.objects.create(
+        title="a", body=big_body, payload={"items": list(range(100))}
+    )
+
+    stored_body, stored_payload = compressed.VersionModel.objects.filter(
+        eternal=obj
+    ).values_list("body", "payload")[0]
+    assert bytes(stored_body)[:1] == b"x"
+    assert len(stored_body) < len(big_body) / 10
+    assert bytes(stored_payload)[:1] == b"x"
+
+    version = obj.versions.get()
+    # nothing is decompressed until accessed
+    assert isinstance(version.__dict__["body"], (bytes, memoryview))
+    assert version.body == big_body
+    assert version.payload == {"items": list(range(100))}
+    assert version.recreate_original().body == big_body
+
+
+def test_small_values_are_stored_as_is(compressed):
+    obj = compressed.LiveModel.objects.create(title="a", body="short", payload=None)
+
+    stored_body, stored_payload = compressed.VersionModel.objects.filter(
+        eternal=obj
+    ).values_list("body", "payload")[0]
+    assert bytes(stored_body) == b"\x00short"
+    assert stored_payload is None
+
+    version = obj.versions.get()
+    # saving without accessing the value writes the same bytes back
+    version.save()
+    version = obj.versions.get()
+    assert version.body == "short"
+    assert version.payload is None
+
+
+def test_compressed_field_round_trips_through_migrations():
+    field = CompressedField(value_type="json", algorithm="lzma", threshold=10, null=True)
+    _name, _path, args, kwargs = field.deconstruct()
+    clone = CompressedField(*args, **kwargs)
+    assert (clone.value_type, clone.algorithm, clone.threshold, clone.null) == (
+        "json",
+        "lzma",
+        10,
+        True,
+    )
@@ -0,0 +1,135 @@
+from django.db import models
+from django.utils import timezone
+
+import pytest
+
+from zeus.changelog.consecutive_versions_fetcher import ConsecutiveVersionsFetcher
+from zeus.django.query_counting import assert_max_queries
+from zeus.versioning.core import VersioningConfigException, VersionModel
+
+
+@pytest.fixture(scope="module")
+def dedup(register_model):
+    module = "django_sample.models"
+
+    class DedupLiveModel(models.Model):
+        __module__ = module
+        title = models.CharField(max_length=20)
+        body = models.TextField()
+        payload = models.JSONField(null=True)
+
+    class DedupVersion(VersionModel):
+        __module__ = module
+        live_model = DedupLiveModel
+        deduplicated_fields = ["body", "payload"]
+        business_date = models.DateTimeField(default=timezone.now)
+
+    register_model(DedupLiveModel)
+    register_model(DedupVersion)
+    register_model(DedupVersion.blob_model)
+
+    class NameSpace:
+        LiveModel = DedupLiveModel
+        VersionModel = DedupVersion
+
+    return NameSpace
+
+
+def create_with_titles(live_model, titles, **attrs):
+    obj = live_model.objects.create(title=titles[0], **attrs)
+    for title in titles[1:]:
+        obj.reset_version_attrs()
+        obj.title = title
+        obj.save()
+    return obj
+
+
+def test_large_values_are_stored_once(dedup):
+    big_body = "lorem ipsum " * 1000
+    objs = [
+        create_with_titles(
+            dedup.LiveModel, ["a", "b", "c"], body=big_body, payload={"x": [1, 2]}
+        )
+        for _ in range(3)
+    ]
+
+    assert dedup.VersionModel.objects.filter(eternal__in=objs).count() == 9
+    # one blob for the body, one for the payload
+    assert dedup.VersionModel.blob_model.objects.count() == 2
+
+    # 1 for the versions, 1 for their values
+    with assert_max_queries(2):
+        versions = list(dedup.VersionModel.objects.filter(eternal__in=objs))
+        assert {(v.body, v.payload["x"][1]) for v in versions} == {(big_body, 2)}
+
+
+def test_values_load_on_access_outside_history_querysets(dedup):
+    obj = create_with_titles(dedup.LiveModel, ["a"], body="some body", payload=None)
+
+    version = dedup.VersionModel._base_manager.get(eternal=obj)
+    assert version.payload_digest is None
+    assert version.payload is None
+    assert version.body == "some body"
+    assert version.recreate_original().body == "some body"
+
+
+def test_changelog_field_filter_compares_digests(dedup):
+    obj = dedup.LiveModel.objects.create(title="a", body="b1")
+    obj.reset_version_attrs()
+    obj.title = "b"
+    obj.save()
+    obj.reset_version_attrs()
+    obj.body = "b2"
+    obj.save()
+
+    fetcher = ConsecutiveVersionsFetcher(
+        page_size=10,
+        page_num=1,
+        models=[dedup.LiveModel],
+        fields_by_model={dedup.LiveModel: ["body"]},
+    )
+    entries = fetcher.get_fully_fetched_edit_entries()
+    assert [(e["version"].body, e["previous_version"].body) for e in entries] == [
+        ("b2", "b1")
+    ]
+
+
+def test_deduplication_and_deltas_are_exclusive():
+    module = "django_sample.models"
+
+    class ExclusiveLiveModel(models.Model):
+        __module__ = module
+        body = models.TextField()
+
+    with pytest.raises(VersioningConfigException):
+
+        class ExclusiveVersion(VersionModel):
+            __module__ = module
+            live_model = ExclusiveLiveModel
+            deduplicated_fields = ["body"]
+            delta_snapshot_interval = 10
+
+
+def test_only_text_and_json_fields_can_be_deduplicated():
+    module = "django_sample.models"
+
+    class DatedLiveModel(models.Model):
+        __module__ = module
+        published = models.DateTimeField()
+
+    with pytest.raises(VersioningConfigException):
+
+        class DatedVersion(VersionModel):
+            __module__ = module
+            live_model = DatedLiveModel
+            deduplicated_fields = ["published"]
+
+
+def test_saving_the_same_instance_again_stores_the_new_value(dedup):
+    obj = dedup.LiveModel.objects.create(title="a", body="first")
+    obj.body = "second"
+    obj.save()
+
+    [version] = dedup.VersionModel.objects.filter(eternal=obj)
+    assert version.body == "second"
+    assert dedup.VersionModel.blob_model.objects.filter(value="second").exists()
@@ -0,0 +1,115 @@
+from django.db import connection, models
+from django.utils import timezone
+
+import pytest
+
+from zeus.changelog.consecutive_versions_fetcher import ConsecutiveVersionsFetcher
+from zeus.changelog.graphql.types.changelog_entry import ChangelogEntry
+from zeus.changelog.graphql.types.diff import DeleteDiff
+from zeus.django.query_counting import assert_max_queries
+from zeus.versioning.core import VersioningConfigException, VersionModel
+from zeus.versioning.deletion import CascadeVersionDeletes
+
+
+@pytest.fixture(scope="module")
+def deleting(register_model):
+    module = "django_sample.models"
+    namespace = {}
+
+    for strategy in ("chunked", "database", "tombstone"):
+        name = strategy.capitalize()
+        live_model = type(
+            f"{name}DeletedLiveModel",
+            (models.Model,),
+            {"__module__": module, "name": models.CharField(max_length=20)},
+        )
+        version_model = type(
+            f"{name}DeletedVersion",
+            (VersionModel,),
+            {
+                "__module__": module,
+                "live_model": live_model,
+                "live_delete_strategy": strategy,
+                "live_delete_chunk_size": 4,
+                "track_validity": True,
+                "business_date": models.DateTimeField(default=timezone.now),
+            },
+        )
+        register_model(live_model)
+        register_model(version_model)
+        namespace[strategy] = (live_model, version_model)
+
+    operation = CascadeVersionDeletes("databasedeletedversion")
+    with connection.schema_editor() as schema_editor:
+        operation.database_forwards("django_sample", schema_editor, None, None)
+
+    return namespace
+
+
+def create_with_versions(live_model, count):
+    obj = live_model.objects.create(name="v0")
+    for i in range(1, count):
+        obj.reset_version_attrs()
+        obj.name = f"v{i}"
+        obj.save()
+    return obj
+
+
+@pytest.mark.parametrize("strategy", ["chunked", "database"])
+def test_versions_are_deleted_without_being_loaded(deleting, strategy):
+    live_model, version_model = deleting[strategy]
+    obj = create_with_versions(live_model, 10)
+    other = create_with_versions(live_model, 2)
+
+    # chunked: 3 chunks of ids and deletes, plus the live row
+    with assert_max_queries(10):
+        obj.delete()
+
+    assert not version_model.objects.filter(eternal_id=obj.pk).exists()
+    assert version_model.objects.filter(eternal_id=other.pk).count() == 2
+
+
+def test_tombstones_keep_history(deleting):
+    live_model, version_model = deleting["tombstone"]
+    obj = create_with_versions(live_model, 3)
+    pk = obj.pk
+    obj.delete()
+
+    versions = list(version_model.objects.filter(eternal_id=pk).order_by("id"))
+    assert [(v.name, v.is_deleted) for v in versions] == [
+        ("v0", False),
+        ("v1", False),
+        ("v2", False),
+        ("v2", True),
+    ]
+    assert [v.is_current for v in versions] == [False, False, False, True]
+
+
+def test_changelog_shows_tombstones_as_deletions(deleting):
+    live_model, version_model = deleting["tombstone"]
+    obj = create_with_versions(live_model, 2)
+    pk = obj.pk
+    obj.delete()
+
+    fetcher = ConsecutiveVersionsFetcher(page_size=10, page_num=1, models=[live_model])
+    entries = [
+        e
+        for e in fetcher.get_fully_fetched_edit_entries()
+        if e["version"].eternal_id == pk
+    ]
+
+    assert [e["eternal"].name for e in entries] == ["v1", "v1", "v1"]
+    [deletion_diff] = ChangelogEntry.resolve_diffs(entries[0], None)
+    assert isinstance(deletion_diff, DeleteDiff)
+
+
+def test_unknown_strategies_are_rejected():
+    with pytest.raises(VersioningConfigException):
+
+        class UnknownDeleteLiveModel(models.Model):
+            __module__ = "django_sample.models"
+
+        class UnknownDeleteVersion(VersionModel):
+            __module__ = "django_sample.models"
+            live_model = UnknownDeleteLiveModel
+            live_delete_strategy = "later"
@@ -0,0 +1,125 @@
+from django.db import models
+from django.utils import timezone
+
+import pytest
+
+from zeus.changelog.consecutive_versions_fetcher import ConsecutiveVersionsFetcher
+from zeus.django.query_counting import assert_max_queries
+from zeus.versioning.core import VersionModel
+
+
+@pytest.fixture(scope="module")
+def deltas(register_model):
+    module = "django_sample.models"
+
+    class DeltaTag(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class DeltaLiveModel(models.Model):
+        __module__ = module
+        title = models.CharField(max_length=20)
+        body = models.TextField()
+        count = models.IntegerField(default=0)
+        tags = models.ManyToManyField(DeltaTag)
+
+    class DeltaVersion(VersionModel):
+        __module__ = module
+        live_model = DeltaLiveModel
+        delta_snapshot_interval = 3
+        business_date = models.DateTimeField(default=timezone.now)
+
+    register_model(DeltaTag)
+    register_model(DeltaLiveModel)
+    register_model(DeltaVersion)
+
+    class NameSpace:
+        LiveModel = DeltaLiveModel
+        VersionModel = DeltaVersion
+        tag = DeltaTag.objects.create(name="tag")
+
+    return NameSpace
+
+
+def create_with_edits(live_model, *edits):
+    obj = live_model.objects.create(title="t1", body="b1")
+    for edit in edits:
+        obj.reset_version_attrs()
+        for attr, value in edit.items():
+            setattr(obj, attr, value)
+        obj.save()
+    return obj
+
+
+EDITS = [{"title": "t2"}, {"body": "b2"}, {"count": 3}, {"title": "t3"}]
+
+EXPECTED_STATES = [
+    ("t1", "b1", 0),
+    ("t2", "b1", 0),
+    ("t2", "b2", 0),
+    ("t2", "b2", 3),
+    ("t3", "b2", 3),
+]
+
+
+def test_only_changed_fields_are_stored(deltas):
+    obj = create_with_edits(deltas.LiveModel, *EDITS)
+
+    stored = list(
+        deltas.VersionModel._base_manager.filter(eternal=obj)
+        .order_by("id")
+        .values_list("title", "body", "count", "delta_depth")
+    )
+    assert stored == [
+        ("t1", "b1", 0, 0),
+        ("t2", None, None, 1),
+        (None, "b2", None, 2),
+        # full snapshot every 3 versions
+        ("t2", "b2", 3, 0),
+        ("t3", None, None, 1),
+    ]
+
+
+def test_versions_are_rebuilt_in_bulk(deltas):
+    objs = [create_with_edits(deltas.LiveModel, *EDITS) for _ in range(3)]
+
+    # 1 for the versions, 1 for the rows their deltas build upon
+    with assert_max_queries(2):
+        versions = list(
+            deltas.VersionModel.objects.filter(eternal__in=objs).order_by(
+                "eternal_id", "id"
+            )
+        )
+    assert [(v.title, v.body, v.count) for v in versions] == EXPECTED_STATES * 3
+
+    streamed = deltas.VersionModel.objects.filter(eternal=objs[0]).order_by("id")
+    assert [
+        (o.title, o.body, o.count)
+        for o in streamed.iter_recreated_originals(chunk_size=2)
+    ] == EXPECTED_STATES
+
+
+def test_in_place_updates_extend_delta_fields(deltas):
+    obj = create_with_edits(deltas.LiveModel, {"title": "t2"})
+    # without reset_version_attrs, this applies to the last version
+    obj.body = "b2"
+    obj.save()
+    obj.tags.add(deltas.tag)
+
+    latest = obj.versions.order_by("id").last()
+    assert latest.delta_fields == ["title", "body"]
+    assert (latest.title, latest.body, latest.count) == ("t2", "b2", 0)
+    assert latest.tags == [deltas.tag.pk]
+
+
+def test_changelog_field_filter_uses_delta_fields(deltas):
+    obj = create_with_edits(deltas.LiveModel, *EDITS)
+
+    fetcher = ConsecutiveVersionsFetcher(
+        page_size=10,
+        page_num=1,
+        models=[deltas.LiveModel],
+        fields_by_model={deltas.LiveModel: ["body"]},
+    )
+    entries = fetcher.get_fully_fetched_edit_entries()
+    assert [(e["eternal"], e["version"].body) for e in entries] == [(obj, "b2")]
@@ -1,9 +1,30 @@
 from django.contrib.auth.models import User
+from django.db import models
+from django.db.models.signals import pre_save
 from django.urls import reverse
 
 import pytest
+from asgiref.sync import async_to_sync, sync_to_async
 
-from django_sample.models import Author, Book
+from django_sample.models import Author, Book, CustomVersionModel
+from zeus.versioning.middleware import acting_as
+
+
+@pytest.fixture(scope="module")
+def late_models(register_model):
+    module = "django_sample.models"
+
+    class LateLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class LateVersion(CustomVersionModel):
+        __module__ = module
+        live_model = LateLiveModel
+
+    register_model(LateLiveModel)
+    register_model(LateVersion)
+    return LateLiveModel, LateVersion
 
 
 def test_edit_book_has_edited_by_prop(client):
@@ -19,3 +40,68 @@ def test_edit_book_has_edited_by_prop(client):
     assert a_book.versions.count() == 2
     assert a_book.versions.first().edited_by is None
     assert a_book.versions.last().edited_by == user
+
+
+def test_requests_dont_touch_signal_receivers(client):
+    user = User.objects.create(username="abc")
+    client.force_login(user)
+    author = Author.objects.create(first_name="john")
+    a_book = Book.objects.create(author=author, title="name1")
+
+    url = reverse("edit-book", args=[a_book.pk])
+    client.post(url, data={"title": "name2"})
+    receivers_before = list(pre_save.receivers)
+    client.post(url, data={"title": "name3"})
+
+    assert pre_save.receivers == receivers_before
+    assert a_book.versions.last().edited_by == user
+
+
+def test_acting_as_is_scoped():
+    user = User.objects.create(username="abc")
+    author = Author.objects.create(first_name="john")
+
+    with acting_as(user):
+        a_book = Book.objects.create(author=author, title="name1")
+    a_book.reset_version_attrs()
+    a_book.title = "name2"
+    a_book.save()
+
+    assert [v.edited_by for v in a_book.versions.order_by("id")] == [user, None]
+
+
+def test_async_middleware_sets_edited_by(async_client):
+    user = User.objects.create(username="abc")
+    async_client.force_login(user)
+    author = Author.objects.create(first_name="john")
+    a_book = Book.objects.create(author=author, title="name1")
+
+    url = reverse("edit-book", args=[a_book.pk])
+    async_to_sync(async_client.post)(
+        url, data="title=name2", content_type="application/x-www-form-urlencoded"
+    )
+
+    assert a_book.versions.count() == 2
+    assert a_book.versions.last().edited_by == user
+
+
+def test_acting_as_survives_sync_to_async():
+    user = User.objects.create(username="abc")
+    author = Author.objects.create(first_name="john")
+
+    async def create_book():
+        with acting_as(user):
+            return await sync_to_async(Book.objects.create)(author=author, title="name1")
+
+    a_book = async_to_sync(create_book)()
+    assert a_book.versions.get().edited_by == user
+
+
+def test_models_defined_after_startup_get_edited_by(late_models):
+    LateLiveModel, _LateVersion = late_models
+    user = User.objects.create(username="abc")
+
+    with acting_as(user):
+        instance = LateLiveModel.objects.create(name="name1")
+
+    assert instance.versions.get().edited_by == user
@@ -0,0 +1,111 @@
+from datetime import timedelta
+
+from django.utils import timezone
+
+import pytest
+
+from django_sample.models import Author, Book, BookVersion
+
+
+@pytest.fixture
+def dated_books():
+    now = timezone.now()
+    author = Author.objects.create(first_name="john", last_name="smith")
+
+    def create_book_with_daily_titles(*titles):
+        # one version per title, the last one being a day old
+        book = Book.objects.create(author=author, title=titles[0])
+        for index, title in enumerate(titles):
+            if index:
+                book.reset_version_attrs()
+                book.title = title
+                book.save()
+
+            book.versions.filter(title=title).update(
+                business_date=now - timedelta(days=len(titles) - index)
+            )
+
+        return book
+
+    book1 = create_book_with_daily_titles("b1_v1", "b1_v2", "b1_v3")
+    book2 = create_book_with_daily_titles("b2_v1", "b2_v2")
+
+    return now, book1, book2
+
+
+def test_as_of(dated_books):
+    now, book1, book2 = dated_books
+
+    # book1's versions are 3, 2 and 1 days old, book2's are 2 and 1 days old
+    titles_at = lambda date: sorted(
+        BookVersion.objects.as_of(date).values_list("title", flat=True)
+    )
+
+    assert titles_at(now - timedelta(days=4)) == []
+    assert titles_at(now - timedelta(days=3)) == ["b1_v1"]
+    assert titles_at(now - timedelta(hours=36)) == ["b1_v2", "b2_v1"]
+    assert titles_at(now) == ["b1_v3", "b2_v2"]
+
+    # as_of composes with other filters
+    assert list(
+        BookVersion.objects.filter(eternal=book2)
+        .as_of(now)
+        .values_list("title", flat=True)
+    ) == ["b2_v2"]
+
+
+def test_iter_recreated_originals(dated_books):
+    now, book1, book2 = dated_books
+
+    originals = list(
+        BookVersion.objects.as_of(now - timedelta(hours=36))
+        .order_by("eternal_id")
+        .iter_recreated_originals(chunk_size=1)
+    )
+    assert [(o.pk, o.title) for o in originals] == [
+        (book1.pk, "b1_v2"),
+        (book2.pk, "b2_v1"),
+    ]
+    assert all(isinstance(o, Book) for o in originals)
+
+
+@pytest.mark.parametrize("use_window_functions", [False, True])
+def test_previous_and_most_recent_version_ids(dated_books, use_window_functions):
+    now, book1, book2 = dated_books
+    b1_v1, b1_v2, b1_v3 = book1.versions.order_by("business_date")
+    b2_v1, b2_v2 = book2.versions.order_by("business_date")
+
+    qs = BookVersion.objects.with_window_functions(use_window_functions)
+    previous_ids = dict(
+        qs.with_previous_version_id().values_list("id", "previous_version_id")
+    )
+    assert previous_ids == {
+        b1_v1.id: None,
+        b1_v2.id: b1_v1.id,
+        b1_v3.id: b1_v2.id,
+        b2_v1.id: None,
+        b2_v2.id: b2_v1.id,
+    }
+
+    # filtering doesn't change which version is considered previous
+    filtered = qs.filter(title__in=["b1_v3", "b2_v1"]).with_previous_version_id()
+    assert dict(filtered.values_list("id", "previous_version_id")) == {
+        b1_v3.id: b1_v2.id,
+        b2_v1.id: None,
+    }
+    assert list(
+        filtered.filter(previous_version_id__isnull=True).values_list("id", flat=True)
+    ) == [b2_v1.id]
+
+    assert set(qs.only_most_recent_versions().values_list("id", flat=True)) == {
+        b1_v3.id,
+        b2_v2.id,
+    }
+    assert (
+        list(
+            qs.filter(eternal=book1)
+            .with_most_recent_version_id()
+            .values_list("most_recent_version_id", flat=True)
+        )
+        == [b1_v3.id] * 3
+    )
@@ -0,0 +1,94 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import models
+
+import pytest
+
+from zeus.django.query_counting import QueryCounter
+from zeus.versioning.core import VersionModel
+
+
+@pytest.fixture(scope="module")
+def unversioned(register_model):
+    module = "django_sample.models"
+
+    class BackfillTag(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class BackfillLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+        tags = models.ManyToManyField(BackfillTag)
+
+    class BackfillVersion(VersionModel):
+        __module__ = module
+        live_model = BackfillLiveModel
+        number_versions = True
+
+    register_model(BackfillTag)
+    register_model(BackfillLiveModel)
+    register_model(BackfillVersion)
+
+    class NameSpace:
+        LiveModel = BackfillLiveModel
+        VersionModel = BackfillVersion
+        tags = [BackfillTag.objects.create(name=f"tag{i}") for i in range(2)]
+
+    return NameSpace
+
+
+def create_unversioned_rows(unversioned, count):
+    # bulk_create and through rows send no signals, like rows from before versioning
+    rows = unversioned.LiveModel._base_manager.bulk_create(
+        [unversioned.LiveModel(name=f"row{i}") for i in range(count)]
+    )
+    through = unversioned.LiveModel.tags.through
+    through._base_manager.bulk_create(
+        [
+            through(backfilllivemodel_id=row.pk, backfilltag_id=tag.pk)
+            for row in rows
+            for tag in unversioned.tags
+        ]
+    )
+    return rows
+
+
+def backfill(*args):
+    stdout = StringIO()
+    call_command(
+        "backfill_initial_versions", "django_sample.BackfillVersion", *args, stdout=stdout
+    )
+    return stdout.getvalue()
+
+
+def test_backfill_writes_one_version_per_row(unversioned):
+    rows = create_unversioned_rows(unversioned, 5)
+    versioned = unversioned.LiveModel.objects.create(name="versioned")
+
+    counter = QueryCounter()
+    with counter:
+        output = backfill("--batch-size=2")
+
+    # per batch: live rows, m2m ids, version number lock and lookup, insert
+    queries = [q for q in counter.query_collector.queries if "SAVEPOINT" not in q["sql"]]
+    assert len(queries) == 3 * 5 + 1
+    assert "5 versions created" in output
+    for row in rows:
+        [version] = row.versions.all()
+        assert version.name == row.name
+        assert version.tags == sorted(t.pk for t in unversioned.tags)
+        assert version.version_number == 1
+    assert versioned.versions.count() == 1
+
+
+def test_backfill_resumes_after_a_pk(unversioned):
+    first, *rest = create_unversioned_rows(unversioned, 3)
+
+    backfill(f"--start-after={first.pk}")
+    assert not first.versions.exists()
+    assert all(row.versions.count() == 1 for row in rest)
+
+    assert "done, 1 versions created" in backfill()
+    assert first.versions.count() == 1
@@ -0,0 +1,83 @@
+import logging
+
+from django.contrib.auth.models import User
+from django.urls import reverse
+
+import pytest
+
+from django_sample.models import Author, Book, Tag
+from zeus.versioning.instrumentation import (
+    LoggingStatsSink,
+    MemoryStatsSink,
+    collect_version_stats,
+    set_stats_sink,
+)
+
+
+@pytest.fixture
+def memory_sink():
+    sink = MemoryStatsSink()
+    previous = set_stats_sink(sink)
+    yield sink
+    set_stats_sink(previous)
+
+
+def test_collects_version_writes_per_model(memory_sink):
+    author = Author.objects.create(first_name="john")
+    tag = Tag.objects.create(name="tag")
+
+    with collect_version_stats("edits") as report:
+        book = Book.objects.create(author=author, title="name1")
+        book.title = "name2"
+        book.save()
+        book.tags.add(tag)
+
+    stats = report.by_model["django_sample.BookVersion"]
+    assert (stats.created, stats.updated, stats.skipped) == (1, 2, 0)
+    assert stats.queries >= 3
+    assert stats.bytes_written > 0
+    assert stats.seconds > 0
+    assert list(report.by_model) == ["django_sample.BookVersion"]
+    assert memory_sink.reports == [report]
+
+
+def test_writes_outside_a_block_arent_measured(memory_sink):
+    author = Author.objects.create(first_name="john")
+    Book.objects.create(author=author, title="name1")
+
+    with collect_version_stats():
+        pass
+
+    assert memory_sink.reports == []
+
+
+def test_middleware_reports_each_request(client, settings, memory_sink):
+    settings.MIDDLEWARE = settings.MIDDLEWARE + [
+        "zeus.versioning.middleware.VersionStatsMiddleware"
+    ]
+    client.force_login(User.objects.create(username="abc"))
+    author = Author.objects.create(first_name="john")
+    a_book = Book.objects.create(author=author, title="name1")
+    a_book.reset_version_attrs()
+
+    url = reverse("edit-book", args=[a_book.pk])
+    client.post(url, data={"title": "name2"})
+
+    [report] = memory_sink.reports
+    assert report.label == f"POST {url}"
+    assert report.totals().created == 1
+
+
+def test_logging_sink(caplog):
+    author = Author.objects.create(first_name="john")
+    previous = set_stats_sink(LoggingStatsSink())
+    try:
+        with caplog.at_level(logging.INFO, logger="zeus.versioning.instrumentation"):
+            with collect_version_stats("import"):
+                Book.objects.create(author=author, title="name1")
+    finally:
+        set_stats_sink(previous)
+
+    [record] = caplog.records
+    assert record.getMessage().startswith("versioning for import: 1 created")
+    assert record.versioning_stats["totals"]["created"] == 1
@@ -0,0 +1,158 @@
+from datetime import timedelta
+
+from django.db import models
+from django.utils import timezone
+
+import pytest
+
+from zeus.changelog.consecutive_versions_fetcher import ConsecutiveVersionsFetcher
+from zeus.django.query_counting import assert_max_queries
+from zeus.versioning.compaction import compact_records
+from zeus.versioning.core import VersioningConfigException, VersionModel
+
+
+@pytest.fixture(scope="module")
+def events(register_model):
+    module = "django_sample.models"
+
+    class EventTag(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class EventLiveModel(models.Model):
+        __module__ = module
+        title = models.CharField(max_length=20)
+        tags = models.ManyToManyField(EventTag)
+
+    class EventVersion(VersionModel):
+        __module__ = module
+        live_model = EventLiveModel
+        m2m_history = "events"
+        business_date = models.DateTimeField(default=timezone.now)
+
+    register_model(EventTag)
+    register_model(EventLiveModel)
+    register_model(EventVersion)
+    register_model(EventVersion.m2m_event_model)
+
+    class NameSpace:
+        LiveModel = EventLiveModel
+        VersionModel = EventVersion
+        EventModel = EventVersion.m2m_event_model
+        tags = [EventTag.objects.create(name=f"tag{i}") for i in range(4)]
+
+    return NameSpace
+
+
+def new_version(obj, **attrs):
+    obj.reset_version_attrs()
+    for attr, value in attrs.items():
+        setattr(obj, attr, value)
+    obj.save()
+
+
+def test_only_changes_are_stored(events):
+    t0, t1, t2, t3 = events.tags
+    obj = events.LiveModel.objects.create(title="a")
+    obj.tags.set([t0, t1, t2])
+    new_version(obj, title="b")
+    obj.tags.remove(t1)
+    new_version(obj, title="c")
+    obj.tags.add(t3)
+
+    events_by_version = {}
+    for event in events.EventModel.objects.filter(eternal_id=obj.pk):
+        events_by_version.setdefault(event.version_id, set()).add(
+            (event.related_id, event.added)
+        )
+    assert list(events_by_version.values()) == [
+        {(t0.pk, True), (t1.pk, True), (t2.pk, True)},
+        {(t1.pk, False)},
+        {(t3.pk, True)},
+    ]
+
+    # 1 query for the versions, 1 for their events
+    with assert_max_queries(2):
+        versions = list(obj.versions.order_by("id"))
+    assert [(v.title, v.tags) for v in versions] == [
+        ("a", [t0.pk, t1.pk, t2.pk]),
+        ("b", [t0.pk, t2.pk]),
+        ("c", [t0.pk, t2.pk, t3.pk]),
+    ]
+
+    # versions loaded on their own rebuild their ids on access
+    middle = events.VersionModel._base_manager.get(pk=versions[1].pk)
+    assert middle.get_m2m_ids("tags") == [t0.pk, t2.pk]
+
+
+def test_records_related_to_an_object_at_a_date(events):
+    t0, t1, *_ = events.tags
+    before = timezone.now()
+    kept = events.LiveModel.objects.create(title="kept")
+    kept.tags.add(t0)
+    dropped = events.LiveModel.objects.create(title="dropped")
+    dropped.tags.add(t0)
+    during = timezone.now()
+    new_version(dropped, title="dropped2")
+    dropped.tags.remove(t0)
+    after = timezone.now()
+
+    related = lambda date: set(
+        events.VersionModel.objects.eternal_ids_related_as_of("tags", t0.pk, date)
+    )
+    assert related(before).isdisjoint({kept.pk, dropped.pk})
+    assert {kept.pk, dropped.pk} <= related(during)
+    assert kept.pk in related(after) and dropped.pk not in related(after)
+
+
+def test_changelog_filters_on_m2m_events(events):
+    t0, *_ = events.tags
+    obj = events.LiveModel.objects.create(title="a")
+    new_version(obj, title="b")
+    obj.tags.add(t0)
+
+    fetcher = ConsecutiveVersionsFetcher(
+        page_size=10,
+        page_num=1,
+        models=[events.LiveModel],
+        fields_by_model={events.LiveModel: ["tags"]},
+    )
+    entries = [
+        e
+        for e in fetcher.get_fully_fetched_edit_entries()
+        if e["version"].eternal_id == obj.pk
+    ]
+    assert [(e["version"].tags, e["previous_version"].tags) for e in entries] == [
+        ([t0.pk], [])
+    ]
+
+
+def test_compaction_keeps_the_events_of_deleted_versions(events):
+    t0, t1, *_ = events.tags
+    obj = events.LiveModel.objects.create(title="a")
+    obj.tags.add(t0)
+    new_version(obj, title="b")
+    obj.tags.add(t1)
+    new_version(obj, title="c")
+
+    old_day = timezone.now() - timedelta(days=30)
+    events.VersionModel.objects.filter(eternal_id=obj.pk).update(business_date=old_day)
+    compact_records(
+        events.VersionModel, [obj.pk], daily_before=timezone.now() - timedelta(days=1)
+    )
+
+    [version] = obj.versions.all()
+    assert (version.title, version.tags) == ("c", [t0.pk, t1.pk])
+
+
+def test_events_and_partitioning_are_exclusive():
+    with pytest.raises(VersioningConfigException):
+
+        class PartitionedEventLiveModel(models.Model):
+            __module__ = "django_sample.models"
+
+        class PartitionedEventVersion(VersionModel):
+            __module__ = "django_sample.models"
+            live_model = PartitionedEventLiveModel
+            m2m_history = "events"
+            partition_by = "month"
@@ -0,0 +1,169 @@
+from datetime import datetime, timezone
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import IntegrityError, connection, models
+from django.utils import timezone as django_timezone
+
+import pytest
+
+from zeus.versioning.core import VersioningConfigException, VersionModel
+from zeus.versioning.partitioning import (
+    get_partition_names,
+    partition_table,
+    unpartition_table,
+)
+
+
+@pytest.fixture(scope="module")
+def partitioned(register_model):
+    module = "django_sample.models"
+
+    class PartitionedLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class PartitionedVersion(VersionModel):
+        __module__ = module
+        live_model = PartitionedLiveModel
+        partition_by = "month"
+        business_date = models.DateTimeField(default=django_timezone.now)
+
+    register_model(PartitionedLiveModel)
+    register_model(PartitionedVersion)
+
+    class NameSpace:
+        LiveModel = PartitionedLiveModel
+        VersionModel = PartitionedVersion
+        table = PartitionedVersion._meta.db_table
+
+    return NameSpace
+
+
+def count_rows_by_partition(table):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT tableoid::regclass::text, count(*) FROM {table} GROUP BY 1 ORDER BY 1"
+        )
+        return dict(cursor.fetchall())
+
+
+def write_versions(ns, *dates):
+    # bulk_create skips the post_save version
+    [obj] = ns.LiveModel.objects.bulk_create([ns.LiveModel(name="name")])
+    for date in dates:
+        ns.VersionModel.bulk_create_from_originals([obj], business_date=date)
+    return obj
+
+
+def test_partitions_are_created_ahead_and_receive_rows(partitioned):
+    table = partitioned.table
+    old_date = datetime(2020, 1, 15, tzinfo=timezone.utc)
+    obj = write_versions(partitioned, old_date)
+
+    with connection.schema_editor() as schema_editor:
+        partition_table(schema_editor, partitioned.VersionModel, "business_date")
+    assert count_rows_by_partition(table) == {f"{table}_default": 1}
+
+    call_command(
+        "version_partitions",
+        partitioned.VersionModel._meta.label,
+        "--ahead=1",
+        "--since=2020-01-01",
+        stdout=StringIO(),
+    )
+    partition_names = get_partition_names(connection, table)
+    assert f"{table}_p202001" in partition_names
+    assert f"{table}_p202002" in partition_names
+    # rows are moved out of the default partition
+    assert count_rows_by_partition(table) == {f"{table}_p202001": 1}
+
+    write_versions(partitioned, datetime(2020, 2, 3, tzinfo=timezone.utc))
+    assert count_rows_by_partition(table)[f"{table}_p202002"] == 1
+
+    # queries are unaffected
+    assert obj.versions.get().business_date == old_date
+
+    call_command(
+        "version_partitions",
+        partitioned.VersionModel._meta.label,
+        "--ahead=0",
+        "--detach-before=2020-02-01",
+        stdout=StringIO(),
+    )
+    assert f"{table}_p202001" not in get_partition_names(connection, table)
+    assert not obj.versions.exists()
+
+
+def test_partitioning_can_be_undone(partitioned):
+    write_versions(
+        partitioned,
+        datetime(2020, 1, 15, tzinfo=timezone.utc),
+        datetime(2020, 3, 15, tzinfo=timezone.utc),
+    )
+
+    with connection.schema_editor() as schema_editor:
+        partition_table(schema_editor, partitioned.VersionModel, "business_date")
+    call_command(
+        "version_partitions",
+        partitioned.VersionModel._meta.label,
+        "--since=2020-01-01",
+        stdout=StringIO(),
+    )
+    with connection.schema_editor() as schema_editor:
+        unpartition_table(schema_editor, partitioned.VersionModel)
+
+    table = partitioned.table
+    assert get_partition_names(connection, table) == []
+    assert count_rows_by_partition(table) == {table: 2}
+    # the id sequence carries on
+    obj = write_versions(partitioned, datetime(2020, 4, 1, tzinfo=timezone.utc))
+    assert obj.versions.get().pk > 2
+
+
+def test_partitioning_refuses_tables_referenced_by_foreign_keys(partitioned):
+    class PartitionedVersionNote(models.Model):
+        __module__ = "django_sample.models"
+        version = models.ForeignKey(partitioned.VersionModel, on_delete=models.CASCADE)
+
+    with connection.schema_editor() as schema_editor:
+        schema_editor.create_model(PartitionedVersionNote)
+
+    with pytest.raises(VersioningConfigException):
+        with connection.schema_editor() as schema_editor:
+            partition_table(schema_editor, partitioned.VersionModel, "business_date")
+
+    assert get_partition_names(connection, partitioned.table) == []
+
+
+def test_partitioning_keeps_the_constraint_mode(partitioned):
+    write_versions(partitioned, datetime(2020, 1, 15, tzinfo=timezone.utc))
+    with connection.cursor() as cursor:
+        cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+
+    with connection.schema_editor() as schema_editor:
+        partition_table(schema_editor, partitioned.VersionModel, "business_date")
+
+    # checked right away, not deferred to the end of the transaction
+    with pytest.raises(IntegrityError):
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"INSERT INTO {partitioned.table} (eternal_id, name, system_date, business_date) "
+                f"VALUES (-1, 'orphan', now(), now())"
+            )
+
+
+def test_partitioning_rejects_unique_constraints():
+    module = "django_sample.models"
+
+    class RejectedLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    with pytest.raises(VersioningConfigException):
+
+        class RejectedVersion(VersionModel):
+            __module__ = module
+            live_model = RejectedLiveModel
+            partition_by = "month"
+            number_versions = True
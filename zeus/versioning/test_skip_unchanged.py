@@ -0,0 +1,129 @@
+from django.db import models
+
+import pytest
+
+from zeus.django.query_counting import assert_max_queries
+from zeus.versioning.core import VersionModel
+
+
+@pytest.fixture(scope="module")
+def skipping(register_model):
+    module = "django_sample.models"
+
+    class SkippingGroup(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class SkippingLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+        groups = models.ManyToManyField(SkippingGroup)
+
+    class SkippingVersion(VersionModel):
+        __module__ = module
+        live_model = SkippingLiveModel
+        skip_unchanged_versions = True
+
+    class SkippingDeltaLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+        body = models.TextField(default="")
+
+    class SkippingDeltaVersion(VersionModel):
+        __module__ = module
+        live_model = SkippingDeltaLiveModel
+        skip_unchanged_versions = True
+        delta_snapshot_interval = 5
+
+    register_model(SkippingGroup)
+    register_model(SkippingLiveModel)
+    register_model(SkippingVersion)
+    register_model(SkippingDeltaLiveModel)
+    register_model(SkippingDeltaVersion)
+
+    class NameSpace:
+        Group = SkippingGroup
+        LiveModel = SkippingLiveModel
+        VersionModel = SkippingVersion
+        DeltaLiveModel = SkippingDeltaLiveModel
+        group = SkippingGroup.objects.create(name="group")
+
+    return NameSpace
+
+
+def test_unchanged_saves_dont_write_versions(skipping):
+    obj = skipping.LiveModel.objects.create(name="v1")
+    obj.reset_version_attrs()
+    skipped_before = skipping.VersionModel.skipped_version_writes
+
+    # compared against the snapshot cached when the version was written:
+    # 1 m2m select and the latest version's id, no full version read
+    with assert_max_queries(3):
+        obj.save()
+
+    # without a snapshot, the latest version is read back
+    fresh = skipping.LiveModel.objects.get(pk=obj.pk)
+    fresh.save()
+
+    assert obj.versions.count() == 1
+    assert skipping.VersionModel.skipped_version_writes == skipped_before + 2
+
+    fresh.name = "v2"
+    fresh.save()
+    assert list(obj.versions.order_by("id").values_list("name", flat=True)) == [
+        "v1",
+        "v2",
+    ]
+
+
+def test_a_save_reverting_another_writers_change_writes_a_version(skipping):
+    obj = skipping.LiveModel.objects.create(name="x")
+    obj.reset_version_attrs()
+    other = skipping.LiveModel.objects.get(pk=obj.pk)
+    other.name = "y"
+    other.save()
+
+    # obj's cached snapshot says "x", the latest version says "y"
+    obj.save()
+
+    assert list(obj.versions.order_by("id").values_list("name", flat=True)) == [
+        "x",
+        "y",
+        "x",
+    ]
+
+
+def test_m2m_change_after_a_skipped_save_writes_a_version(skipping):
+    obj = skipping.LiveModel.objects.create(name="v1")
+    obj.reset_version_attrs()
+    obj.save()
+
+    obj.groups.add(skipping.group)
+
+    versions = list(obj.versions.order_by("id"))
+    assert len(versions) == 2
+    assert versions[-1].groups == [skipping.group.pk]
+
+
+def test_bulk_writes_skip_unchanged_records(skipping):
+    changed = skipping.LiveModel.objects.create(name="changed")
+    unchanged = skipping.LiveModel.objects.create(name="unchanged")
+    skipping.LiveModel.objects.filter(pk=changed.pk).update(name="changed2")
+    changed.refresh_from_db()
+
+    created = skipping.VersionModel.bulk_create_from_originals([changed, unchanged])
+
+    assert [v.eternal_id for v in created] == [changed.pk]
+    assert unchanged.versions.count() == 1
+
+
+def test_unchanged_saves_are_compared_to_full_delta_versions(skipping):
+    obj = skipping.DeltaLiveModel.objects.create(name="v1", body="text")
+    obj.reset_version_attrs()
+    obj.name = "v2"
+    obj.save()
+
+    # the latest version only stores name, the comparison has to see body too
+    skipping.DeltaLiveModel.objects.get(pk=obj.pk).save()
+
+    assert obj.versions.count() == 2
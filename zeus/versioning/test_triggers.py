@@ -0,0 +1,247 @@
+from django.contrib.auth.models import User
+from django.db import connection, connections, models
+
+import pytest
+
+from django_sample.models import CustomVersionModel
+from zeus.django.query_counting import assert_max_queries
+from zeus.versioning.core import (
+    VersionedLiveManager,
+    VersioningConfigException,
+    VersionModel,
+)
+from zeus.versioning.middleware import acting_as
+from zeus.versioning.triggers import InstallVersionTriggers, versioning_session
+
+
+@pytest.fixture(scope="module")
+def triggered(register_model):
+    module = "django_sample.models"
+
+    class TriggeredTag(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class TriggeredLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+        count = models.IntegerField(default=0)
+        tags = models.ManyToManyField(TriggeredTag)
+
+        objects = VersionedLiveManager()
+
+    class TriggeredVersion(CustomVersionModel):
+        __module__ = module
+        live_model = TriggeredLiveModel
+        version_with_triggers = True
+
+    register_model(TriggeredTag)
+    register_model(TriggeredLiveModel)
+    register_model(TriggeredVersion)
+
+    operation = InstallVersionTriggers("triggeredversion")
+    with connection.schema_editor() as schema_editor:
+        operation.database_forwards("django_sample", schema_editor, None, None)
+
+    class NameSpace:
+        Tag = TriggeredTag
+        LiveModel = TriggeredLiveModel
+        VersionModel = TriggeredVersion
+
+    return NameSpace
+
+
+def test_saves_are_versioned_by_the_database(triggered):
+    with assert_max_queries(1):
+        obj = triggered.LiveModel.objects.create(name="v1")
+    obj.name = "v2"
+    with assert_max_queries(1):
+        obj.save()
+
+    versions = list(obj.versions.order_by("id"))
+    assert [v.name for v in versions] == ["v1", "v2"]
+    assert versions[0].tags == []
+    assert versions[0].business_date is not None
+    assert versions[0].edited_by is None
+
+
+def test_bulk_writes_are_versioned(triggered):
+    objs = triggered.LiveModel.objects.bulk_create(
+        [triggered.LiveModel(name=f"obj{i}") for i in range(5)]
+    )
+    assert triggered.VersionModel.objects.filter(eternal__in=objs).count() == 5
+
+    # one statement, versions included
+    with assert_max_queries(1):
+        triggered.LiveModel.objects.filter(pk__in=[o.pk for o in objs]).update(count=3)
+
+    latest = triggered.VersionModel.objects.filter(eternal__in=objs).order_by("-id")[:5]
+    assert sorted(v.eternal_id for v in latest) == sorted(o.pk for o in objs)
+    assert {v.count for v in latest} == {3}
+
+
+def test_edited_by_comes_from_the_session(triggered):
+    user = User.objects.create(username="trigger-editor")
+    obj = triggered.LiveModel.objects.create(name="v1")
+
+    with versioning_session(edited_by=user):
+        obj.name = "v2"
+        obj.save()
+    triggered.LiveModel.objects.filter(pk=obj.pk).update_versioned(
+        {"name": "v3"}, edited_by=user
+    )
+    obj.name = "v4"
+    obj.save()
+
+    assert [v.edited_by_id for v in obj.versions.order_by("id")] == [
+        None,
+        user.pk,
+        user.pk,
+        None,
+    ]
+
+
+def test_edited_by_comes_from_the_acting_user(triggered):
+    user = User.objects.create(username="trigger-actor")
+    other = User.objects.create(username="trigger-session")
+    obj = triggered.LiveModel.objects.create(name="v1")
+
+    with acting_as(user):
+        obj.name = "v2"
+        obj.save()
+        triggered.LiveModel.objects.filter(pk=obj.pk).update_versioned({"name": "v3"})
+        with versioning_session(edited_by=other):
+            obj.name = "v4"
+            obj.save()
+        obj.name = "v5"
+        obj.save()
+    obj.name = "v6"
+    obj.save()
+
+    assert [v.edited_by_id for v in obj.versions.order_by("id")] == [
+        None,
+        user.pk,
+        user.pk,
+        other.pk,
+        user.pk,
+        None,
+    ]
+
+
+def test_the_acting_user_doesnt_outlive_acting_as(triggered):
+    outer = User.objects.create(username="trigger-outer")
+    inner = User.objects.create(username="trigger-inner")
+    obj = triggered.LiveModel.objects.create(name="v1")
+    live_rows = triggered.LiveModel.objects.filter(pk=obj.pk)
+
+    with acting_as(outer):
+        with acting_as(inner):
+            obj.name = "v2"
+            obj.save()
+        # plain updates don't go through pre_save, they see whatever the session holds
+        live_rows.update(name="v3")
+    live_rows.update(name="v4")
+
+    assert [(v.name, v.edited_by_id) for v in obj.versions.order_by("id")] == [
+        ("v1", None),
+        ("v2", inner.pk),
+        ("v3", outer.pk),
+        ("v4", None),
+    ]
+
+
+@pytest.fixture
+def sqlite_triggered(triggered):
+    alias = "zeus_triggers_sqlite"
+    connections.databases[alias] = {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": ":memory:",
+    }
+    sqlite_connection = connections[alias]
+    with sqlite_connection.schema_editor() as schema_editor:
+        schema_editor.create_model(User)
+        for model in (triggered.Tag, triggered.LiveModel, triggered.VersionModel):
+            schema_editor.create_model(model)
+        InstallVersionTriggers("triggeredversion").database_forwards(
+            "django_sample", schema_editor, None, None
+        )
+    try:
+        yield alias
+    finally:
+        sqlite_connection.close()
+        del connections[alias]
+        del connections.databases[alias]
+
+
+def test_sqlite_triggers_read_the_session_and_the_acting_user(
+    triggered, sqlite_triggered
+):
+    users = User.objects.using(sqlite_triggered)
+    actor = users.create(username="sqlite-actor")
+    other = users.create(username="sqlite-session")
+    live_rows = triggered.LiveModel.objects.using(sqlite_triggered)
+    obj = live_rows.create(name="v1")
+    with acting_as(actor):
+        live_rows.filter(pk=obj.pk).update(name="v2")
+        with versioning_session(edited_by=other, using=sqlite_triggered):
+            live_rows.filter(pk=obj.pk).update(name="v3")
+    live_rows.filter(pk=obj.pk).update(name="v4")
+
+    versions = triggered.VersionModel.objects.using(sqlite_triggered).order_by("id")
+    assert [(v.name, v.edited_by_id) for v in versions] == [
+        ("v1", None),
+        ("v2", actor.pk),
+        ("v3", other.pk),
+        ("v4", None),
+    ]
+
+
+def test_m2m_changes_are_versioned_in_python(triggered):
+    tag = triggered.Tag.objects.create(name="tag")
+    obj = triggered.LiveModel.objects.create(name="v1")
+    obj.tags.add(tag)
+
+    triggered.LiveModel.objects.filter(pk=obj.pk).update(name="v2")
+    assert list(obj.versions.order_by("id").values_list("name", "tags")) == [
+        ("v1", []),
+        ("v1", [tag.pk]),
+        ("v2", [tag.pk]),
+    ]
+
+
+def test_triggers_only_support_plain_versions():
+    with pytest.raises(VersioningConfigException):
+
+        class BadTriggeredLiveModel(models.Model):
+            __module__ = "django_sample.models"
+
+        class BadTriggeredVersion(VersionModel):
+            __module__ = "django_sample.models"
+            live_model = BadTriggeredLiveModel
+            version_with_triggers = True
+            number_versions = True
+
+
+@pytest.mark.parametrize(
+    "options",
+    [{"skip_unchanged_versions": True}, {"live_delete_strategy": "tombstone"}],
+)
+def test_triggers_reject_options_computed_in_python(options):
+    # a name per option, both models get registered before the check raises
+    name = "".join(part.title() for part in next(iter(options)).split("_"))
+    live_model = type(
+        f"{name}TriggeredLiveModel",
+        (models.Model,),
+        {"__module__": "django_sample.models"},
+    )
+    with pytest.raises(VersioningConfigException):
+        type(
+            f"{name}TriggeredVersion",
+            (VersionModel,),
+            {
+                "__module__": "django_sample.models",
+                "live_model": live_model,
+                "version_with_triggers": True,
+                **options,
+            },
+        )
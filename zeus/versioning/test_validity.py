@@ -0,0 +1,164 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.db import IntegrityError, connection, models, transaction
+from django.test.utils import CaptureQueriesContext
+
+import pytest
+
+from zeus.versioning.core import VersioningConfigException, VersionModel
+
+
+@pytest.fixture(scope="module")
+def validity(register_model):
+    module = "django_sample.models"
+
+    class ValidityLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class ValidityVersion(VersionModel):
+        __module__ = module
+        live_model = ValidityLiveModel
+        track_validity = True
+        enforce_single_current_version = True
+
+    register_model(ValidityLiveModel)
+    register_model(ValidityVersion)
+
+    class NameSpace:
+        LiveModel = ValidityLiveModel
+        VersionModel = ValidityVersion
+
+    return NameSpace
+
+
+def create_with_edits(live_model, *names):
+    obj = live_model.objects.create(name=names[0])
+    for name in names[1:]:
+        obj.reset_version_attrs()
+        obj.name = name
+        obj.save()
+    return obj
+
+
+def assert_valid_chain(versions):
+    for previous, ver in zip(versions, versions[1:]):
+        assert ver.previous_version_id == previous.id
+        assert previous.valid_to == ver.system_date
+        assert not previous.is_current
+
+    assert versions[0].previous_version_id is None
+    assert versions[-1].valid_to is None
+    assert versions[-1].is_current
+
+
+def test_saves_maintain_validity(validity):
+    obj = create_with_edits(validity.LiveModel, "v1", "v2", "v3")
+
+    versions = list(obj.versions.order_by("id"))
+    assert [v.name for v in versions] == ["v1", "v2", "v3"]
+    assert_valid_chain(versions)
+
+    qs = validity.VersionModel.objects.filter(eternal=obj)
+    assert list(qs.only_most_recent_versions()) == [versions[-1]]
+    assert [
+        v.previous_version_id for v in qs.with_previous_version_id().order_by("id")
+    ] == [
+        None,
+        versions[0].id,
+        versions[1].id,
+    ]
+    assert list(qs.as_of_system_date(versions[1].system_date)) == [versions[1]]
+
+
+def test_bulk_writes_maintain_validity(validity):
+    obj = create_with_edits(validity.LiveModel, "v1")
+
+    # several versions of the same record in a single batch
+    validity.VersionModel.bulk_create_from_originals([obj, obj])
+    obj.reset_version_attrs()
+    obj.name = "v2"
+    obj.save()
+
+    versions = list(obj.versions.order_by("id"))
+    assert len(versions) == 4
+    # bulk-written versions share a date, so only the links are checked for those
+    assert [v.previous_version_id for v in versions] == [None] + [
+        v.id for v in versions[:-1]
+    ]
+    assert [v.is_current for v in versions] == [False, False, False, True]
+
+
+def test_backfill_command_rebuilds_validity(validity):
+    objs = [create_with_edits(validity.LiveModel, "a", "b", "c") for _ in range(3)]
+    validity.VersionModel.objects.filter(eternal__in=objs).update(
+        previous_version=None, valid_to=None, is_current=False
+    )
+
+    out = StringIO()
+    call_command(
+        "backfill_version_validity",
+        validity.VersionModel._meta.label,
+        batch_size=2,
+        stdout=out,
+    )
+
+    assert "9 versions updated over 3 records" in out.getvalue()
+    for obj in objs:
+        assert_valid_chain(list(obj.versions.order_by("id")))
+
+    # already consistent rows are left alone
+    assert validity.VersionModel.rebuild_validity([o.id for o in objs]) == 0
+
+
+def test_a_record_has_at_most_one_current_version(validity):
+    obj = create_with_edits(validity.LiveModel, "a", "b")
+
+    with pytest.raises(IntegrityError), transaction.atomic():
+        validity.VersionModel.objects.filter(eternal=obj).update(is_current=True)
+
+
+def test_the_current_version_constraint_is_opt_in():
+    module = "django_sample.models"
+
+    class UnenforcedLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    # so that the constraint can be migrated after the backfill, not along with is_current
+    class UnenforcedVersion(VersionModel):
+        __module__ = module
+        live_model = UnenforcedLiveModel
+        track_validity = True
+
+    assert UnenforcedVersion._meta.constraints == []
+
+    class UntrackedLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    with pytest.raises(VersioningConfigException, match="needs track_validity"):
+
+        class UntrackedVersion(VersionModel):
+            __module__ = module
+            live_model = UntrackedLiveModel
+            enforce_single_current_version = True
+
+
+def test_writers_lock_the_live_row_before_linking(validity):
+    obj = create_with_edits(validity.LiveModel, "a")
+    obj.reset_version_attrs()
+    obj.name = "b"
+
+    with CaptureQueriesContext(connection) as queries:
+        obj.save()
+
+    sqls = [q["sql"] for q in queries.captured_queries]
+    lock = next(i for i, sql in enumerate(sqls) if "FOR UPDATE" in sql)
+    current = next(
+        i
+        for i, sql in enumerate(sqls)
+        if sql.startswith("SELECT") and "is_current" in sql
+    )
+    assert lock < current
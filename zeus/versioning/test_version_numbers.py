@@ -0,0 +1,115 @@
+from django.db import models
+from django.utils import timezone
+
+import pytest
+
+from zeus.changelog.consecutive_versions_fetcher import (
+    SingleRecordConsecutiveVersionsFetcher,
+)
+from zeus.versioning.core import VersionModel
+
+
+@pytest.fixture(scope="module")
+def numbered(register_model):
+    module = "django_sample.models"
+
+    class NumberedLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class NumberedVersion(VersionModel):
+        __module__ = module
+        live_model = NumberedLiveModel
+        number_versions = True
+        business_date = models.DateTimeField(default=timezone.now)
+
+    register_model(NumberedLiveModel)
+    register_model(NumberedVersion)
+
+    class NameSpace:
+        LiveModel = NumberedLiveModel
+        VersionModel = NumberedVersion
+
+    return NameSpace
+
+
+def create_with_edits(live_model, *names):
+    obj = live_model.objects.create(name=names[0])
+    for name in names[1:]:
+        obj.reset_version_attrs()
+        obj.name = name
+        obj.save()
+    return obj
+
+
+def test_versions_are_numbered_per_record(numbered):
+    obj = create_with_edits(numbered.LiveModel, "a1", "a2", "a3")
+    other = create_with_edits(numbered.LiveModel, "b1")
+
+    # several versions of the same record in a single batch
+    numbered.VersionModel.bulk_create_from_originals([obj, other, obj])
+
+    assert list(obj.versions.order_by("id").values_list("version_number", flat=True)) == [
+        1,
+        2,
+        3,
+        4,
+        5,
+    ]
+    assert list(
+        other.versions.order_by("id").values_list("version_number", flat=True)
+    ) == [
+        1,
+        2,
+    ]
+
+
+def test_previous_and_latest_versions_use_numbers(numbered):
+    obj = create_with_edits(numbered.LiveModel, "v1", "v2", "v3")
+    # same business_date everywhere, only the numbers tell versions apart
+    obj.versions.update(business_date=timezone.now())
+    ids = list(obj.versions.order_by("version_number").values_list("id", flat=True))
+
+    qs = numbered.VersionModel.objects.filter(eternal=obj).order_by("version_number")
+    assert [v.previous_version_id for v in qs.with_previous_version_id()] == [
+        None,
+        ids[0],
+        ids[1],
+    ]
+    assert [v.id for v in qs.only_most_recent_versions()] == [ids[2]]
+
+
+def test_single_record_fetcher_pages_by_number(numbered):
+    obj = create_with_edits(numbered.LiveModel, *[f"v{i}" for i in range(1, 6)])
+
+    def get_names(page_num):
+        fetcher = SingleRecordConsecutiveVersionsFetcher(
+            page_size=2, page_num=page_num, model=numbered.LiveModel, primary_key=obj.pk
+        )
+        assert fetcher.get_total_entry_count() == 5
+        assert fetcher.get_total_page_count() == 3
+        return [e["version"].name for e in fetcher.get_fully_fetched_edit_entries()]
+
+    assert get_names(1) == ["v5", "v4"]
+    assert get_names(2) == ["v3", "v2"]
+    assert get_names(3) == ["v1"]
+
+
+def test_single_record_fetcher_pages_filtered_or_gapped_versions(numbered):
+    obj = create_with_edits(numbered.LiveModel, *[f"v{i}" for i in range(1, 6)])
+
+    def get_names(page_num, **filters):
+        fetcher = SingleRecordConsecutiveVersionsFetcher(
+            page_size=2, page_num=page_num, model=numbered.LiveModel, primary_key=obj.pk
+        )
+        for name, value in filters.items():
+            setattr(fetcher, name, value)
+        return [e["version"].name for e in fetcher.get_fully_fetched_edit_entries()]
+
+    # without the creation, the first page still holds two entries
+    assert get_names(1, exclude_create=True) == ["v5", "v4"]
+    assert get_names(2, exclude_create=True) == ["v3", "v2"]
+
+    obj.versions.filter(version_number=4).delete()
+    assert get_names(1) == ["v5", "v3"]
+    assert get_names(2) == ["v2", "v1"]
@@ -1,39 +1,16 @@
 import importlib
+from datetime import timedelta
 
-from django.db import connection, models, transaction
+from django.db import models
 from django.db.models.base import ModelBase
 from django.forms import ModelForm
+from django.utils import timezone
 
 import pytest
+from asgiref.sync import async_to_sync
 
-from zeus.versioning.core import VersionModel
-
-
-@pytest.fixture(scope="module")
-def register_model(django_db_setup, django_db_blocker):
-    registered_models = []
-
-    def register(model_cls):
-        registered_models.append(model_cls)
-        with connection.schema_editor() as schema_editor:
-            schema_editor.create_model(model_cls)
-
-    with django_db_blocker.unblock():
-        try:
-            with transaction.atomic():
-                yield register
-
-                with connection.schema_editor() as schema_editor:
-                    for model in registered_models:
-                        schema_editor.delete_model(model)
-
-                raise Exception(
-                    "any exception will cause the transaction to be rolled back"
-                )
-
-        # pylint: disable="broad-except"
-        except Exception:
-            pass
+from zeus.django.query_counting import assert_max_queries
+from zeus.versioning.core import VersionedLiveManager, VersionModel
 
 
 # we use module-scope because django complains if you register the same model twice
@@ -51,6 +28,7 @@ def common(register_model):
 
     class MyLiveModel(models.Model):
         __module__ = module
+        objects = VersionedLiveManager()
         name = models.CharField(max_length=20)
         groups = models.ManyToManyField(MyGroupLookup)
         favorite_group = models.ForeignKey(
@@ -182,6 +160,242 @@ def test_m2m_change_then_scalar_change_only_adds_one_version(common):
     assert obj.versions.last().groups == [common.group1.pk]
 
 
+def test_m2m_clear(common):
+    obj = common.LiveModel.objects.create(name="v1", favorite_group=common.group1)
+    obj.groups.add(common.group1, common.group2)
+    obj.reset_version_attrs()
+
+    obj.groups.clear()
+
+    assert obj.versions.count() == 2
+    assert obj.versions.first().groups == [common.group1.pk, common.group2.pk]
+    assert obj.versions.last().groups == []
+
+
+def test_m2m_edits_on_current_version_only_update_json_column(common):
+    obj = common.LiveModel.objects.create(name="v1", favorite_group=common.group1)
+
+    # pk lookup, through insert and a single version update, no reads of the version
+    with assert_max_queries(3):
+        obj.groups.add(common.group1, common.group2)
+
+    # through select and delete, version update
+    with assert_max_queries(3):
+        obj.groups.remove(common.group1)
+
+    assert obj.versions.count() == 1
+    assert obj.versions.last().groups == [common.group2.pk]
+
+
+@pytest.fixture(scope="module")
+def two_m2m_to_same_model(register_model):
+    module = "django_sample.models"
+
+    class PairedLookup(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class PairedLiveModel(models.Model):
+        __module__ = module
+        primary = models.ManyToManyField(PairedLookup, related_name="primary_for")
+        secondary = models.ManyToManyField(PairedLookup, related_name="secondary_for")
+
+    class PairedVersion(VersionModel):
+        __module__ = module
+        live_model = PairedLiveModel
+
+    register_model(PairedLookup)
+    register_model(PairedLiveModel)
+    register_model(PairedVersion)
+
+    return PairedLookup, PairedLiveModel
+
+
+def test_m2m_edit_goes_to_the_latest_version_after_another_instance_saved(common):
+    obj = common.LiveModel.objects.create(name="a", favorite_group=common.group1)
+    other = common.LiveModel.objects.get(pk=obj.pk)
+    other.name = "b"
+    other.save()
+
+    obj.groups.add(common.group2)
+
+    assert [v.groups for v in obj.versions.order_by("id")] == [[], [common.group2.pk]]
+
+
+def test_m2m_edit_goes_to_the_latest_version_by_date(common):
+    obj = common.LiveModel.objects.create(name="a", favorite_group=common.group1)
+    # a higher id, but an earlier date: not the latest version
+    common.VersionModel.bulk_create_from_originals(
+        [obj], system_date=timezone.now() - timedelta(days=1)
+    )
+
+    obj.groups.add(common.group2)
+
+    latest_first = obj.versions.order_by("-system_date", "-id")
+    assert [v.groups for v in latest_first] == [[common.group2.pk], []]
+
+
+def test_m2m_edit_goes_to_the_latest_version_after_a_reverse_add(
+    two_m2m_to_same_model,
+):
+    Lookup, LiveModel = two_m2m_to_same_model
+    first, second = [Lookup.objects.create(name=f"l{i}") for i in range(2)]
+    obj = LiveModel.objects.create()
+    first.primary_for.add(obj)
+
+    obj.primary.add(second)
+
+    assert [v.primary for v in obj.versions.order_by("id")] == [
+        [],
+        [first.pk, second.pk],
+    ]
+
+
+def test_m2m_fields_to_the_same_model_are_told_apart(two_m2m_to_same_model):
+    Lookup, LiveModel = two_m2m_to_same_model
+    lookup1 = Lookup.objects.create(name="1")
+    lookup2 = Lookup.objects.create(name="2")
+
+    obj = LiveModel.objects.create()
+    obj.primary.add(lookup1)
+    obj.secondary.add(lookup2)
+
+    version = obj.versions.get()
+    assert version.primary == [lookup1.pk]
+    assert version.secondary == [lookup2.pk]
+
+
+def test_reverse_m2m_add_versions_every_live_record_in_one_batch(
+    two_m2m_to_same_model,
+):
+    Lookup, LiveModel = two_m2m_to_same_model
+    lookup = Lookup.objects.create(name="shared")
+    objs = [LiveModel.objects.create() for i in range(3)]
+
+    # through select and insert, then live select, 2 m2m selects and version insert
+    with assert_max_queries(6):
+        lookup.primary_for.add(*objs)
+
+    for obj in objs:
+        assert obj.versions.count() == 2
+        assert obj.versions.last().primary == [lookup.pk]
+        assert obj.versions.last().secondary == []
+
+    lookup.primary_for.clear()
+    for obj in objs:
+        assert obj.versions.count() == 3
+        assert obj.versions.last().primary == []
+
+
+@pytest.fixture(scope="module")
+def inherited_m2m(register_model):
+    module = "django_sample.models"
+
+    class InheritedLookup(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class InheritedBase(models.Model):
+        __module__ = module
+        lookups = models.ManyToManyField(InheritedLookup)
+
+    class InheritedChild(InheritedBase):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class InheritedChildVersion(VersionModel):
+        __module__ = module
+        live_model = InheritedChild
+
+    register_model(InheritedLookup)
+    register_model(InheritedBase)
+    register_model(InheritedChild)
+    register_model(InheritedChildVersion)
+
+    return InheritedLookup, InheritedChild
+
+
+def test_m2m_declared_on_a_parent_model_is_versioned(inherited_m2m):
+    # the field belongs to the unversioned parent, the version class comes from the child
+    Lookup, LiveModel = inherited_m2m
+    lookup = Lookup.objects.create(name="inherited")
+    obj = LiveModel.objects.create(name="child")
+    obj.reset_version_attrs()
+    obj.name = "renamed"
+    obj.save()
+
+    obj.lookups.add(lookup)
+
+    assert [(v.name, v.lookups) for v in obj.versions.order_by("id")] == [
+        ("child", []),
+        ("renamed", [lookup.pk]),
+    ]
+
+
+@pytest.fixture(scope="module")
+def parent_and_child_versioned(register_model):
+    module = "django_sample.models"
+
+    class SharedLookup(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class SharedParent(models.Model):
+        __module__ = module
+        lookups = models.ManyToManyField(SharedLookup, related_name="parents")
+
+    class SharedParentVersion(VersionModel):
+        __module__ = module
+        live_model = SharedParent
+
+    class SharedChild(SharedParent):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class SharedChildVersion(VersionModel):
+        __module__ = module
+        live_model = SharedChild
+
+    for model in (
+        SharedLookup,
+        SharedParent,
+        SharedParentVersion,
+        SharedChild,
+        SharedChildVersion,
+    ):
+        register_model(model)
+
+    return (
+        SharedLookup,
+        SharedParent,
+        SharedChild,
+        SharedParentVersion,
+        SharedChildVersion,
+    )
+
+
+def test_version_classes_sharing_an_m2m_are_all_versioned(parent_and_child_versioned):
+    Lookup, Parent, Child, ParentVersion, ChildVersion = parent_and_child_versioned
+    lookup = Lookup.objects.create(name="shared")
+    parent = Parent.objects.create()
+    child = Child.objects.create(name="child")
+
+    parent.lookups.add(lookup)
+    child.lookups.add(lookup)
+
+    def get_lookups(version_cls, obj):
+        versions = version_cls.objects.filter(eternal_id=obj.pk).order_by("id")
+        return [v.lookups for v in versions]
+
+    assert get_lookups(ParentVersion, parent) == [[lookup.pk]]
+    assert get_lookups(ChildVersion, child) == [[lookup.pk]]
+
+    # both classes version the records the reverse side touches
+    lookup.parents.clear()
+    assert get_lookups(ParentVersion, parent) == [[lookup.pk], []]
+    assert get_lookups(ChildVersion, child) == [[lookup.pk], []]
+
+
 def test_create_via_model_form(common):
     class Form(ModelForm):
         class Meta:
@@ -204,3 +418,128 @@ def test_create_via_model_form(common):
     v1 = obj.versions.last()
     assert v1.name == "v1"
     assert v1.groups == [common.group1.pk]
+
+
+def test_bulk_create_versioned(common):
+    objs = [
+        common.LiveModel(name=f"bulk{i}", favorite_group=common.group1) for i in range(10)
+    ]
+
+    # 1 live insert + 1 version insert
+    with assert_max_queries(2):
+        created = common.LiveModel.objects.bulk_create_versioned(objs)
+
+    assert all(obj.pk for obj in created)
+    versions = common.VersionModel.objects.filter(eternal__in=created)
+    assert versions.count() == 10
+    assert {v.name for v in versions} == {f"bulk{i}" for i in range(10)}
+    assert all(v.groups == [] for v in versions)
+    # a single batch shares the same system_date
+    assert len({v.system_date for v in versions}) == 1
+
+
+def test_bulk_create_from_originals_fetches_m2m_per_field(common):
+    objs = [
+        common.LiveModel.objects.create(name=f"orig{i}", favorite_group=common.group1)
+        for i in range(5)
+    ]
+    for obj in objs:
+        obj.groups.add(common.group2, common.group1)
+
+    # 1 m2m query + 1 version insert
+    with assert_max_queries(2):
+        versions = common.VersionModel.objects.bulk_create_from_originals(objs)
+
+    assert len(versions) == 5
+    for obj, ver in zip(objs, versions):
+        assert ver.eternal_id == obj.pk
+        assert ver.groups == sorted([common.group1.pk, common.group2.pk])
+        assert obj.versions.count() == 2
+
+
+def test_async_version_writes(common):
+    objs = [
+        common.LiveModel.objects.create(name=f"orig{i}", favorite_group=common.group1)
+        for i in range(3)
+    ]
+    objs[0].groups.add(common.group2)
+
+    async def write_versions():
+        single = await common.VersionModel.acreate_from_original(objs[0])
+        bulk = await common.VersionModel.objects.abulk_create_from_originals(objs)
+        return single, bulk
+
+    single, bulk = async_to_sync(write_versions)()
+
+    assert single.groups == [common.group2.pk]
+    assert [v.eternal_id for v in bulk] == [obj.pk for obj in objs]
+    assert objs[0].versions.count() == 3
+
+
+def test_bulk_update_versioned(common):
+    objs = [
+        common.LiveModel.objects.create(name=f"before{i}", favorite_group=common.group1)
+        for i in range(3)
+    ]
+    for obj in objs:
+        obj.name = obj.name.replace("before", "after")
+
+    common.LiveModel.objects.bulk_update_versioned(objs, ["name"], batch_size=2)
+
+    for obj in objs:
+        assert obj.versions.count() == 2
+        assert obj.versions.last().name == obj.name
+
+
+def test_update_versioned(common):
+    objs = [
+        common.LiveModel.objects.create(name="to_update", favorite_group=common.group1)
+        for i in range(3)
+    ]
+    objs[0].groups.add(common.group3)
+
+    count = common.LiveModel.objects.filter(name="to_update").update_versioned(
+        {"favorite_group": common.group2}, batch_size=2
+    )
+    assert count == 3
+
+    for obj in objs:
+        assert obj.versions.count() == 2
+        assert obj.versions.last().favorite_group_id == common.group2.pk
+
+    assert objs[0].versions.last().groups == [common.group3.pk]
+
+
+def test_version_models_get_default_indexes(common):
+    from django_sample.models import BookVersion
+
+    assert [idx.fields for idx in common.VersionModel._meta.indexes] == [
+        ["eternal", "system_date"],
+        ["system_date"],
+    ]
+    assert [idx.fields for idx in BookVersion._meta.indexes] == [
+        ["eternal", "business_date"],
+        ["business_date"],
+        ["edited_by", "business_date"],
+    ]
+
+
+def test_version_indexes_can_be_overridden():
+    module = "django_sample.models"
+
+    class IndexedLiveModel(models.Model):
+        __module__ = module
+        name = models.CharField(max_length=20)
+
+    class IndexedVersion(VersionModel):
+        __module__ = module
+        live_model = IndexedLiveModel
+        version_indexes = [("name", "system_date")]
+
+        class Meta:
+            indexes = [models.Index(fields=["name"], name="indexed_version_name_idx")]
+
+    assert [idx.fields for idx in IndexedVersion._meta.indexes] == [
+        ["name"],
+        ["name", "system_date"],
+    ]
@@ -0,0 +1,59 @@
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, transaction
+
+import pytest
+
+
+@pytest.fixture(scope="module")
+def register_model(django_db_setup, django_db_blocker):
+    registered_models = []
+
+    def register(model_cls):
+        registered_models.append(model_cls)
+        with connection.schema_editor() as schema_editor:
+            schema_editor.create_model(model_cls)
+
+    with django_db_blocker.unblock():
+        try:
+            with transaction.atomic():
+                yield register
+
+                with connection.schema_editor() as schema_editor:
+                    for model in registered_models:
+                        schema_editor.delete_model(model)
+
+                raise Exception(
+                    "any exception will cause the transaction to be rolled back"
+                )
+
+        # pylint: disable="broad-except"
+        except Exception:
+            pass
+
+
+@pytest.fixture
+def capture_on_commit_callbacks():
+    """
+    tests run inside a transaction that is never committed, so on_commit callbacks never fire
+    this collects callbacks registered inside the block and optionally runs them, as if the transaction committed
+    (backport of django 3.2's TestCase.captureOnCommitCallbacks)
+    """
+
+    @contextmanager
+    def capture(using=DEFAULT_DB_ALIAS, execute=False):
+        callbacks = []
+        start_count = len(connections[using].run_on_commit)
+        try:
+            yield callbacks
+        finally:
+            # savepoint rollbacks replace the list, don't hold on to it
+            run_on_commit = connections[using].run_on_commit
+            callbacks[:] = [entry[1] for entry in run_on_commit[start_count:]]
+            # a real commit clears the callbacks it ran
+            del run_on_commit[start_count:]
+            if execute:
+                for callback in callbacks:
+                    callback()
+
+    return capture
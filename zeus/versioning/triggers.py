@@ -0,0 +1,330 @@
+"""
+Versioning by database triggers, for version models with version_with_triggers = True.
+Every INSERT and UPDATE of the live table writes its versions server-side,
+including QuerySet.update(), bulk_create and raw SQL.
+PostgreSQL uses statement-level triggers over transition tables, so one UPDATE of many rows
+versions them all with a single INSERT ... SELECT. SQLite uses row-level triggers.
+
+edited_by comes from a session variable, see versioning_session,
+or from acting_as and WhodidMiddleware for saves and the versioned queryset helpers
+"""
+from contextlib import contextmanager
+
+from django.db import connections, router
+from django.db.backends.signals import connection_created
+from django.db.migrations.operations.base import Operation
+from django.dispatch import receiver
+
+from .middleware import _current_editor, _forwarded_aliases, _unset
+
+SUPPORTED_VENDORS = ("postgresql", "sqlite")
+EDITED_BY_SETTING = "zeus.edited_by"
+
+# features whose columns are computed in python as versions are written
+UNSUPPORTED_OPTIONS = (
+    "track_validity",
+    "number_versions",
+    "delta_snapshot_interval",
+    "deduplicated_fields",
+    "compressed_fields",
+    "write_versions_in_background",
+    "track_changed_fields",
+    "skip_unchanged_versions",
+)
+
+
+def check_trigger_versioning(version_cls):
+    from .core import VersioningConfigException
+
+    for option in UNSUPPORTED_OPTIONS:
+        if getattr(version_cls, option):
+            raise VersioningConfigException(
+                f"version_with_triggers can't be combined with {option}"
+            )
+    # is_deleted has no database default for the triggers to rely on
+    if version_cls.live_delete_strategy == "tombstone":
+        raise VersioningConfigException(
+            "version_with_triggers can't be combined with the tombstone delete strategy"
+        )
+
+
+def get_acting_user_id(default=None):
+    """
+    the pk of the user set by acting_as or WhodidMiddleware, default outside of them
+    """
+    user = _current_editor.get()
+    if user is _unset:
+        return default
+    return getattr(user, "pk", user)
+
+
+def get_session_edited_by(connection):
+    # versioning_session wins over acting_as
+    if getattr(connection, "zeus_in_versioning_session", False):
+        return connection.zeus_edited_by
+    return get_acting_user_id()
+
+
+def set_edited_by_setting(connection, edited_by):
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT set_config(%s, %s, false)",
+            [EDITED_BY_SETTING, "" if edited_by is None else str(edited_by)],
+        )
+
+
+def sync_edited_by_setting(connection):
+    """
+    sets the postgres session variable to what the triggers should see right now,
+    connections left holding an acting user are reset when its acting_as block exits
+    """
+    edited_by = get_session_edited_by(connection)
+    set_edited_by_setting(connection, edited_by)
+    forwarded = _forwarded_aliases.get()
+    if edited_by is not None and forwarded is not None:
+        forwarded.add(connection.alias)
+
+
+def reset_forwarded_editors(aliases):
+    """
+    called as acting_as exits, puts back the outer acting user (or none) on the connections
+    the block's saves copied its user into
+    """
+    for alias in aliases:
+        connection = connections[alias]
+        # a setting changed inside a transaction that rolls back is rolled back with it
+        if connection.connection is None or connection.needs_rollback:
+            continue
+        if not getattr(connection, "zeus_in_versioning_session", False):
+            sync_edited_by_setting(connection)
+
+
+def forward_acting_user(sender, instance, using=None, **_kwargs):
+    """
+    pre_save of live models versioned by triggers, copies the user from acting_as
+    into the postgres session variable the triggers read
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql" or getattr(
+        connection, "zeus_in_versioning_session", False
+    ):
+        return
+    if get_acting_user_id(_unset) is not _unset:
+        sync_edited_by_setting(connection)
+
+
+@receiver(connection_created)
+def register_sqlite_functions(sender, connection, **_kwargs):
+    # sqlite has no session variables, the trigger calls back into the connection instead
+    if connection.vendor == "sqlite":
+        connection.connection.create_function(
+            "zeus_edited_by",
+            0,
+            lambda: get_session_edited_by(connection),
+        )
+
+
+@contextmanager
+def versioning_session(edited_by=None, using=None):
+    """
+    versions written by triggers inside this block get edited_by (a user or a user id),
+    whatever acting_as says
+    """
+    if hasattr(edited_by, "pk"):
+        edited_by = edited_by.pk
+    connection = connections[using or router.db_for_write(None)]
+    previous = (
+        getattr(connection, "zeus_in_versioning_session", False),
+        getattr(connection, "zeus_edited_by", None),
+    )
+
+    if connection.vendor == "postgresql":
+        set_edited_by_setting(connection, edited_by)
+    connection.zeus_in_versioning_session = True
+    connection.zeus_edited_by = edited_by
+    try:
+        yield
+    finally:
+        connection.zeus_in_versioning_session, connection.zeus_edited_by = previous
+        if connection.vendor == "postgresql":
+            sync_edited_by_setting(connection)
+
+
+def get_trigger_name(version_cls, event):
+    return f"{version_cls._meta.db_table}_zeus_{event}"[-63:]
+
+
+def get_function_name(version_cls):
+    return f"{version_cls._meta.db_table}_zeus_versions"[-63:]
+
+
+def get_version_columns(version_cls, connection, row):
+    """
+    (version column, sql computing it from the live row) pairs
+    """
+    from .core import VersioningConfigException
+
+    quote = connection.ops.quote_name
+    live_meta = version_cls.live_model._meta
+
+    columns = {}
+    for live_field in version_cls.get_fields_to_version():
+        if live_field.attname == "id":
+            version_field = version_cls._meta.get_field("eternal")
+        else:
+            version_field = version_cls._meta.get_field(live_field.name)
+        columns[version_field.column] = f"{row}.{quote(live_field.column)}"
+
+    m2m_fields = {f.name: f for f in version_cls.get_m2m_fields_to_version()}
+    for field in version_cls._meta.concrete_fields:
+        if field.primary_key or field.column in columns:
+            continue
+        if field.name in m2m_fields:
+            sql = get_m2m_ids_sql(m2m_fields[field.name], connection, row, live_meta)
+        elif field.name in ("system_date", "business_date"):
+            sql = "now()" if connection.vendor == "postgresql" else now_sqlite_sql()
+        elif field.name == "edited_by":
+            sql = get_edited_by_sql(field, connection)
+        elif field.null:
+            sql = "NULL"
+        else:
+            raise VersioningConfigException(
+                f"{version_cls.__name__}.{field.name} has no value a trigger can compute, make it nullable"
+            )
+        columns[field.column] = sql
+
+    return columns
+
+
+def now_sqlite_sql():
+    # the format django stores datetimes in
+    return "strftime('%Y-%m-%d %H:%M:%f', 'now')"
+
+
+def get_edited_by_sql(field, connection):
+    if connection.vendor == "postgresql":
+        db_type = field.target_field.rel_db_type(connection)
+        return f"NULLIF(current_setting('{EDITED_BY_SETTING}', true), '')::{db_type}"
+    return "zeus_edited_by()"
+
+
+def get_m2m_ids_sql(field, connection, row, live_meta):
+    # sorted, like serialize_m2m_ids
+    quote = connection.ops.quote_name
+    through = field.remote_field.through._meta
+    source = quote(through.get_field(field.m2m_field_name()).column)
+    target = quote(through.get_field(field.m2m_reverse_field_name()).column)
+    table = quote(through.db_table)
+    live_pk = f"{row}.{quote(live_meta.pk.column)}"
+
+    if connection.vendor == "postgresql":
+        return (
+            f"COALESCE((SELECT jsonb_agg({target} ORDER BY {target}) FROM {table} "
+            f"WHERE {source} = {live_pk}), '[]'::jsonb)"
+        )
+    return (
+        f"(SELECT json_group_array({target}) FROM (SELECT {target} FROM {table} "
+        f"WHERE {source} = {live_pk} ORDER BY {target}))"
+    )
+
+
+def get_install_statements(version_cls, connection):
+    quote = connection.ops.quote_name
+    live_table = quote(version_cls.live_model._meta.db_table)
+    version_table = quote(version_cls._meta.db_table)
+    statements = get_uninstall_statements(version_cls, connection)
+
+    if connection.vendor == "postgresql":
+        columns = get_version_columns(version_cls, connection, "new_row")
+        function = quote(get_function_name(version_cls))
+        pk_column = quote(version_cls.live_model._meta.pk.column)
+        statements.append(
+            f"CREATE OR REPLACE FUNCTION {function}() RETURNS trigger AS $$ BEGIN "
+            f"INSERT INTO {version_table} ({', '.join(quote(c) for c in columns)}) "
+            f"SELECT {', '.join(columns.values())} FROM new_rows AS new_row "
+            f"ORDER BY new_row.{pk_column}; "
+            f"RETURN NULL; END $$ LANGUAGE plpgsql"
+        )
+        # transition tables can only be declared on single-event triggers
+        for event in ("insert", "update"):
+            statements.append(
+                f"CREATE TRIGGER {quote(get_trigger_name(version_cls, event))} "
+                f"AFTER {event.upper()} ON {live_table} "
+                f"REFERENCING NEW TABLE AS new_rows FOR EACH STATEMENT "
+                f"EXECUTE FUNCTION {function}()"
+            )
+    else:
+        columns = get_version_columns(version_cls, connection, "NEW")
+        for event in ("insert", "update"):
+            statements.append(
+                f"CREATE TRIGGER {quote(get_trigger_name(version_cls, event))} "
+                f"AFTER {event.upper()} ON {live_table} FOR EACH ROW BEGIN "
+                f"INSERT INTO {version_table} ({', '.join(quote(c) for c in columns)}) "
+                f"VALUES ({', '.join(columns.values())}); END"
+            )
+
+    return statements
+
+
+def get_uninstall_statements(version_cls, connection):
+    quote = connection.ops.quote_name
+    live_table = quote(version_cls.live_model._meta.db_table)
+    statements = []
+    for event in ("insert", "update"):
+        name = quote(get_trigger_name(version_cls, event))
+        if connection.vendor == "postgresql":
+            statements.append(f"DROP TRIGGER IF EXISTS {name} ON {live_table}")
+        else:
+            statements.append(f"DROP TRIGGER IF EXISTS {name}")
+    if connection.vendor == "postgresql":
+        statements.append(
+            f"DROP FUNCTION IF EXISTS {quote(get_function_name(version_cls))}()"
+        )
+    return statements
+
+
+def install_version_triggers(schema_editor, version_cls):
+    # replaces existing triggers, re-run it when versioned fields change
+    for statement in get_install_statements(version_cls, schema_editor.connection):
+        schema_editor.execute(statement, params=None)
+
+
+def uninstall_version_triggers(schema_editor, version_cls):
+    for statement in get_uninstall_statements(version_cls, schema_editor.connection):
+        schema_editor.execute(statement, params=None)
+
+
+class InstallVersionTriggers(Operation):
+    """
+    add this to a migration after the version model's table exists,
+    e.g. InstallVersionTriggers("bookversion")
+    the triggers are generated from the current version model, not the migration state,
+    so add another one when versioned fields change
+    """
+
+    reversible = True
+
+    def __init__(self, model_name):
+        self.model_name = model_name
+
+    def deconstruct(self):
+        return (self.__class__.__qualname__, [self.model_name], {})
+
+    def state_forwards(self, app_label, state):
+        pass
+
+    def get_version_model(self, app_label):
+        from django.apps import apps
+
+        return apps.get_model(app_label, self.model_name)
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor in SUPPORTED_VENDORS:
+            install_version_triggers(schema_editor, self.get_version_model(app_label))
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor in SUPPORTED_VENDORS:
+            uninstall_version_triggers(schema_editor, self.get_version_model(app_label))
+
+    def describe(self):
+        return f"Install versioning triggers for {self.model_name}"